@@ -1,10 +1,13 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from chatbot import PolicyAdvisorBot
+from chatbot import PolicyAdvisorBot, start_delta_watcher
+from metrics import REGISTRY, sampled, timed
+import json
 import logging
+import uuid
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging; request details are sampled (LOG_SAMPLE_RATE) rather than dumped
+logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
@@ -19,33 +22,39 @@ CORS(app, resources={
 # Initialize the chatbot
 logger.info("Initializing PolicyAdvisor chatbot...")
 bot = PolicyAdvisorBot()
+start_delta_watcher(bot)
 logger.info("Chatbot initialized successfully")
 
 @app.route('/chat', methods=['POST'])
 def chat():
     try:
-        logger.info("Received chat request")
-        logger.info(f"Request headers: {dict(request.headers)}")
-        logger.info(f"Request origin: {request.headers.get('Origin')}")
-        
         data = request.json
-        logger.debug(f"Request data: {data}")
-        
         message = data.get('message')
         if not message:
             logger.warning("No message provided in request")
             return jsonify({'error': 'No message provided'}), 400
             
-        logger.info(f"Processing message: {message}")
-        response = bot.get_response(message)
-        logger.info(f"Generated response: {response}")
-        
-        return jsonify({'response': response})
+        # Clients pass back the session_id they were given to continue a conversation
+        session_id = str(data.get('session_id') or uuid.uuid4().hex)[:64]
+        response = bot.get_response(message, session_id=session_id, corpus_filter=data.get('corpus'))
+
+        # Only a sample of requests is logged, and without message bodies
+        if sampled():
+            logger.info(json.dumps({'event': 'chat', 'origin': request.headers.get('Origin'),
+                                    'user_agent': request.headers.get('User-Agent'),
+                                    'message_chars': len(message), 'response_chars': len(response)}))
+
+        with timed('serialize'):
+            return jsonify({'response': response, 'session_id': session_id})
         
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     logger.info("Starting Flask server...")
     app.run(port=5001, debug=True)
\ No newline at end of file
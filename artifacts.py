@@ -0,0 +1,179 @@
+"""Prebuilt retrieval artifacts, so a cold start does not rebuild what the corpus implies.
+
+    python artifacts.py [data_path]
+
+compiles the corpus if needed and writes ``<data>.artifacts.npz`` next to it,
+holding the chunks, the BM25 index, the page titles and every page's
+rendered context header and whole-page context. A bot that finds a matching
+artifact reads these arrays instead of decoding, chunking, tokenizing and
+rendering every page. That matters most on
+serverless deploys, where every cold start would otherwise repeat the work.
+
+The artifact records its format version and the digest of the compiled
+corpus it was built from, and is ignored if either does not match. Bump
+ARTIFACT_VERSION when chunking, tokenization or page rendering change.
+"""
+import json
+import os
+import sys
+from collections.abc import Sequence
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from chunking import chunk_pages
+from context import ContextBuilder
+from corpus import CompiledCorpus, build as compile_data, load_corpus
+from ranking import BM25Ranker
+
+ARTIFACT_VERSION = 2
+ARTIFACT_SUFFIX = '.artifacts.npz'
+
+
+def artifact_path(data_path: str) -> str:
+    return os.path.splitext(data_path)[0] + ARTIFACT_SUFFIX
+
+
+def json_array(value) -> np.ndarray:
+    return np.frombuffer(json.dumps(value).encode('utf-8'), dtype=np.uint8)
+
+
+def from_json_array(array: np.ndarray):
+    return json.loads(array.tobytes().decode('utf-8'))
+
+
+def pack_strings(arrays: Dict[str, np.ndarray], name: str, strings: Iterable[str]) -> None:
+    """Store ``strings`` back to back as UTF-8 in ``arrays[name]``, with their offsets."""
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(data) for data in encoded], out=offsets[1:])
+    arrays[name] = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    arrays[f'{name}_offsets'] = offsets
+
+
+class StringTable(Sequence):
+    """Strings stored by ``pack_strings``, each decoded when it is accessed."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], name: str):
+        self._data = memoryview(arrays[name])
+        self._offsets = arrays[f'{name}_offsets'].tolist()
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('string index out of range')
+        return str(self._data[self._offsets[index]:self._offsets[index + 1]], 'utf-8')
+
+
+class ChunkTable(Sequence):
+    """Prebuilt chunks (see chunking.chunk_pages) as a sequence of chunk dicts.
+
+    Chunks appended later, e.g. by PolicyAdvisorBot.apply_delta, are kept in
+    memory.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self._pages = arrays['chunk_page'].tolist()
+        self._headings = StringTable(arrays, 'chunk_heading')
+        self._texts = StringTable(arrays, 'chunk_text')
+        self._appended: List[Dict] = []
+
+    def __len__(self) -> int:
+        return len(self._pages) + len(self._appended)
+
+    def append(self, chunk: Dict) -> None:
+        self._appended.append(chunk)
+
+    def extend(self, chunks: Iterable[Dict]) -> None:
+        self._appended.extend(chunks)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('chunk index out of range')
+        if index >= len(self._pages):
+            return self._appended[index - len(self._pages)]
+        return {'page': self._pages[index], 'heading': self._headings[index], 'text': self._texts[index]}
+
+
+class Artifacts:
+    """Retrieval structures prebuilt from one compiled corpus."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.meta = from_json_array(arrays['meta'])
+        self.chunks = ChunkTable(arrays)
+        self.bm25 = BM25Ranker.from_arrays({key[len('bm25_'):]: value for key, value in arrays.items()
+                                            if key.startswith('bm25_')})
+        self.titles = StringTable(arrays, 'title')
+        self.headers = StringTable(arrays, 'header')
+        self.page_contexts = StringTable(arrays, 'page_context')
+        self._header_values = StringTable(arrays, 'header_values')
+        self.shared_values = set(from_json_array(arrays['shared_values']))
+
+    def header_values(self, page_id: int) -> set:
+        return set(self._header_values[page_id].split('\0'))
+
+
+def load_artifacts(data_path: str, pages: Sequence) -> Optional[Artifacts]:
+    """Return the artifacts built from ``pages``, or None if there are none or they are stale."""
+    path = artifact_path(data_path)
+    if not isinstance(pages, CompiledCorpus) or not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as npz:
+            arrays = {key: npz[key] for key in npz.files}
+        meta = from_json_array(arrays['meta'])
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Ignoring retrieval artifacts {path}: {e}")
+        return None
+    if meta.get('version') != ARTIFACT_VERSION or meta.get('corpus_digest') != pages.digest:
+        print(f"Ignoring stale retrieval artifacts {path}; rebuild them with python artifacts.py")
+        return None
+    return Artifacts(arrays)
+
+
+def build_artifacts(data_path: str) -> str:
+    """Prebuild the retrieval structures for the corpus at ``data_path`` and write them next to it."""
+    pages = load_corpus(data_path)
+    if not isinstance(pages, CompiledCorpus):
+        # Artifacts are tied to a compiled corpus, which is what the bot loads
+        compile_data(data_path)
+        pages = load_corpus(data_path)
+
+    chunks = chunk_pages(pages)
+    context = ContextBuilder(pages, chunks, max_tokens=0)
+    arrays = {
+        'meta': json_array({'version': ARTIFACT_VERSION, 'corpus_digest': pages.digest, 'pages': len(pages),
+                            'chunks': len(chunks), 'built_at': datetime.now(timezone.utc).isoformat()}),
+        'chunk_page': np.asarray([chunk['page'] for chunk in chunks], dtype=np.int32),
+        'shared_values': json_array(sorted(context.shared_values)),
+    }
+    pack_strings(arrays, 'chunk_heading', (chunk['heading'] for chunk in chunks))
+    pack_strings(arrays, 'chunk_text', (chunk['text'] for chunk in chunks))
+    pack_strings(arrays, 'title', (page['title'] for page in pages))
+    pack_strings(arrays, 'header', (context.page_header(page_id) for page_id in range(len(pages))))
+    pack_strings(arrays, 'page_context', (context.page_context(page_id) for page_id in range(len(pages))))
+    pack_strings(arrays, 'header_values', ('\0'.join(sorted(context.header_values(page_id)))
+                                           for page_id in range(len(pages))))
+    arrays.update({f'bm25_{key}': value for key, value in BM25Ranker.from_corpus(pages, chunks).to_arrays().items()})
+
+    path = artifact_path(data_path)
+    with open(path + '.tmp', 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+if __name__ == "__main__":
+    data_path = sys.argv[1] if len(sys.argv) > 1 else 'data/policyadvisor_data.jsonl'
+    print(f"Wrote retrieval artifacts to {build_artifacts(data_path)}")
@@ -0,0 +1,309 @@
+"""Async serving mode: the chat API of server.py as a plain ASGI application.
+
+Completions are awaited on the event loop instead of holding a worker
+thread, so one process serves many concurrent chats:
+
+    uvicorn asgi:app --port 8000
+
+At most MAX_IN_FLIGHT completions run at once and up to MAX_QUEUED more wait
+for a slot; beyond that requests are turned away with 429 and Retry-After.
+Retrieval and session I/O run on a thread pool of RETRIEVAL_THREADS.
+"""
+import asyncio
+import json
+import logging
+import mimetypes
+import os
+import re
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from email import policy
+from email.parser import BytesParser
+from http.cookies import SimpleCookie
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+from batch import start_cache_warming
+from chatbot import PolicyAdvisorBot, start_delta_watcher
+from metrics import REGISTRY
+from uploads import UploadError
+
+# Same as server.py, which is not imported since it builds its own bot
+ALLOWED_EXTENSIONS = {'txt', 'pdf', 'docx'}
+SESSION_COOKIE = 'session_id'
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def sse_event(data, event=None):
+    """Format one server-sent event carrying a JSON payload."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+class QueueFull(Exception):
+    pass
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class CompletionLimiter:
+    """Bounds in-flight completions, with a bounded queue of waiters behind them."""
+
+    def __init__(self, max_in_flight: int, max_queued: int):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore = None
+
+    async def __aenter__(self):
+        # Created lazily so it belongs to the server's event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        if self._semaphore.locked() and self.waiting >= self.max_queued:
+            raise QueueFull()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+
+def parse_form(body: bytes, content_type: str) -> Tuple[Dict[str, str], Optional[Tuple[str, str, bytes]]]:
+    """Return the form fields and the uploaded (filename, content type, bytes), if any.
+
+    Accepts JSON, url-encoded and multipart bodies, so both the browser UI
+    and API clients of the Flask apps work unchanged.
+    """
+    if content_type.startswith('application/json'):
+        data = json.loads(body or b'{}')
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object")
+        return {key: str(value) for key, value in data.items() if value is not None}, None
+    if content_type.startswith('application/x-www-form-urlencoded'):
+        return {key: values[0] for key, values in parse_qs(body.decode('utf-8')).items()}, None
+    if not content_type.startswith('multipart/form-data'):
+        return {}, None
+
+    message = BytesParser(policy=policy.HTTP).parsebytes(
+        b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n' + body)
+    fields, upload = {}, None
+    for part in message.iter_parts():
+        name = part.get_param('name', header='content-disposition')
+        filename = part.get_filename()
+        payload = part.get_payload(decode=True) or b''
+        if filename is not None:
+            if name == 'file':
+                upload = (filename, part.get_content_type(), payload)
+        elif name:
+            fields[name] = payload.decode(part.get_content_charset() or 'utf-8')
+    return fields, upload
+
+
+class ChatApp:
+    """ASGI application serving the UI, ``/chat`` and ``/chat/stream``."""
+
+    def __init__(self, bot: PolicyAdvisorBot = None, max_in_flight: int = None, max_queued: int = None,
+                 retrieval_threads: int = None, retry_after: int = None):
+        # Without a bot one is built at startup or on the first chat, not at import
+        self._bot = bot
+        self._bot_lock = threading.Lock()
+        self.limiter = CompletionLimiter(max_in_flight or int(os.getenv('MAX_IN_FLIGHT', 64)),
+                                         max_queued if max_queued is not None else int(os.getenv('MAX_QUEUED', 256)))
+        self.executor = ThreadPoolExecutor(retrieval_threads or int(os.getenv('RETRIEVAL_THREADS', 8)),
+                                           thread_name_prefix='retrieval')
+        self.retry_after = retry_after or int(os.getenv('RETRY_AFTER', 2))
+
+    def build_bot(self) -> PolicyAdvisorBot:
+        """Return the bot, building it (and its background threads) the first time; blocking."""
+        if self._bot is None:
+            with self._bot_lock:
+                if self._bot is None:
+                    bot = PolicyAdvisorBot()
+                    start_cache_warming(bot)
+                    start_delta_watcher(bot)
+                    self._bot = bot
+        return self._bot
+
+    async def get_bot(self) -> PolicyAdvisorBot:
+        if self._bot is not None:
+            return self._bot
+        # Loading the corpus blocks, so it runs on the retrieval pool rather than the event loop
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.build_bot)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        path, method = scope['path'], scope['method']
+        if method == 'POST' and path in ('/chat', '/chat/stream'):
+            await self.chat(scope, receive, send, stream=path == '/chat/stream')
+        elif method == 'GET' and path == '/metrics':
+            await self.send_metrics(send)
+        elif method in ('GET', 'HEAD'):
+            await self.static(path, send)
+        else:
+            await self.send_json(send, 405, {'error': 'Method not allowed'})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self.get_bot()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._bot is not None:
+                    await self._bot.llm.aclose()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive) -> Optional[bytes]:
+        """Return the request body, or None if the client disconnected; raises BodyTooLarge."""
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            body.extend(message.get('body', b''))
+            if len(body) > MAX_BODY_BYTES:
+                raise BodyTooLarge()
+            if not message.get('more_body'):
+                return bytes(body)
+
+    async def chat(self, scope, receive, send, stream: bool):
+        headers = {key.decode('latin-1').lower(): value.decode('latin-1') for key, value in scope['headers']}
+        try:
+            body = await self.read_body(receive)
+        except BodyTooLarge:
+            await self.send_json(send, 413, {'error': 'Request body too large'})
+            return
+        if body is None:
+            return  # The client went away; there is no one to answer
+        try:
+            fields, upload = parse_form(body, headers.get('content-type', ''))
+        except ValueError as e:
+            await self.send_json(send, 400, {'error': f'Malformed request body: {e}'})
+            return
+
+        message = fields.get('message')
+        if not message:
+            await self.send_json(send, 400, {'error': 'No message provided'})
+            return
+
+        cookies = SimpleCookie(headers.get('cookie', ''))
+        session_id = fields.get('session_id') or (cookies[SESSION_COOKIE].value if SESSION_COOKIE in cookies else None)
+        if not session_id or not SESSION_ID_PATTERN.match(session_id):
+            session_id = uuid.uuid4().hex
+        cookie_header = (b'set-cookie', f'{SESSION_COOKIE}={session_id}; HttpOnly; Path=/; SameSite=Lax'.encode('latin-1'))
+
+        bot = await self.get_bot()
+        if upload and '.' in upload[0] and upload[0].rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS:
+            # Extraction is blocking work, so it runs on the retrieval pool
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    self.executor, bot.add_upload, session_id, upload[2], upload[1])
+            except UploadError as e:
+                await self.send_json(send, 400, {'error': f'Could not read uploaded file: {e}'})
+                return
+
+        # Only the completion itself takes a limiter slot; retrieval and session I/O do not
+        try:
+            if stream:
+                await self.stream_chat(bot, send, message, session_id, cookie_header, fields.get('corpus'))
+            else:
+                await self.complete_chat(bot, send, message, session_id, cookie_header, fields.get('corpus'))
+        except QueueFull:
+            await self.send_json(send, 429, {'error': 'Too many concurrent requests, please retry shortly'},
+                                 [(b'retry-after', str(self.retry_after).encode('latin-1'))])
+
+    async def complete_chat(self, bot, send, message, session_id, cookie_header, corpus_filter=None):
+        try:
+            response = await bot.aget_response(message, session_id=session_id, executor=self.executor,
+                                               corpus_filter=corpus_filter, limiter=self.limiter)
+        except QueueFull:
+            raise
+        except Exception as e:
+            logger.error(f"Error in chat endpoint: {str(e)}", exc_info=True)
+            await self.send_json(send, 500, {'error': str(e)})
+            return
+        await self.send_json(send, 200, {'response': response, 'session_id': session_id}, [cookie_header])
+
+    async def stream_chat(self, bot, send, message, session_id, cookie_header, corpus_filter=None):
+        deltas = bot.astream_response(message, session_id=session_id, executor=self.executor,
+                                      corpus_filter=corpus_filter, limiter=self.limiter)
+        parts = []
+        try:
+            # Headers wait for the first piece of text, so a full queue can still be answered with 429
+            first = await deltas.__anext__()
+        except StopAsyncIteration:
+            first = None
+        except QueueFull:
+            raise
+        except Exception as e:
+            logger.error(f"Error in chat stream: {str(e)}", exc_info=True)
+            await self.send_json(send, 500, {'error': str(e)})
+            return
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'), cookie_header]})
+        try:
+            if first is not None:
+                parts.append(first)
+                await send({'type': 'http.response.body', 'body': sse_event({'delta': first}).encode('utf-8'),
+                            'more_body': True})
+                async for delta in deltas:
+                    parts.append(delta)
+                    await send({'type': 'http.response.body', 'body': sse_event({'delta': delta}).encode('utf-8'),
+                                'more_body': True})
+            event = sse_event({'response': "".join(parts)}, event='done')
+        except Exception as e:
+            logger.error(f"Error in chat stream: {str(e)}", exc_info=True)
+            event = sse_event({'error': str(e)}, event='error')
+        await send({'type': 'http.response.body', 'body': event.encode('utf-8')})
+
+    async def static(self, path: str, send):
+        relative = 'index.html' if path == '/' else path.lstrip('/')
+        file_path = os.path.normpath(os.path.join(STATIC_FOLDER, relative))
+        if not file_path.startswith(STATIC_FOLDER + os.sep) or not os.path.isfile(file_path):
+            await self.send_json(send, 404, {'error': 'Not found'})
+            return
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        content_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', content_type.encode('latin-1')), (b'content-length', str(len(data)).encode('latin-1'))]})
+        await send({'type': 'http.response.body', 'body': data})
+
+    async def send_metrics(self, send):
+        data = REGISTRY.render().encode('utf-8')
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/plain; version=0.0.4'), (b'content-length', str(len(data)).encode('latin-1'))]})
+        await send({'type': 'http.response.body', 'body': data})
+
+    async def send_json(self, send, status: int, payload: Dict, headers=()):
+        data = json.dumps(payload).encode('utf-8')
+        await send({'type': 'http.response.start', 'status': status, 'headers': [
+            (b'content-type', b'application/json'), (b'content-length', str(len(data)).encode('latin-1')),
+            *headers]})
+        await send({'type': 'http.response.body', 'body': data})
+
+
+app = ChatApp()
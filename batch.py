@@ -0,0 +1,187 @@
+"""Answer a file of questions offline, for evaluations and response cache warming.
+
+    python batch.py questions.txt --output answers.jsonl --concurrency 8
+
+Questions are one per line, or JSONL objects with a ``question`` (or
+``query``) and an optional ``count``, as in a query log; ``--top N`` keeps the
+N most frequent. All questions are ranked in one vectorized batch, then the
+completions run on a pool of ``--concurrency`` threads. Each answer is written
+as a JSON line with its retrieved sources and per-stage timings.
+
+``--fake-llm`` answers from an in-process fake_llm.py server, so a
+regression run over hundreds of questions takes minutes, and ``--compare
+old.jsonl`` lists the questions whose sources or answers changed since an
+earlier run. ``--retrieval-only`` skips the completions altogether.
+
+In a running server, ``WARM_CACHE_FILE`` (and ``WARM_CACHE_TOP``, default 100)
+warms each worker's response cache from such a file in the background.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from response_cache import ResponseCache
+
+DEFAULT_CONCURRENCY = 8
+
+
+def read_questions(path: str, top: int = None) -> List[str]:
+    """Read questions, dropping repeats of the same normalized question, in file order or by frequency."""
+    counts: Counter = Counter()
+    questions: Dict[str, str] = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                record = json.loads(line)
+                question, count = record.get('question') or record.get('query') or '', int(record.get('count', 1))
+            else:
+                question, count = line, 1
+            key = ResponseCache.normalize(question)
+            if key:
+                questions.setdefault(key, question)
+                counts[key] += count
+    if top:
+        return [questions[key] for key, _ in counts.most_common(top)]
+    return list(questions.values())
+
+
+def run_batch(bot, questions: Sequence[str], concurrency: int = DEFAULT_CONCURRENCY, warm_cache: bool = False,
+              retrieval_only: bool = False, corpus_filter: str = None) -> Iterator[Dict]:
+    """Answer ``questions`` with ``bot``, yielding one record per question in order.
+
+    With ``warm_cache`` questions already in the bot's response cache are not
+    asked again, and new answers are stored in it. Answers limited by
+    ``corpus_filter`` are not cached.
+    """
+    warm_cache = warm_cache and not corpus_filter
+    questions = list(questions)
+    start = time.perf_counter()
+    hits = bot.rank_batch(questions, corpus_filter)
+    retrieval = (time.perf_counter() - start) / max(len(questions), 1)
+
+    records, contexts = [], []
+    for question, question_hits in zip(questions, hits):
+        start = time.perf_counter()
+        contexts.append(bot.render_context(question_hits))
+        records.append({'question': question,
+                        'sources': bot.hit_sources(question_hits),
+                        'timings': {'retrieval': round(retrieval, 6),
+                                    'context': round(time.perf_counter() - start, 6)}})
+    if retrieval_only:
+        yield from records
+        return
+
+    def answer(i: int) -> Dict:
+        record, context = records[i], contexts[i]
+        question = record['question']
+        if warm_cache:
+            cached = bot.response_cache.get_exact(question)
+            if cached is not None:
+                record.update(answer=cached, cached=True)
+                return record
+        # Asked without any session's history, since warmed answers are cached for everyone
+        messages = bot.build_messages(question, data_context=context, file_context="", history=())
+        start = time.perf_counter()
+        try:
+            record['answer'] = bot.llm.complete(messages).strip()
+        except Exception as e:
+            record.update(answer=None, error=str(e))
+        record['timings']['llm'] = round(time.perf_counter() - start, 6)
+        if warm_cache and record['answer']:
+            bot.response_cache.put(question, context, record['answer'])
+        return record
+
+    with ThreadPoolExecutor(concurrency, thread_name_prefix='batch') as pool:
+        yield from pool.map(answer, range(len(records)))
+
+
+def warm_cache(bot, path: str, top: int = None, concurrency: int = DEFAULT_CONCURRENCY) -> int:
+    """Fill the bot's response cache with answers to the (top) questions in ``path``; returns how many."""
+    records = list(run_batch(bot, read_questions(path, top), concurrency, warm_cache=True))
+    return sum(1 for record in records if record['answer'])
+
+
+def start_cache_warming(bot) -> Optional[threading.Thread]:
+    """Warm the cache from WARM_CACHE_FILE on a background thread, if it is set."""
+    path = os.getenv('WARM_CACHE_FILE')
+    if not path:
+        return None
+    thread = threading.Thread(target=warm_cache, args=(bot, path, int(os.getenv('WARM_CACHE_TOP', 100))),
+                              name='warm-cache', daemon=True)
+    thread.start()
+    return thread
+
+
+def read_records(path: str) -> Dict[str, Dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return {record['question']: record for record in map(json.loads, f) if record}
+
+
+def compare(old: Dict[str, Dict], new: Dict[str, Dict]) -> Dict[str, List[str]]:
+    """Questions of two runs whose retrieved sources or answers differ."""
+    common = [question for question in new if question in old]
+    return {
+        'sources_changed': [q for q in common if old[q]['sources'] != new[q]['sources']],
+        'answers_changed': [q for q in common if old[q].get('answer') != new[q].get('answer')],
+        'added': [q for q in new if q not in old],
+        'removed': [q for q in old if q not in new],
+    }
+
+
+def main(argv: Sequence[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('questions', help='text file with one question per line, or a JSONL query log')
+    parser.add_argument('--output', default='-', help='JSONL file for the answers (default: stdout)')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help='completions in flight at once')
+    parser.add_argument('--top', type=int, help='only the N most frequent questions')
+    parser.add_argument('--ranker', help='retrieval ranker (default: $RANKER or bm25)')
+    parser.add_argument('--shards', help='shard manifest to retrieve from (default: $SHARDS, if set)')
+    parser.add_argument('--corpus', help='corpus filter for sharded retrieval, e.g. policyadvisor/life-insurance')
+    parser.add_argument('--retrieval-only', action='store_true', help='retrieve sources without completions')
+    parser.add_argument('--fake-llm', action='store_true', help='answer from an in-process fake completion server')
+    parser.add_argument('--compare', metavar='OLD_JSONL', help='report what changed since an earlier run')
+    args = parser.parse_args(argv)
+
+    if args.fake_llm:
+        import fake_llm
+        fake = fake_llm.serve(0, background=True, seed=0)
+        os.environ['OPENAI_API_BASE'] = f'http://127.0.0.1:{fake.server_port}/v1'
+        os.environ.setdefault('OPENAI_API_KEY', 'fake')
+    from chatbot import PolicyAdvisorBot
+    bot = PolicyAdvisorBot(ranker=args.ranker, shards=args.shards)
+
+    questions = read_questions(args.questions, args.top)
+    start = time.perf_counter()
+    new = {}
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        for record in run_batch(bot, questions, args.concurrency, retrieval_only=args.retrieval_only,
+                                corpus_filter=args.corpus):
+            output.write(json.dumps(record, ensure_ascii=False) + '\n')
+            new[record['question']] = record
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    errors = sum(1 for record in new.values() if record.get('error'))
+    done = "Retrieved sources for" if args.retrieval_only else f"Answered {len(new) - errors} of"
+    print(f"{done} {len(new)} questions in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+
+    if args.compare:
+        for name, changed in compare(read_records(args.compare), new).items():
+            print(f"{name}: {len(changed)}", file=sys.stderr)
+            for question in changed:
+                print(f"  {question}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
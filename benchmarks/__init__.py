@@ -0,0 +1 @@
+"""Benchmark suite; run ``python -m benchmarks.run`` from the project root."""
@@ -0,0 +1,130 @@
+"""Query set, synthetic corpora and timing helpers shared by the benchmarks."""
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from typing import Dict, List, Sequence
+
+from corpus import iter_pages, source_path
+
+DATA_FILE = 'data/policyadvisor_data.jsonl'
+
+# Representative questions; repeated in rounds to get stable percentiles
+QUERIES = [
+    "what is term life insurance",
+    "term life vs whole life",
+    "how much does life insurance cost in canada",
+    "critical illness insurance for diabetics",
+    "disability insurance for self employed",
+    "health insurance for self employed",
+    "what does travel insurance cover",
+    "best mortgage protection insurance",
+    "life insurance for seniors over 70",
+    "group benefits through my employer",
+    "how do life insurance medical exams work",
+    "can i get life insurance with a pre-existing condition",
+    "what is a beneficiary",
+    "joint life insurance for couples",
+    "is life insurance taxable in canada",
+    "how to cancel a life insurance policy",
+    "who is the ceo of policyadvisor",
+    "who founded policyadvisor",
+    "universal life insurance explained",
+    "no medical life insurance",
+    "long term care insurance cost",
+    "dental insurance plans ontario",
+    "children's life insurance",
+    "how much life insurance do i need",
+    "return of premium rider",
+    "accidental death and dismemberment",
+    "life insurance for smokers",
+    "convert term to permanent insurance",
+    "what happens if i miss a premium payment",
+    "compare insurance quotes online",
+]
+
+
+def percentiles(samples_seconds: Sequence[float]) -> Dict[str, float]:
+    """Summarize latencies in milliseconds."""
+    ordered = sorted(samples_seconds)
+    if not ordered:
+        return {'count': 0}
+
+    def at(fraction: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] * 1000, 3)
+
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'p50_ms': at(0.50),
+        'p90_ms': at(0.90),
+        'p99_ms': at(0.99),
+        'max_ms': at(1.0),
+    }
+
+
+def _perturb(value, rng: random.Random, vocabulary: List[str], rate: float):
+    # Swap a share of the words so copies are similar to, but not the same as, the originals
+    if isinstance(value, str):
+        words = value.split(' ')
+        if len(words) < 3:
+            return value
+        return ' '.join(rng.choice(vocabulary) if rng.random() < rate else word for word in words)
+    if isinstance(value, list):
+        return [_perturb(item, rng, vocabulary, rate) for item in value]
+    if isinstance(value, dict):
+        return {key: _perturb(item, rng, vocabulary, rate) for key, item in value.items()}
+    return value
+
+
+def scaled_corpus(pages: List[Dict], factor: int, seed: int = 0, rate: float = 0.2) -> List[Dict]:
+    """Return ``factor`` times as many pages: the originals plus perturbed copies.
+
+    Each copy gets its own URL and has ``rate`` of its words replaced by words
+    drawn from the corpus, so vocabulary size and term statistics grow
+    roughly as they would with a bigger crawl.
+    """
+    rng = random.Random(seed)
+    texts = [' '.join([page['title'], page['content'] or '', str(page.get('metadata', {}).get('description', ''))])
+             for page in pages]
+    vocabulary = sorted({word for text in texts for word in text.split() if word.isalpha()})
+    scaled = list(pages)
+    for copy in range(1, factor):
+        for page in pages:
+            clone = _perturb(page, rng, vocabulary, rate)
+            clone['url'] = f"{page['url'].rstrip('/')}/copy-{copy}/"
+            scaled.append(clone)
+    return scaled
+
+
+def write_scaled_corpus(source: str, factor: int, directory: str) -> str:
+    """Write the ``factor``x corpus of ``source`` into ``directory`` and return its path.
+
+    The 1x corpus is a plain copy, so the compiled corpus, embeddings and
+    artifacts a benchmark builds never touch the files next to ``source``.
+    """
+    pages = list(iter_pages(source_path(source)))
+    path = os.path.join(directory, f'corpus_{factor}x.jsonl')
+    with open(path, 'w', encoding='utf-8') as f:
+        for page in scaled_corpus(pages, factor):
+            f.write(json.dumps(page) + '\n')
+    return path
+
+
+def environment() -> Dict:
+    """Describe the machine and revision a result came from."""
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        revision = None
+    return {
+        'revision': revision or None,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
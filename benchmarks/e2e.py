@@ -0,0 +1,70 @@
+"""End-to-end /chat throughput under concurrent load against the fake completion server.
+
+By default server.py's Flask app is served in-process and the bot talks to
+fake_llm.py, so the numbers reflect our own overhead plus the configured fake
+latency. Pass ``url`` to load-test a server started separately instead, e.g.
+``uvicorn asgi:app`` pointed at a fake_llm.py instance.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Sequence
+
+import requests
+
+from benchmarks.common import QUERIES, percentiles
+
+
+def start_local_server(latency: float, token_delay: float) -> str:
+    import fake_llm
+    fake = fake_llm.serve(0, token_delay, background=True, latency=latency, seed=0)
+    os.environ['OPENAI_API_BASE'] = f'http://127.0.0.1:{fake.server_port}/v1'
+    os.environ.setdefault('OPENAI_API_KEY', 'fake')
+    # Every request should reach the completion server
+    os.environ['RESPONSE_CACHE_SIZE'] = '0'
+
+    from werkzeug.serving import make_server
+    import server
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    http_server = make_server('127.0.0.1', 0, server.app, threaded=True)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{http_server.server_port}'
+
+
+def load(url: str, concurrency: int, total: int) -> Dict:
+    local = threading.local()
+    latencies, errors = [], []
+
+    def one(i: int) -> None:
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            response = local.session.post(f'{url}/chat', data={'message': f'{QUERIES[i % len(QUERIES)]} ({i})'},
+                                          timeout=120)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+        except requests.RequestException as e:
+            errors.append(str(e))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+    return {'requests': total, 'errors': len(errors), 'seconds': round(elapsed, 3),
+            'requests_per_second': round(len(latencies) / elapsed, 2), 'latency': percentiles(latencies)}
+
+
+def run(concurrency: Sequence[int] = (1, 8, 32), requests_per_level: int = 200, url: str = None,
+        latency: float = 0.05, token_delay: float = 0.0) -> Dict:
+    target = url or start_local_server(latency, token_delay)
+    results = {'target': 'external' if url else 'in-process flask', 'fake_latency_seconds': None if url else latency}
+    for level in concurrency:
+        result = load(target, level, requests_per_level)
+        results[f'concurrency_{level}'] = result
+        print(f"e2e concurrency {level}: {result['requests_per_second']} req/s, "
+              f"p99 {result['latency'].get('p99_ms')} ms, {result['errors']} errors", file=sys.stderr)
+    return results
@@ -0,0 +1,44 @@
+"""Retrieval latency: ranking alone and the full find_relevant_content, per corpus scale and ranker."""
+import sys
+import tempfile
+import time
+from typing import Dict, Sequence
+
+from benchmarks.common import DATA_FILE, QUERIES, percentiles, write_scaled_corpus
+from chatbot import PolicyAdvisorBot
+from metrics import Trace
+
+
+def bench_bot(bot: PolicyAdvisorBot, rounds: int) -> Dict:
+    for query in QUERIES:  # Warm caches and lazy structures first
+        bot.find_relevant_content(query)
+
+    # Ranking time is the retrieval stage that find_relevant_content itself traces
+    rank_times, context_times = [], []
+    for _ in range(rounds):
+        for query in QUERIES:
+            trace = Trace('benchmark')
+            start = time.perf_counter()
+            bot.find_relevant_content(query, trace)
+            context_times.append(time.perf_counter() - start)
+            rank_times.append(trace.stages['retrieval'])
+    return {'rank': percentiles(rank_times), 'find_relevant_content': percentiles(context_times)}
+
+
+def run(scales: Sequence[int] = (1, 10, 100), rankers: Sequence[str] = ('bm25', 'substring', 'semantic'),
+        rounds: int = 5, data_file: str = DATA_FILE) -> Dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for factor in scales:
+            path = write_scaled_corpus(data_file, factor, directory)
+            for name in rankers:
+                start = time.perf_counter()
+                bot = PolicyAdvisorBot(ranker=name, data_file=path)
+                build_seconds = time.perf_counter() - start
+                result = bench_bot(bot, rounds)
+                result.update({'pages': len(bot.data), 'chunks': len(bot.chunks),
+                               'build_seconds': round(build_seconds, 3)})
+                results[f'{factor}x/{name}'] = result
+                print(f"retrieval {factor}x {name}: p50 {result['find_relevant_content']['p50_ms']} ms, "
+                      f"p99 {result['find_relevant_content']['p99_ms']} ms", file=sys.stderr)
+    return results
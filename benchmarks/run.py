@@ -0,0 +1,87 @@
+"""Run the benchmark suite and emit the results as JSON.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --only retrieval --scales 1,10 --compare results.json
+
+Progress goes to stderr; the JSON goes to stdout unless --output is given.
+With --compare, metrics that moved by more than --threshold relative to an
+earlier result file are listed on stderr.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Iterator, Tuple
+
+from benchmarks import e2e, retrieval, startup
+from benchmarks.common import DATA_FILE, environment
+
+SUITES = ('retrieval', 'startup', 'e2e')
+
+
+def int_list(value: str):
+    return [int(item) for item in value.split(',') if item]
+
+
+def numeric_leaves(result: Dict, prefix: str = '') -> Iterator[Tuple[str, float]]:
+    for key, value in result.items():
+        path = f'{prefix}.{key}' if prefix else key
+        if isinstance(value, dict):
+            yield from numeric_leaves(value, path)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, value
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> None:
+    before = dict(numeric_leaves(baseline))
+    for path, value in numeric_leaves(current):
+        if path.startswith('environment.') or not before.get(path):
+            continue
+        change = (value - before[path]) / before[path]
+        if abs(change) >= threshold:
+            print(f"{path}: {before[path]} -> {value} ({change:+.0%})", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark retrieval, startup and end-to-end chat.')
+    parser.add_argument('--only', default=','.join(SUITES), help='Comma-separated suites to run')
+    parser.add_argument('--data', default=DATA_FILE, help='Corpus to benchmark and scale up')
+    parser.add_argument('--scales', type=int_list, default=[1, 10, 100], help='Corpus size multipliers')
+    parser.add_argument('--rankers', default='bm25,substring,semantic')
+    parser.add_argument('--rounds', type=int, default=5, help='Passes over the query set per retrieval benchmark')
+    parser.add_argument('--concurrency', type=int_list, default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=200, help='Chat requests per concurrency level')
+    parser.add_argument('--latency', type=float, default=0.05, help='Fake completion latency in seconds')
+    parser.add_argument('--url', help='Load-test this running server instead of an in-process one')
+    parser.add_argument('--output', help='Write the JSON here instead of stdout')
+    parser.add_argument('--compare', help='Earlier result file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Relative change worth reporting')
+    args = parser.parse_args()
+
+    suites = [suite for suite in args.only.split(',') if suite]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+    rankers = [name for name in args.rankers.split(',') if name]
+
+    results = {'environment': environment()}
+    if 'retrieval' in suites:
+        results['retrieval'] = retrieval.run(args.scales, rankers, args.rounds, args.data)
+    if 'startup' in suites:
+        results['startup'] = startup.run(args.scales, rankers, args.data)
+    if 'e2e' in suites:
+        results['e2e'] = e2e.run(args.concurrency, args.requests, args.url, args.latency)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(results, json.load(f), args.threshold)
+
+
+if __name__ == '__main__':
+    main()
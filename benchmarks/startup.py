@@ -0,0 +1,78 @@
+"""Startup cost: time to import and build a PolicyAdvisorBot, answer a first retrieval, and peak memory.
+
+Every measurement runs in a fresh interpreter. The second run of a corpus
+shows the effect of anything cached on disk by the first, and the last run
+loads the retrieval artifacts prebuilt by ``python artifacts.py``.
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Sequence
+
+from benchmarks.common import DATA_FILE, QUERIES, write_scaled_corpus
+
+
+def measure(data_file: str, ranker: str) -> Dict:
+    """Run in the child process: build the bot, retrieve once and report timings and peak RSS."""
+    start = time.perf_counter()
+    from chatbot import PolicyAdvisorBot
+    imported = time.perf_counter()
+    bot = PolicyAdvisorBot(ranker=ranker, data_file=data_file)
+    ready = time.perf_counter()
+    bot.find_relevant_content(QUERIES[0])
+    answered = time.perf_counter()
+    return {'import_seconds': round(imported - start, 3), 'build_seconds': round(ready - imported, 3),
+            'total_seconds': round(ready - start, 3), 'first_query_seconds': round(answered - ready, 3),
+            'peak_rss_mb': round(peak_rss_mb(), 1)}
+
+
+def peak_rss_mb() -> float:
+    # On Linux ru_maxrss survives exec and would report the parent's peak, so prefer VmHWM
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 * 1024) if sys.platform == 'darwin' else max_rss / 1024
+
+
+def measure_in_subprocess(data_file: str, ranker: str) -> Dict:
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.startup', '--child', data_file, ranker],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(scales: Sequence[int] = (1, 10, 100), rankers: Sequence[str] = ('bm25', 'substring', 'semantic'),
+        data_file: str = DATA_FILE) -> Dict:
+    # Not imported at the top, so the children time their own imports
+    from artifacts import build_artifacts
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for factor in scales:
+            path = write_scaled_corpus(data_file, factor, directory)
+            for name in rankers:
+                runs = [measure_in_subprocess(path, name) for _ in range(2)]
+                results[f'{factor}x/{name}'] = {'first_run': runs[0], 'second_run': runs[1]}
+            build_artifacts(path)
+            for name in rankers:
+                result = results[f'{factor}x/{name}']
+                result['artifacts'] = measure_in_subprocess(path, name)
+                print(f"startup {factor}x {name}: {result['first_run']['total_seconds']} s, then "
+                      f"{result['second_run']['total_seconds']} s, {result['artifacts']['total_seconds']} s with "
+                      f"artifacts, peak {result['artifacts']['peak_rss_mb']} MB", file=sys.stderr)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--child', nargs=2, metavar=('DATA_FILE', 'RANKER'), required=True)
+    args = parser.parse_args()
+    print(json.dumps(measure(*args.child)))
@@ -1,133 +1,211 @@
-import openai
+import asyncio
 import json
 import os
-from typing import List, Dict
+import threading
+import time
+from concurrent.futures import Executor
+from contextlib import nullcontext
+from typing import List, Dict, AsyncIterator, Iterator, Optional, Sequence
+from ranking import build_ranker
+from chunking import chunk_page, chunk_pages, estimate_tokens
+from context import SECTION_SEPARATOR, ContextBuilder
+from corpus import delta_path, load_corpus
+from artifacts import load_artifacts
+from sessions import ConversationStore, create_store
+from response_cache import ResponseCache, fingerprint
+from llm_client import LLMClient
+from uploads import UploadStore, read_upload
+from metrics import Trace, timed
+
+# Scraper output; the older JSON array next to it is read if it is newer (corpus.source_path)
+DATA_FILE = 'data/policyadvisor_data.jsonl'
+# Changes found by `python scraper.py --incremental` (scraper.DELTA_FILE); bots over
+# another data file watch the delta next to it (corpus.delta_path)
+DELTA_FILE = delta_path(DATA_FILE)
+# How often running bots check for a new delta; DELTA_POLL_SECONDS=0 turns it off
+DELTA_POLL_SECONDS = 60
+# Ranked chunks considered for the context; the token budget decides how many fit
+CHUNK_CANDIDATES = 30
+# Session used when the caller does not track sessions, e.g. the CLI
+DEFAULT_SESSION = 'default'
+
+def apology(error: Exception) -> str:
+    # Shown to the user but never recorded, so a failure does not pollute the conversation
+    return f"I apologize, but I encountered an error: {str(error)}"
 
 class PolicyAdvisorBot:
-    def __init__(self):
-        openai.api_key = os.getenv('OPENAI_API_KEY')
-        self.data = self.load_data()
-        self.conversation_history = []
+    def __init__(self, ranker: str = None, context_tokens: int = None, sessions: ConversationStore = None,
+                 response_cache: ResponseCache = None, llm: LLMClient = None, data_file: str = None,
+                 uploads: UploadStore = None, shards: str = None):
+        # Pooled completion client with deadlines, retries and a circuit breaker (LLM_* settings)
+        self.llm = llm or LLMClient.from_env()
+        self.data_file = data_file or DATA_FILE
+        context_tokens = context_tokens or int(os.getenv('CONTEXT_TOKENS', 1500))
+        # SHARDS=data/shards/manifest.json retrieves from the corpora built by shards.py, in SHARD_WORKERS processes
+        shards = shards or os.getenv('SHARDS')
+        self.shards = None
+        if shards:
+            from shards import ShardedRetriever
+            self.shards = ShardedRetriever(shards, int(os.getenv('SHARD_WORKERS', 0)) or None, context_tokens,
+                                           CHUNK_CANDIDATES)
+            self.data, self.chunks, self.ranker, self.context_builder = [], [], None, None
+        else:
+            self.data = self.load_data()
+            # Chunks, BM25 index and page headers prebuilt by artifacts.py, if they match the corpus
+            artifacts = load_artifacts(self.data_file, self.data)
+            self.chunks = artifacts.chunks if artifacts is not None else chunk_pages(self.data)
+            # 'bm25' by default, 'semantic' for embeddings, 'substring' for the original scorer
+            self.ranker = build_ranker(ranker or os.getenv('RANKER', 'bm25'), self.data, self.chunks,
+                                       data_path=self.data_file, artifacts=artifacts)
+            self.context_builder = ContextBuilder(self.data, self.chunks, context_tokens, artifacts=artifacts)
         self.max_history = 5  # Keep last 5 messages for context
+        # Per-session history: 'memory' (default) or 'sqlite:///path' to share it between workers
+        self.sessions = sessions or create_store(os.getenv('SESSION_STORE', 'memory'), max_turns=self.max_history)
+        # Answers to repeated questions; RESPONSE_CACHE_SIZE=0 turns caching off
+        self.response_cache = response_cache or ResponseCache(int(os.getenv('RESPONSE_CACHE_SIZE', 2048)),
+                                                              float(os.getenv('RESPONSE_CACHE_TTL', 6 * 60 * 60)))
+        # Each session's latest uploaded document; UPLOAD_CONTEXT_TOKENS of it go into each prompt
+        self.uploads = uploads or UploadStore()
+        self.upload_tokens = int(os.getenv('UPLOAD_CONTEXT_TOKENS', 1000))
+        self._page_ids_by_url = None
+        self._delta_lock = threading.Lock()  # One delta at a time
         
-    def load_data(self) -> List[Dict]:
+    def load_data(self) -> Sequence[Dict]:
+        # Prefers the compiled corpus, whose pages decode on access; JSONL is compiled as it streams in
         try:
-            with open('data/policyadvisor_data.json', 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return load_corpus(self.data_file)
         except FileNotFoundError:
             print("No data file found. Please run the scraper first.")
             return []
 
-    def find_relevant_content(self, query: str) -> str:
-        # Enhanced search including all structured data
-        relevant_texts = []
-        query = query.lower()
-        query_terms = query.split()
-        
-        for page in self.data:
-            score = 0
-            metadata_text = ""
-            
-            # Search in title and content with term matching
-            title_lower = page['title'].lower()
-            content_lower = page['content'].lower() if page['content'] else ""
-            
-            # Score based on number of query terms matched
-            for term in query_terms:
-                if term in title_lower:
-                    score += 3  # Title matches are more important
-                if term in content_lower:
-                    score += 2
-            
-            # Search in structured data
-            if 'structured_data' in page and page['structured_data']:
-                structured_text = json.dumps(page['structured_data']).lower()
-                for term in query_terms:
-                    if term in structured_text:
-                        score += 2
-                metadata_text += "Structured Data:\n" + json.dumps(page['structured_data'], indent=2) + "\n"
-            
-            # Search in FAQs
-            if 'faqs' in page and page['faqs']:
-                for faq in page['faqs']:
-                    faq_text = (faq.get('question', '') + ' ' + faq.get('answer', '')).lower()
-                    for term in query_terms:
-                        if term in faq_text:
-                            score += 2
-                    if score > 0:
-                        metadata_text += "FAQ:\n" + json.dumps(faq, indent=2) + "\n"
-            
-            # Enhanced metadata search
-            if 'metadata' in page:
-                for key, value in page['metadata'].items():
-                    if isinstance(value, str):
-                        value_lower = value.lower()
-                        for term in query_terms:
-                            if term in value_lower:
-                                score += 1
-                                if key in ['description', 'og:description', 'twitter:description']:
-                                    score += 1  # Boost description matches
-                        metadata_text += f"{key}: {value}\n"
-                    elif key == 'author' and any(term in ['ceo', 'founder', 'author', 'who'] for term in query_terms):
-                        score += 2  # Boost author matches for leadership questions
-                        metadata_text += f"Author: {value}\n"
-            
-            # Include categories and related topics
-            if 'categories' in page and page['categories']:
-                categories_text = ' '.join(page['categories']).lower()
-                for term in query_terms:
-                    if term in categories_text:
-                        score += 1
-                metadata_text += f"Categories: {', '.join(page['categories'])}\n"
-            
-            if 'related_topics' in page and page['related_topics']:
-                topics_text = ' '.join(page['related_topics']).lower()
-                for term in query_terms:
-                    if term in topics_text:
-                        score += 1
-                metadata_text += f"Related Topics: {', '.join(page['related_topics'])}\n"
-            
-            if score > 0:
-                content = f"Title: {page['title']}\n"
-                if metadata_text:
-                    content += f"Additional Information:\n{metadata_text}\n"
-                if page.get('content_structure'):
-                    content += "Content Structure:\n"
-                    for item in page['content_structure']:
-                        if item['type'] == 'heading':
-                            content += f"\nHeading (Level {item['level']}): {item['text']}\n"
-                        elif item['type'] == 'paragraph':
-                            content += f"{item['text']}\n"
-                        elif item['type'] == 'list':
-                            content += "- " + "\n- ".join(item['items']) + "\n"
-                elif page['content']:
-                    content += f"Content: {page['content'][:1000]}..."
-                relevant_texts.append((score, content))
-        
-        # Sort by relevance score and return top 5 (increased from 3)
-        relevant_texts.sort(key=lambda x: x[0], reverse=True)
-        return "\n\n".join(text for score, text in relevant_texts[:5])
-
-    def process_file(self, file_content: str, file_type: str) -> str:
-        """Process uploaded files and extract relevant information."""
-        # Basic text extraction based on file type
-        if file_type == 'application/pdf':
-            # For now, just use the raw text. In a real implementation,
-            # you'd want to use a proper PDF parser
-            return file_content
-        elif file_type.startswith('text/'):
-            return file_content
-        else:
-            return "Unsupported file type"
+    def apply_delta(self, delta: Dict) -> None:
+        """Apply a crawl delta (scraper.DELTA_FILE) to the loaded corpus and indexes in place.
 
-    def get_response(self, user_input: str, file_content: str = None, file_type: str = None) -> str:
-        # Process any uploaded file
-        file_context = ""
-        if file_content and file_type:
-            file_context = self.process_file(file_content, file_type)
+        Changed pages are appended as new pages and their old versions, like
+        deleted pages, are removed from the rankers, so nothing is rebuilt.
+        Rankers swap in their updated indexes, so requests served meanwhile
+        never see a half-updated index.
+        """
+        if self.shards is not None:
+            raise RuntimeError("Crawl deltas are not applied to shards; rebuild them with python shards.py")
+        with self._delta_lock:
+            self._apply_delta(delta)
+
+    def _apply_delta(self, delta: Dict) -> None:
+        if self._page_ids_by_url is None:
+            self._page_ids_by_url = {page['url']: page_id for page_id, page in enumerate(self.data)}
+
+        upserts = delta.get('upserts', [])
+        removed = set()
+        for url in delta.get('deletes', []) + [page['url'] for page in upserts]:
+            if url in self._page_ids_by_url:
+                removed.add(self._page_ids_by_url.pop(url))
+
+        first_page, first_chunk = len(self.data), len(self.chunks)
+        for page in upserts:
+            page_id = len(self.data)
+            self.data.append(page)
+            self._page_ids_by_url[page['url']] = page_id
+            self.chunks.extend(chunk_page(page, page_id))
+        # New versions go in before the old ones go out, so a changed page is never missing
+        self.ranker.add(self.data, self.chunks, range(first_page, len(self.data)), range(first_chunk, len(self.chunks)))
+        if removed:
+            self.ranker.remove(removed, [i for i in range(first_chunk) if self.chunks[i]['page'] in removed])
+        # Cached answers may quote pages that just changed
+        self.response_cache.invalidate()
 
-        # Find relevant content from our scraped data
-        data_context = self.find_relevant_content(user_input)
+    def apply_delta_file(self, path: str = None) -> None:
+        with open(path or delta_path(self.data_file), 'r', encoding='utf-8') as f:
+            delta = json.load(f)
+        self.apply_delta(delta)
+        print(f"Applied crawl delta from {delta.get('generated_at', path)}: "
+              f"{len(delta.get('upserts', []))} changed, {len(delta.get('deletes', []))} removed")
+
+    def find_relevant_content(self, query: str, trace: Trace = None, corpus_filter: str = None) -> str:
+        """The retrieval context for ``query``.
+
+        ``corpus_filter`` (e.g. ``policyadvisor/life-insurance,fsra``) limits
+        sharded retrieval to some corpora or sections; the single corpus
+        loaded without shards ignores it.
+        """
+        with timed('retrieval', trace):
+            if self.shards is not None:
+                hits = self.shards.search_batch([query], corpus_filter)[0]
+            else:
+                hits = self.ranker.rank(query, k=self.candidates)
+        if trace is not None:
+            trace.attrs['retrieved_pages'] = len(self.hit_sources(hits))
+        with timed('context', trace):
+            return self.render_context(hits)
+
+    def rank_batch(self, queries: Sequence[str], corpus_filter: str = None) -> List[List]:
+        """Ranked hits for each of ``queries``, for render_context and hit_sources."""
+        if self.shards is not None:
+            return self.shards.search_batch(queries, corpus_filter)
+        return self.ranker.rank_batch(queries, k=self.candidates)
+
+    @property
+    def candidates(self) -> int:
+        # Chunk rankers leave it to the token budget how many candidates fit
+        return CHUNK_CANDIDATES if self.shards is not None or self.ranker.unit == 'chunk' else 5
+
+    def hit_pages(self, hits: List) -> List:
+        """Ids of the pages behind ranked hits, best first; (corpus, shard, page id) keys for shard hits."""
+        if self.shards is not None:
+            return list(dict.fromkeys(candidate[0] for score, candidate, url in hits))
+        if self.ranker.unit != 'chunk':
+            return [page_id for page_id, score in hits]
+        return list(dict.fromkeys(self.chunks[chunk_id]['page'] for chunk_id, score in hits))
+
+    def hit_sources(self, hits: List) -> List[str]:
+        """URLs of the pages behind ranked hits, best first."""
+        if self.shards is not None:
+            return self.shards.sources(hits)
+        return [self.data[page_id]['url'] for page_id in self.hit_pages(hits)]
+
+    def render_context(self, hits: List) -> str:
+        """The retrieval context for ranked hits of self.ranker, or of the shards."""
+        if self.shards is not None:
+            return self.shards.context(hits)
+
+        # Chunk rankers feed the token-budgeted context builder
+        if self.ranker.unit == 'chunk':
+            return self.context_builder.build(hits)
+
+        # Page rankers show the top 5 whole pages, best first, each rendered once and reused
+        return SECTION_SEPARATOR.join(self.context_builder.page_context(page_id) for page_id, score in hits)
+
+    def add_upload(self, session_id: str, file_content, file_type: str = None) -> None:
+        """Extract, chunk and index an uploaded file as the session's document.
+
+        ``file_content`` is text, bytes or a binary file object holding a PDF,
+        DOCX or text file. Raises uploads.UploadError if it cannot be read.
+        """
+        self.uploads.put(session_id, read_upload(file_content, file_type))
+
+    def upload_context(self, session_id: str, user_input: str) -> str:
+        """The parts of the session's uploaded document relevant to the question, if it has one."""
+        document = self.uploads.get(session_id)
+        if document is None:
+            return ""
+        context = document.context(user_input, self.upload_tokens)
+        if document.truncated:
+            context += "\n\n(Only the beginning of this long document was read.)"
+        return context
+
+    def build_messages(self, user_input: str, session_id: str = DEFAULT_SESSION, data_context: str = None,
+                       file_context: str = None, history: Sequence[Dict] = None) -> List[Dict]:
+        """Build the chat completion messages: system prompt, recent history and the question with context.
+
+        ``history`` replaces the session's stored history, e.g. ``()`` for a question asked on its own.
+        """
+        # Relevant parts of the session's uploaded document, unless the caller already pulled them
+        if file_context is None:
+            file_context = self.upload_context(session_id, user_input)
+
+        # Find relevant content from our scraped data, unless the caller already did
+        if data_context is None:
+            data_context = self.find_relevant_content(user_input)
         
         if not data_context:
             data_context = "No specific information found in the database."
@@ -177,34 +255,258 @@ class PolicyAdvisorBot:
 
         # Add conversation history to messages
         messages = [system_message]
-        messages.extend(self.conversation_history[-self.max_history:])  # Add recent conversation history
+        if history is None:
+            history = self.sessions.get_history(session_id)
+        messages.extend(list(history)[-self.max_history:])  # Add recent conversation history
         messages.append({"role": "user", "content": f"Context:\n{context}\n\nQuestion: {user_input}"})
+        return messages
+
+    def record_turn(self, session_id: str, user_input: str, response_content: str) -> None:
+        # The store keeps the last max_history turns of each session
+        self.sessions.append_turn(session_id, user_input, response_content)
+
+    def lookup_cached(self, user_input: str, session_id: str = DEFAULT_SESSION, trace: Trace = None,
+                      corpus_filter: str = None):
+        """Look the question up in the response cache.
+
+        Returns (cached answer or None, retrieval context or None, cache scope).
+        The context is only retrieved when the exact lookup misses, and is
+        reused to build the prompt. Entries are scoped by the conversation so
+        far, so follow-up questions only hit within an identical conversation,
+        and by the corpus filter.
+        """
+        with timed('history', trace):
+            history = self.sessions.get_history(session_id)[-self.max_history:]
+        with timed('cache', trace):
+            if corpus_filter:
+                scope = fingerprint(corpus_filter, json.dumps(history))
+            else:
+                scope = fingerprint(json.dumps(history)) if history else ''
+            answer = self.response_cache.get_exact(user_input, scope)
+        if answer is not None:
+            if trace is not None:
+                trace.attrs['cache'] = 'exact'
+            return answer, None, scope
+
+        data_context = self.find_relevant_content(user_input, trace, corpus_filter)
+        with timed('cache', trace):
+            answer = self.response_cache.get_similar(user_input, data_context, scope)
+        if trace is not None:
+            trace.attrs['cache'] = 'miss' if answer is None else 'near'
+        return answer, data_context, scope
+
+    def prepare_request(self, user_input: str, file_content: str = None, file_type: str = None,
+                        session_id: str = DEFAULT_SESSION, trace: Trace = None, corpus_filter: str = None):
+        """Do everything that comes before the completion call.
+
+        Returns (cached answer, None, None, None) on a cache hit, whose turn is
+        already recorded, and otherwise (None, messages, retrieval context,
+        cache scope) for finish_turn. This is blocking work, so async callers
+        run it on a thread pool.
+        """
+        if file_content:
+            with timed('upload', trace):
+                self.add_upload(session_id, file_content, file_type)
+
+        # Answers grounded in an uploaded document are never cached
+        file_context = ""
+        if self.uploads.get(session_id) is not None:
+            scope = None
+            data_context = self.find_relevant_content(user_input, trace, corpus_filter)
+            with timed('upload_retrieval', trace):
+                file_context = self.upload_context(session_id, user_input)
+            if trace is not None:
+                trace.attrs['cache'] = 'bypass'
+        else:
+            cached, data_context, scope = self.lookup_cached(user_input, session_id, trace, corpus_filter)
+            if cached is not None:
+                with timed('history', trace):
+                    self.record_turn(session_id, user_input, cached)
+                return cached, None, None, None
+
+        with timed('context', trace):
+            messages = self.build_messages(user_input, session_id, data_context, file_context)
+        if trace is not None:
+            trace.attrs['prompt_tokens'] = sum(estimate_tokens(message['content']) for message in messages)
+        return None, messages, data_context, scope
+
+    def finish_turn(self, session_id: str, user_input: str, response_content: str,
+                    data_context: str = None, scope: str = None, trace: Trace = None) -> None:
+        """Record a generated answer in the session and, when cacheable, the response cache."""
+        if trace is not None:
+            trace.attrs['completion_tokens'] = estimate_tokens(response_content)
+        with timed('history', trace):
+            self.record_turn(session_id, user_input, response_content)
+            if scope is not None and response_content:
+                self.response_cache.put(user_input, data_context, response_content, scope)
+
+    def get_response(self, user_input: str, file_content: str = None, file_type: str = None,
+                     session_id: str = DEFAULT_SESSION, corpus_filter: str = None) -> str:
+        trace = Trace('chat')
+        cached, messages, data_context, scope = self.prepare_request(user_input, file_content, file_type,
+                                                                     session_id, trace, corpus_filter)
+        if cached is not None:
+            trace.finish()
+            return cached
 
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=500
-            )
-            
-            # Get the response content
-            response_content = response.choices[0].message['content'].strip()
-            
-            # Update conversation history
-            self.conversation_history.append({"role": "user", "content": user_input})
-            self.conversation_history.append({"role": "assistant", "content": response_content})
-            
-            # Trim history if it gets too long
-            if len(self.conversation_history) > self.max_history * 2:  # *2 because we store pairs of messages
-                self.conversation_history = self.conversation_history[-self.max_history * 2:]
-            
-            return response_content
+            with timed('llm', trace):
+                response_content = self.llm.complete(messages).strip()
         except Exception as e:
-            error_msg = f"I apologize, but I encountered an error: {str(e)}"
-            self.conversation_history.append({"role": "user", "content": user_input})
-            self.conversation_history.append({"role": "assistant", "content": error_msg})
-            return error_msg
+            trace.finish('error')
+            return apology(e)
+        self.finish_turn(session_id, user_input, response_content, data_context, scope, trace)
+        trace.finish()
+        return response_content
+
+    def stream_response(self, user_input: str, file_content: str = None, file_type: str = None,
+                        session_id: str = DEFAULT_SESSION, corpus_filter: str = None) -> Iterator[str]:
+        """Yield the response text piece by piece as the model generates it.
+
+        The conversation history is only updated once the stream has finished,
+        so an abandoned or failed stream leaves no half-written turn behind.
+        """
+        trace = Trace('chat_stream')
+        outcome = 'abandoned'  # Unless the stream runs to the end
+        try:
+            cached, messages, data_context, scope = self.prepare_request(user_input, file_content, file_type,
+                                                                         session_id, trace, corpus_filter)
+            if cached is not None:
+                outcome = 'ok'
+                yield cached
+                return
+            parts = []
+
+            try:
+                with timed('llm', trace):
+                    for delta in self.llm.stream(messages):
+                        # Hold back leading whitespace, matching the strip() in get_response
+                        delta = delta if parts else delta.lstrip()
+                        if delta:
+                            parts.append(delta)
+                            yield delta
+            except Exception as e:
+                outcome = 'error'
+                yield apology(e)
+                return
+
+            self.finish_turn(session_id, user_input, "".join(parts).strip(), data_context, scope, trace)
+            outcome = 'ok'
+        except Exception:
+            outcome = 'error'
+            raise
+        finally:
+            trace.finish(outcome)
+
+    async def aget_response(self, user_input: str, file_content: str = None, file_type: str = None,
+                            session_id: str = DEFAULT_SESSION, executor: Executor = None,
+                            corpus_filter: str = None, limiter=None) -> str:
+        """Async get_response: retrieval and session I/O run on ``executor``, the completion on the event loop.
+
+        ``limiter``, an async context manager, is held around the completion
+        call only; whatever it raises on entry reaches the caller.
+        """
+        loop = asyncio.get_running_loop()
+        trace = Trace('chat')
+        cached, messages, data_context, scope = await loop.run_in_executor(
+            executor, self.prepare_request, user_input, file_content, file_type, session_id, trace, corpus_filter)
+        if cached is not None:
+            trace.finish()
+            return cached
+
+        outcome = 'rejected'  # Until the limiter lets the completion through
+        try:
+            async with limiter or nullcontext():
+                outcome = 'error'
+                with timed('llm', trace):
+                    response_content = (await self.llm.acomplete(messages)).strip()
+        except Exception as e:
+            trace.finish(outcome)
+            if outcome == 'rejected':
+                raise
+            return apology(e)
+        await loop.run_in_executor(executor, self.finish_turn, session_id, user_input,
+                                   response_content, data_context, scope, trace)
+        trace.finish()
+        return response_content
+
+    async def astream_response(self, user_input: str, file_content: str = None, file_type: str = None,
+                               session_id: str = DEFAULT_SESSION, executor: Executor = None,
+                               corpus_filter: str = None, limiter=None) -> AsyncIterator[str]:
+        """Async stream_response, with blocking work on ``executor`` and ``limiter`` as in aget_response."""
+        loop = asyncio.get_running_loop()
+        trace = Trace('chat_stream')
+        outcome = 'abandoned'
+        try:
+            cached, messages, data_context, scope = await loop.run_in_executor(
+                executor, self.prepare_request, user_input, file_content, file_type, session_id, trace,
+                corpus_filter)
+            if cached is not None:
+                outcome = 'ok'
+                yield cached
+                return
+            parts = []
+
+            outcome = 'rejected'  # Until the limiter lets the completion through
+            async with limiter or nullcontext():
+                outcome = 'abandoned'
+                try:
+                    with timed('llm', trace):
+                        async for delta in self.llm.astream(messages):
+                            delta = delta if parts else delta.lstrip()
+                            if delta:
+                                parts.append(delta)
+                                yield delta
+                except Exception as e:
+                    outcome = 'error'
+                    yield apology(e)
+                    return
+
+            await loop.run_in_executor(executor, self.finish_turn, session_id, user_input,
+                                       "".join(parts).strip(), data_context, scope, trace)
+            outcome = 'ok'
+        except Exception:
+            if outcome != 'rejected':
+                outcome = 'error'
+            raise
+        finally:
+            trace.finish(outcome)
+
+def start_delta_watcher(bot: PolicyAdvisorBot, path: str = None) -> Optional[threading.Thread]:
+    """Apply each crawl delta written to ``path`` after the bot was built, on a background thread.
+
+    ``path`` defaults to the delta next to the bot's data file. A delta
+    already there when the bot starts is part of the corpus it loaded, since
+    the scraper merges it into the data file first. Sharded bots rebuild
+    their shards instead.
+    """
+    interval = float(os.getenv('DELTA_POLL_SECONDS', DELTA_POLL_SECONDS))
+    if interval <= 0 or bot.shards is not None:
+        return None
+    path = path or delta_path(bot.data_file)
+
+    def modified():
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def watch():
+        seen = modified()
+        while True:
+            time.sleep(interval)
+            current = modified()
+            if current is None or current == seen:
+                continue
+            seen = current
+            try:
+                bot.apply_delta_file(path)
+            except Exception as e:
+                print(f"Could not apply crawl delta {path}: {e}")
+
+    thread = threading.Thread(target=watch, name='delta-watcher', daemon=True)
+    thread.start()
+    return thread
 
 def main():
     bot = PolicyAdvisorBot()
@@ -0,0 +1,74 @@
+import re
+from typing import Dict, Iterable, List
+
+TOKEN_PIECE_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Pages scraped before content_structure existed only have plain content,
+# which is cut into windows of roughly this many words
+CONTENT_WINDOW_WORDS = 120
+
+
+def chunk_page(page: Dict, page_id: int) -> List[Dict]:
+    """Split a page into heading-scoped chunks.
+
+    Each chunk starts at a heading and collects the paragraphs and lists that
+    follow it, so a chunk reads like one section of the page. FAQs become
+    chunks of their own, headed by the question.
+    """
+    chunks = []
+    if page.get('content_structure'):
+        heading = ''
+        parts: List[str] = []
+        for item in page['content_structure']:
+            if item['type'] == 'heading':
+                if parts:
+                    chunks.append(_chunk(page_id, heading, parts))
+                heading = item['text']
+                parts = []
+            elif item['type'] == 'paragraph':
+                parts.append(item['text'])
+            elif item['type'] == 'list':
+                parts.append("- " + "\n- ".join(item['items']))
+        if parts:
+            chunks.append(_chunk(page_id, heading, parts))
+    elif page.get('content'):
+        words = page['content'].split()
+        for start in range(0, len(words), CONTENT_WINDOW_WORDS):
+            chunks.append(_chunk(page_id, '', [' '.join(words[start:start + CONTENT_WINDOW_WORDS])]))
+
+    # Each FAQ answers one question, which makes it a natural chunk
+    for faq in page.get('faqs') or []:
+        if faq.get('answer'):
+            chunks.append(_chunk(page_id, faq.get('question', ''), [faq['answer']]))
+
+    if not chunks:
+        # Title-only pages still get a chunk so they stay retrievable
+        description = page.get('metadata', {}).get('description', '')
+        chunks.append(_chunk(page_id, '', [description] if isinstance(description, str) and description else []))
+    return chunks
+
+
+def _chunk(page_id: int, heading: str, parts: List[str]) -> Dict:
+    return {'page': page_id, 'heading': heading, 'text': "\n".join(parts)}
+
+
+def chunk_pages(pages: Iterable[Dict]) -> List[Dict]:
+    """Chunk every page, tagging each chunk with its page's index."""
+    chunks = []
+    for page_id, page in enumerate(pages):
+        chunks.extend(chunk_page(page, page_id))
+    return chunks
+
+
+def chunk_text(chunk: Dict, title: str) -> str:
+    """Text used to index a chunk, with its page title and heading for context."""
+    return ' '.join(part for part in (title, chunk['heading'], chunk['text']) if part)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local estimate of how many model tokens ``text`` takes.
+
+    Words and punctuation marks are roughly a token each, and long words split
+    into several, so take whichever of the piece count and chars/4 is larger.
+    """
+    return max(len(TOKEN_PIECE_PATTERN.findall(text)), (len(text) + 3) // 4)
@@ -0,0 +1,206 @@
+import json
+from collections import Counter
+from typing import Dict, Hashable, Iterable, Iterator, List, Tuple
+
+from chunking import estimate_tokens
+
+# Metadata that describes the HTML page rather than its subject
+BOILERPLATE_METADATA_KEYS = {
+    'viewport', 'robots', 'generator', 'theme-color', 'format-detection', 'google-site-verification',
+    'p:domain_verify', 'msvalidate.01', 'msapplication-TileImage', 'msapplication-TileColor',
+    'og:image', 'og:image:width', 'og:image:height', 'og:image:type', 'og:image:alt', 'og:url',
+    'og:type', 'og:locale', 'og:site_name', 'og:sitename', 'article:publisher', 'twitter:card',
+    'twitter:site', 'twitter:creator', 'twitter:image', 'twitter:image:alt',
+}
+# Structured data fields that link to things rather than say anything about them
+BOILERPLATE_STRUCTURED_KEYS = {'@context', '@id', 'url', 'image', 'logo', 'thumbnailUrl', 'sameAs', 'potentialAction'}
+# A metadata value repeated on more than this share of pages is site boilerplate
+SHARED_VALUE_RATIO = 0.5
+SECTION_SEPARATOR = "\n\n"
+# Pages without content_structure show this much of their plain content
+CONTENT_PREVIEW_CHARS = 1000
+
+# (page key, chunk order within the page, page header, text key for deduplication, rendered chunk)
+ContextCandidate = Tuple[Hashable, int, str, str, str]
+
+
+def strip_structured_boilerplate(value):
+    """Drop BOILERPLATE_STRUCTURED_KEYS, and anything left empty, from JSON-LD structured data."""
+    if isinstance(value, dict):
+        value = {key: strip_structured_boilerplate(item) for key, item in value.items()
+                 if key not in BOILERPLATE_STRUCTURED_KEYS}
+        return {key: item for key, item in value.items() if item not in ({}, [], '', None)}
+    if isinstance(value, list):
+        return [item for item in map(strip_structured_boilerplate, value) if item not in ({}, [], '', None)]
+    return value
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut ``text`` on a word boundary so it fits in ``max_tokens``."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    text = text[:max(max_tokens, 0) * 4].rsplit(' ', 1)[0]
+    while text and estimate_tokens(text + "...") > max_tokens:
+        text = text[:int(len(text) * 0.9)].rsplit(' ', 1)[0]
+    return text + "..." if text else ""
+
+
+class ContextBuilder:
+    """Packs the best retrieved chunks into a prompt context of bounded size.
+
+    Chunks are taken best first while they fit in ``max_tokens``; each page
+    contributes a short header (title, source and deduplicated metadata) once,
+    followed by its selected chunks in page order. Chunks whose text was
+    already included from another page are skipped.
+    """
+
+    def __init__(self, pages: List[Dict], chunks: List[Dict], max_tokens: int, artifacts=None):
+        self.pages = pages
+        self.chunks = chunks
+        self.max_tokens = max_tokens
+        # Prebuilt headers and shared values (artifacts.py) spare a pass over every page
+        self.artifacts = artifacts
+        self.shared_values = artifacts.shared_values if artifacts is not None else self._find_shared_values(pages)
+        self._headers: Dict[int, str] = {}
+        self._header_values: Dict[int, set] = {}
+        self._page_contexts: Dict[int, str] = {}
+
+    @staticmethod
+    def _find_shared_values(pages: List[Dict]) -> set:
+        counts = Counter(value for page in pages for value in set(page.get('metadata', {}).values())
+                         if isinstance(value, str))
+        threshold = max(SHARED_VALUE_RATIO * len(pages), 2)
+        return {value for value, count in counts.items() if count > threshold}
+
+    def page_header(self, page_id: int) -> str:
+        header = self._headers.get(page_id)
+        if header is None and self.artifacts is not None and page_id < len(self.artifacts.headers):
+            header = self._headers[page_id] = self.artifacts.headers[page_id]
+            self._header_values[page_id] = self.artifacts.header_values(page_id)
+        if header is None:
+            page = self.pages[page_id]
+            lines = [f"Title: {page['title']}"]
+            if page.get('url'):
+                lines.append(f"Source: {page['url']}")
+            seen = {page['title'].strip().lower()}
+            for key, value in page.get('metadata', {}).items():
+                if not isinstance(value, str) or key in BOILERPLATE_METADATA_KEYS or value in self.shared_values:
+                    continue
+                # description, og:description and twitter:description usually repeat each other
+                if value.strip().lower() in seen:
+                    continue
+                seen.add(value.strip().lower())
+                lines.append(f"{key}: {value}")
+            if page.get('categories'):
+                lines.append(f"Categories: {', '.join(page['categories'])}")
+            header = "\n".join(lines)
+            self._headers[page_id] = header
+            self._header_values[page_id] = seen
+        return header
+
+    def header_values(self, page_id: int) -> set:
+        """Lowercased title and metadata values shown in the page's header."""
+        self.page_header(page_id)
+        return self._header_values[page_id]
+
+    def page_context(self, page_id: int) -> str:
+        """The whole page as a context block, for rankers that return pages.
+
+        It does not depend on the query, so each page is rendered once (or
+        prebuilt by artifacts.py): the header, FAQs, structured data without
+        boilerplate and the page's content.
+        """
+        context = self._page_contexts.get(page_id)
+        if context is not None:
+            return context
+        if self.artifacts is not None and page_id < len(self.artifacts.page_contexts):
+            # Already compact in the artifact, so it is decoded per use rather than kept
+            return self.artifacts.page_contexts[page_id]
+
+        page = self.pages[page_id]
+        lines = [self.page_header(page_id)]
+        if page.get('related_topics'):
+            lines.append(f"Related Topics: {', '.join(page['related_topics'])}")
+        structured_data = strip_structured_boilerplate(page.get('structured_data') or {})
+        if structured_data:
+            lines.append(f"Structured Data: {json.dumps(structured_data, ensure_ascii=False)}")
+        questions = set()
+        for faq in page.get('faqs') or []:
+            question = faq.get('question', '')
+            if question.strip().lower() not in questions:
+                questions.add(question.strip().lower())
+                lines.append(f"FAQ: {question}\n{faq.get('answer', '')}")
+
+        if page.get('content_structure'):
+            for item in page['content_structure']:
+                if item['type'] == 'heading':
+                    lines.append(f"\n{'#' * item['level']} {item['text']}")
+                elif item['type'] == 'paragraph':
+                    lines.append(item['text'])
+                elif item['type'] == 'list':
+                    lines.append("- " + "\n- ".join(item['items']))
+        elif page['content']:
+            content = page['content']
+            lines.append(content[:CONTENT_PREVIEW_CHARS] + ("..." if len(content) > CONTENT_PREVIEW_CHARS else ""))
+        context = self._page_contexts[page_id] = "\n".join(lines)
+        return context
+
+    def render_chunk(self, chunk: Dict) -> str:
+        # A description-only chunk would just repeat the page header
+        if chunk['text'].strip().lower() in self._header_values.get(chunk['page'], ()):
+            return chunk['heading']
+        if chunk['heading']:
+            return f"{chunk['heading']}\n{chunk['text']}" if chunk['text'] else chunk['heading']
+        return chunk['text']
+
+    def candidates(self, hits: List[Tuple[int, float]]) -> Iterator[ContextCandidate]:
+        """The pack_context candidates for ranked (chunk_id, score) ``hits``."""
+        for chunk_id, score in hits:
+            chunk = self.chunks[chunk_id]
+            # The header first: render_chunk relies on its values
+            header = self.page_header(chunk['page'])
+            yield chunk['page'], chunk_id, header, chunk['text'].strip().lower(), self.render_chunk(chunk)
+
+    def build(self, hits: List[Tuple[int, float]]) -> str:
+        """Assemble the context for ranked (chunk_id, score) ``hits``."""
+        return pack_context(self.candidates(hits), self.max_tokens)
+
+
+def pack_context(candidates: Iterable[ContextCandidate], max_tokens: int) -> str:
+    """Pack ranked (page key, chunk order, page header, text key, body) candidates into ``max_tokens``.
+
+    See ContextBuilder. Page keys only need to be hashable, so candidates
+    from several corpora or shards can be packed together.
+    """
+    selected: Dict[Hashable, List[Tuple[int, str]]] = {}  # page -> (order, body), pages in rank order
+    headers: Dict[Hashable, str] = {}
+    seen_texts = set()
+    used = 0
+
+    for page_key, order, header, text_key, body in candidates:
+        if text_key and text_key in seen_texts:
+            continue
+
+        # Each part is costed with the separator joined in front of it, so the
+        # budget bounds the estimate of the assembled text, not just of its parts
+        cost = 0 if page_key in selected else estimate_tokens(SECTION_SEPARATOR + header)
+        cost += estimate_tokens("\n" + body) if body else 0
+        if used + cost > max_tokens:
+            if selected:
+                continue  # A smaller, lower-ranked chunk may still fit
+            # Never come back empty-handed: trim the best chunk to the budget
+            return truncate_to_tokens(f"{header}\n{body}".rstrip(), max_tokens)
+
+        if page_key not in selected:
+            selected[page_key] = []
+            headers[page_key] = header
+        selected[page_key].append((order, body))
+        seen_texts.add(text_key)
+        used += cost
+
+    sections = []
+    for page_key, parts in selected.items():
+        lines = [headers[page_key]]
+        lines.extend(body for order, body in sorted(parts, key=lambda part: part[0]) if body)
+        sections.append("\n".join(lines))
+    return SECTION_SEPARATOR.join(sections)
@@ -0,0 +1,218 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Dict, Iterable, Iterator, List, Union
+
+import numpy as np
+
+# Compiled corpus layout (little-endian):
+#   header: magic (8 bytes) | version (u32) | page count N (u32) | table offset (u64) |
+#           SHA-1 of the page bodies (20 bytes) | SHA-1 of the source file (20 bytes, zero if unknown)
+#   page bodies: zlib-compressed UTF-8 JSON, one per page
+#   offset table: N + 1 u64 byte offsets of the page bodies, the last one
+#   marking the end of the final body
+MAGIC = b'PACORPUS'
+FORMAT_VERSION = 3
+HEADER = struct.Struct('<8sIIQ20s20s')
+COMPILED_SUFFIX = '.corpus'
+DATA_SUFFIX = '_data'
+DELTA_SUFFIX = '_delta.json'
+# The scraper writes pages as JSON Lines; a JSON array is still read for older data files
+SOURCE_SUFFIXES = ('.jsonl', '.json')
+# Recently decoded pages kept around; retrieval revisits the same few pages
+PAGE_CACHE_SIZE = 64
+
+
+def compiled_path(json_path: str) -> str:
+    return os.path.splitext(json_path)[0] + COMPILED_SUFFIX
+
+
+def delta_path(data_path: str) -> str:
+    """Where an incremental crawl of ``data_path`` writes its changes, e.g. ``x_data.jsonl`` -> ``x_delta.json``."""
+    base = os.path.splitext(data_path)[0]
+    if base.endswith(DATA_SUFFIX):
+        base = base[:-len(DATA_SUFFIX)]
+    return base + DELTA_SUFFIX
+
+
+def source_path(data_path: str) -> str:
+    """The newest of the ``.jsonl`` and ``.json`` files next to ``data_path``, or ``data_path`` if neither exists."""
+    base = os.path.splitext(data_path)[0]
+    candidates = [base + suffix for suffix in SOURCE_SUFFIXES if os.path.exists(base + suffix)]
+    return max(candidates, key=os.path.getmtime) if candidates else data_path
+
+
+def iter_jsonl(path: str) -> Iterator[Dict]:
+    """Yield the pages of a JSON Lines file one at a time."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_pages(path: str) -> Iterator[Dict]:
+    """Yield the pages of a JSONL file as they are read, or of a JSON array once it is loaded."""
+    if path.endswith('.jsonl'):
+        return iter_jsonl(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        return iter(json.load(f))
+
+
+def file_digest(path: str) -> str:
+    """SHA-1 of a file's bytes, read in blocks."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def compile_corpus(pages: Iterable[Dict], out_path: str, source_digest: str = None) -> int:
+    """Write ``pages`` to ``out_path`` in the compiled format; return the page count.
+
+    Pages are streamed to disk one at a time, so ``pages`` may be a generator.
+    ``source_digest`` (see ``file_digest``) records the file the pages came
+    from, so the compiled corpus is still recognised as current when file
+    times are unreliable, e.g. after a git checkout.
+    """
+    tmp_path = out_path + '.tmp'
+    offsets = [HEADER.size]
+    digest = hashlib.sha1()
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, 0, b'', b''))
+        for page in pages:
+            body = zlib.compress(json.dumps(page, ensure_ascii=False).encode('utf-8'))
+            digest.update(body)
+            f.write(body)
+            offsets.append(f.tell())
+        table_offset = f.tell()
+        f.write(np.asarray(offsets, dtype='<u8').tobytes())
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(offsets) - 1, table_offset, digest.digest(),
+                            bytes.fromhex(source_digest) if source_digest else b''))
+    os.replace(tmp_path, out_path)
+    return len(offsets) - 1
+
+
+class CompiledCorpus(Sequence):
+    """Page sequence backed by a memory-mapped compiled corpus.
+
+    Opening the file only reads the header and offset table; a page body is
+    decompressed and parsed when that page is accessed. Pages appended after
+    loading (e.g. from a crawl delta) are kept in memory.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < HEADER.size:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} compiled corpus")
+        magic, version, count, table_offset, digest, source_digest = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} compiled corpus")
+        self._offsets = np.frombuffer(self._mmap, dtype='<u8', count=count + 1, offset=table_offset)
+        self._count = count
+        # Identifies the compiled pages, e.g. for artifacts derived from them
+        self.digest = digest.hex()
+        self.source_digest = source_digest.hex() if source_digest.strip(b'\0') else None
+        # Shared by request threads, so the LRU is only touched under the lock
+        self._cache: 'OrderedDict[int, Dict]' = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._appended: List[Dict] = []
+
+    def __len__(self) -> int:
+        return self._count + len(self._appended)
+
+
+    def append(self, page: Dict) -> None:
+        self._appended.append(page)
+
+    def _decode(self, index: int) -> Dict:
+        start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+        return json.loads(zlib.decompress(self._mmap[start:end]).decode('utf-8'))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('page index out of range')
+        if index >= self._count:
+            return self._appended[index - self._count]
+
+        with self._cache_lock:
+            page = self._cache.get(index)
+            if page is not None:
+                self._cache.move_to_end(index)
+                return page
+        # Decoded outside the lock; two threads may both decode a page, and either copy is fine
+        page = self._decode(index)
+        with self._cache_lock:
+            self._cache[index] = page
+            if len(self._cache) > PAGE_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return page
+
+    def __iter__(self) -> Iterator[Dict]:
+        # Full scans decode pages one at a time without filling the cache
+        for index in range(self._count):
+            with self._cache_lock:
+                page = self._cache.get(index)
+            yield page or self._decode(index)
+        yield from self._appended
+
+
+def load_corpus(data_path: str) -> Union[CompiledCorpus, List[Dict]]:
+    """Load the compiled corpus next to ``data_path`` if it is up to date, else the pages.
+
+    The source is whichever of the ``.jsonl`` and ``.json`` files is newer
+    (see ``source_path``), and is compiled if the compiled corpus is missing
+    or stale. JSONL sources are compiled as they are read, so the pages never
+    all sit in memory at once; a JSON array is loaded whole first. Only a
+    compiled corpus can use prebuilt artifacts (artifacts.py), so the pages
+    are returned as a plain list only where the corpus cannot be written.
+    """
+    source = source_path(data_path)
+    corpus_path = compiled_path(data_path)
+    if os.path.exists(corpus_path):
+        try:
+            corpus = CompiledCorpus(corpus_path)
+        except ValueError as e:
+            print(f"Ignoring compiled corpus: {e}")
+        else:
+            if not os.path.exists(source) or os.path.getmtime(corpus_path) >= os.path.getmtime(source):
+                return corpus
+            # Looks older, but a checkout sets file times arbitrarily; compare contents before recompiling
+            if corpus.source_digest and corpus.source_digest == file_digest(source):
+                return corpus
+    if os.path.exists(source):
+        try:
+            compile_corpus(iter_pages(source), corpus_path, file_digest(source))
+            return CompiledCorpus(corpus_path)
+        except OSError as e:
+            print(f"Could not compile {source}, reading it without prebuilt artifacts: {e}")
+    return list(iter_pages(source))
+
+
+def build(data_path: str) -> str:
+    """Compile the scraper output at ``data_path`` next to it."""
+    source = source_path(data_path)
+    out_path = compiled_path(data_path)
+    count = compile_corpus(iter_pages(source), out_path, file_digest(source))
+    print(f"Compiled {count} pages from {source} into {out_path}")
+    return out_path
+
+
+if __name__ == "__main__":
+    build(sys.argv[1] if len(sys.argv) > 1 else 'data/policyadvisor_data.jsonl')
@@ -0,0 +1,386 @@
+import hashlib
+import json
+import math
+import os
+import threading
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from chunking import chunk_text
+from ranking import Ranker, tokenize
+
+INDEX_VERSION = 1
+EMBED_BATCH_SIZE = 256
+# Below this many chunks a brute-force scan is faster than probing IVF lists
+IVF_MIN_ROWS = 4096
+IVF_NPROBE = 8
+
+
+class Embedder:
+    """Maps texts to L2-normalised float32 vectors."""
+
+    name = ''
+    dim = 0
+
+    @property
+    def fingerprint(self) -> str:
+        """Identifies the embedding space; cached vectors are reused only on a match."""
+        return f"{self.name}-{self.dim}"
+
+    def fit(self, texts: List[str]) -> None:
+        """Learn any corpus statistics the embedder needs. Stateless by default."""
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {}
+
+    def load_state(self, state: Dict[str, np.ndarray]) -> None:
+        pass
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+class HashingEmbedder(Embedder):
+    """Offline embedder using the hashing trick over words, bigrams and char n-grams.
+
+    Character 4-grams give partial credit to related word forms
+    ('insure'/'insurance') and the hashes are stable across processes, so
+    vectors can be cached on disk.
+    """
+
+    name = 'hashing'
+
+    def __init__(self, dim: int = 1024, signed: bool = True):
+        self.dim = dim
+        self.signed = signed
+
+    @property
+    def fingerprint(self) -> str:
+        return f"{self.name}-{self.dim}-{'signed' if self.signed else 'unsigned'}"
+
+    def features(self, text: str) -> Counter:
+        tokens = tokenize(text)
+        features = Counter(tokens)
+        features.update(f"{a}_{b}" for a, b in zip(tokens, tokens[1:]))
+        for token in tokens:
+            padded = f"#{token}#"
+            features.update(padded[i:i + 4] for i in range(len(padded) - 3))
+        return features
+
+    def transform(self, texts: List[str]) -> np.ndarray:
+        """Return sublinear term-frequency vectors for ``texts`` (not normalised)."""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in self.features(text).items():
+                digest = zlib.crc32(feature.encode('utf-8'))
+                sign = -1.0 if self.signed and digest & 0x80000000 else 1.0
+                matrix[row, digest % self.dim] += sign * (1 + math.log(count))
+        return matrix
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return normalize_rows(self.transform(texts))
+
+
+class LSAEmbedder(Embedder):
+    """Latent semantic embedder fitted offline on the corpus itself.
+
+    Hashed TF-IDF features are projected onto the top singular vectors of the
+    corpus, so words that co-occur across chunks ('employer', 'group',
+    'benefits') land close together even when a query shares no keyword with
+    the page. A small share of the raw lexical vector is kept so exact matches
+    still count; the two parts are concatenated, so the cosine similarity is
+    a weighted sum of the latent and lexical similarities.
+    """
+
+    name = 'lsa'
+
+    def __init__(self, latent_dim: int = 128, lexical_dim: int = 256, feature_dim: int = 4096,
+                 lexical_weight: float = 0.35, max_fit_texts: int = 5000):
+        self.latent_dim = latent_dim
+        self.dim = latent_dim + lexical_dim
+        self.features = HashingEmbedder(feature_dim, signed=False)
+        self.lexical = HashingEmbedder(lexical_dim)
+        self.lexical_weight = lexical_weight
+        self.max_fit_texts = max_fit_texts
+        self.idf = np.ones(feature_dim, dtype=np.float32)
+        self.components = np.zeros((0, feature_dim), dtype=np.float32)
+
+    @property
+    def fingerprint(self) -> str:
+        return f"{self.name}-{self.latent_dim}-{self.lexical.dim}-{self.features.dim}-{self.lexical_weight}"
+
+    def fit(self, texts: List[str]) -> None:
+        if len(texts) > self.max_fit_texts:
+            rng = np.random.default_rng(0)
+            texts = [texts[i] for i in sorted(rng.choice(len(texts), self.max_fit_texts, replace=False))]
+        counts = self.features.transform(texts)
+        df = np.count_nonzero(counts, axis=0)
+        self.idf = np.log((1 + len(texts)) / (1 + df)).astype(np.float32) + 1
+        matrix = normalize_rows(counts * self.idf)
+
+        # Randomised range finder keeps the SVD cheap on wide hashed features
+        rank = min(self.latent_dim, *matrix.shape)
+        rng = np.random.default_rng(0)
+        sketch = matrix @ rng.standard_normal((matrix.shape[1], min(rank + 10, matrix.shape[1]))).astype(np.float32)
+        basis, _ = np.linalg.qr(sketch)
+        _, _, vt = np.linalg.svd(basis.T @ matrix, full_matrices=False)
+        self.components = vt[:rank].astype(np.float32)
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {'idf': self.idf, 'components': self.components}
+
+    def load_state(self, state: Dict[str, np.ndarray]) -> None:
+        self.idf = state['idf']
+        self.components = state['components']
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        latent = np.zeros((len(texts), self.latent_dim), dtype=np.float32)
+        latent[:, :len(self.components)] = normalize_rows(self.features.transform(texts) * self.idf) @ self.components.T
+        # Concatenating scaled unit vectors makes cosine a weighted sum of both similarities
+        return np.hstack([math.sqrt(1 - self.lexical_weight) * normalize_rows(latent),
+                          math.sqrt(self.lexical_weight) * self.lexical.embed(texts)]).astype(np.float32)
+
+
+class OpenAIEmbedder(Embedder):
+    """OpenAI embeddings API; only called when the on-disk cache is stale."""
+
+    name = 'openai'
+    dim = 1536
+
+    def __init__(self, model: str = 'text-embedding-ada-002'):
+        self.model = model
+
+    @property
+    def fingerprint(self) -> str:
+        return f"{self.name}-{self.model}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        import openai
+
+        response = openai.Embedding.create(model=self.model, input=texts)
+        return normalize_rows(np.asarray([item['embedding'] for item in response['data']], dtype=np.float32))
+
+
+EMBEDDERS = {
+    HashingEmbedder.name: HashingEmbedder,
+    LSAEmbedder.name: LSAEmbedder,
+    OpenAIEmbedder.name: OpenAIEmbedder,
+}
+
+
+def spherical_kmeans(vectors: np.ndarray, clusters: int, iterations: int = 10) -> np.ndarray:
+    """Cluster unit vectors by cosine similarity, returning unit centroids."""
+    rng = np.random.default_rng(0)
+    centroids = np.array(vectors[rng.choice(len(vectors), clusters, replace=False)])
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for cluster in range(clusters):
+            members = vectors[assignment == cluster]
+            if len(members):
+                centroids[cluster] = members.sum(axis=0)
+        centroids = normalize_rows(centroids)
+    return centroids
+
+
+class SemanticIndex:
+    """Nearest-neighbour index over embedded chunks, memory-mapped from disk.
+
+    Files, all sharing ``prefix``:
+      ``.emb.npy``     float32 vectors, one row per chunk (IVF list order)
+      ``.emb.aux.npz`` embedder state, row-to-chunk ids and IVF lists
+      ``.emb.json``    manifest recording what the vectors were built from
+
+    Small corpora are searched brute force. From ``IVF_MIN_ROWS`` rows the
+    vectors are clustered and stored grouped by cluster, so a query scans only
+    the contiguous slices of its ``nprobe`` closest clusters.
+    """
+
+    def __init__(self, prefix: str, embedder: Embedder, vectors: np.ndarray, row_ids: np.ndarray,
+                 centroids: Optional[np.ndarray] = None, offsets: Optional[np.ndarray] = None):
+        self.prefix = prefix
+        self.embedder = embedder
+        self.vectors = vectors
+        self.row_ids = row_ids
+        self.centroids = centroids
+        self.offsets = offsets
+        self.nprobe = IVF_NPROBE
+        # Rows added after the build stay in memory and are always scanned
+        self.extra_vectors = np.zeros((0, embedder.dim), dtype=np.float32)
+        self.extra_ids = np.zeros(0, dtype=np.int32)
+        self.deleted: frozenset = frozenset()
+        # Updates swap in new arrays under this lock, so a search never sees vectors without their ids
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def corpus_hash(texts: List[str], embedder: Embedder) -> str:
+        digest = hashlib.sha1(embedder.fingerprint.encode('utf-8'))
+        for text in texts:
+            digest.update(text.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    @classmethod
+    def load_or_build(cls, texts: List[str], embedder: Embedder, prefix: str) -> 'SemanticIndex':
+        """Load the cached index for ``texts`` or embed them and write a new one."""
+        corpus_hash = cls.corpus_hash(texts, embedder)
+        try:
+            with open(f"{prefix}.emb.json", 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') == INDEX_VERSION and manifest.get('corpus_hash') == corpus_hash:
+                return cls.load(prefix, embedder)
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+        return cls.build(texts, embedder, prefix, corpus_hash)
+
+    @classmethod
+    def load(cls, prefix: str, embedder: Embedder) -> 'SemanticIndex':
+        aux = np.load(f"{prefix}.emb.aux.npz")
+        embedder.load_state({key[len('model_'):]: aux[key] for key in aux.files if key.startswith('model_')})
+        vectors = np.load(f"{prefix}.emb.npy", mmap_mode='r')
+        centroids = aux['centroids'] if 'centroids' in aux.files else None
+        offsets = aux['offsets'] if 'offsets' in aux.files else None
+        return cls(prefix, embedder, vectors, aux['row_ids'], centroids, offsets)
+
+    @classmethod
+    def build(cls, texts: List[str], embedder: Embedder, prefix: str, corpus_hash: str) -> 'SemanticIndex':
+        embedder.fit(texts)
+        vectors = np.zeros((len(texts), embedder.dim), dtype=np.float32)
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
+            vectors[start:start + EMBED_BATCH_SIZE] = embedder.embed(texts[start:start + EMBED_BATCH_SIZE])
+
+        aux = {f"model_{key}": value for key, value in embedder.state().items()}
+        row_ids = np.arange(len(texts), dtype=np.int32)
+        if len(texts) >= IVF_MIN_ROWS:
+            clusters = int(min(4 * math.sqrt(len(texts)), len(texts) // 16))
+            centroids = spherical_kmeans(vectors, clusters)
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            row_ids = np.argsort(assignment, kind='stable').astype(np.int32)
+            vectors = vectors[row_ids]
+            aux['centroids'] = centroids
+            aux['offsets'] = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=clusters))])
+        aux['row_ids'] = row_ids
+
+        # Write to temporary files first so a crash never leaves a half-written index. Each build gets
+        # its own names: workers starting together build the same files (every step is seeded) and
+        # whichever renames last wins.
+        build_id = f"{os.getpid()}.{threading.get_ident()}"
+        temp_paths = [f"{prefix}{suffix}.{build_id}.tmp" for suffix in ('.emb.npy', '.emb.aux.npz', '.emb.json')]
+        vectors_path, aux_path, manifest_path = temp_paths
+        try:
+            matrix = np.lib.format.open_memmap(vectors_path, mode='w+', dtype=np.float32, shape=vectors.shape)
+            matrix[:] = vectors
+            matrix.flush()
+            del matrix
+            with open(aux_path, 'wb') as f:
+                np.savez(f, **aux)
+            with open(manifest_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': INDEX_VERSION, 'corpus_hash': corpus_hash, 'embedder': embedder.fingerprint,
+                           'rows': len(texts), 'ivf_lists': len(aux.get('centroids', []))}, f, indent=2)
+            os.replace(vectors_path, f"{prefix}.emb.npy")
+            os.replace(aux_path, f"{prefix}.emb.aux.npz")
+            os.replace(manifest_path, f"{prefix}.emb.json")
+        except OSError as e:
+            for path in temp_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            # E.g. a read-only serverless filesystem: serve this process from memory instead
+            print(f"Could not cache the semantic index at {prefix}, keeping it in memory: {e}")
+            return cls(prefix, embedder, vectors, row_ids, aux.get('centroids'), aux.get('offsets'))
+        return cls.load(prefix, embedder)
+
+    def add(self, texts: List[str], chunk_ids: List[int]) -> None:
+        """Embed and index new chunks in memory; the on-disk cache is rebuilt on next load."""
+        if texts:
+            vectors = self.embedder.embed(texts)
+            with self._lock:
+                self.extra_vectors, self.extra_ids = (
+                    np.vstack([self.extra_vectors, vectors]),
+                    np.concatenate([self.extra_ids, np.asarray(chunk_ids, dtype=np.int32)]))
+
+    def remove(self, chunk_ids: Iterable[int]) -> None:
+        """Stop returning the given chunks."""
+        with self._lock:
+            self.deleted = self.deleted | frozenset(chunk_ids)
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Return up to ``k`` (chunk_id, cosine similarity) pairs, best first."""
+        if not len(self.vectors) and not len(self.extra_ids):
+            return []
+        return self.search_vector(self.embedder.embed([query])[0], k)
+
+    def search_batch(self, queries: List[str], k: int) -> List[List[Tuple[int, float]]]:
+        """``search`` for many queries, embedding them in batches."""
+        if not len(self.vectors) and not len(self.extra_ids):
+            return [[] for _ in queries]
+        hits = []
+        for start in range(0, len(queries), EMBED_BATCH_SIZE):
+            hits.extend(self.search_vector(query_vector, k)
+                        for query_vector in self.embedder.embed(queries[start:start + EMBED_BATCH_SIZE]))
+        return hits
+
+    def search_vector(self, query_vector: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        with self._lock:
+            extra_vectors, extra_ids, deleted = self.extra_vectors, self.extra_ids, self.deleted
+        if self.centroids is None:
+            scores = np.asarray(self.vectors @ query_vector)
+            ids = self.row_ids
+        else:
+            probes = np.argsort(-(self.centroids @ query_vector))[:self.nprobe]
+            ids = np.concatenate([self.row_ids[self.offsets[c]:self.offsets[c + 1]] for c in probes])
+            scores = np.concatenate([np.asarray(self.vectors[self.offsets[c]:self.offsets[c + 1]] @ query_vector)
+                                     for c in probes])
+        if len(extra_ids):
+            ids = np.concatenate([ids, extra_ids])
+            scores = np.concatenate([scores, extra_vectors @ query_vector])
+
+        hits = []
+        for i in np.argsort(-scores, kind='stable')[:k + len(deleted)]:
+            if int(ids[i]) not in deleted:
+                hits.append((int(ids[i]), float(scores[i])))
+                if len(hits) == k:
+                    break
+        return hits
+
+
+class SemanticRanker(Ranker):
+    """Ranks chunks by the embedding similarity to the query."""
+
+    name = 'semantic'
+    unit = 'chunk'
+
+    def __init__(self, pages: List[Dict], chunks: List[Dict], prefix: str, embedder: Embedder,
+                 titles: Optional[Sequence[str]] = None):
+        # Prebuilt titles (artifacts.py) save decoding every page just for its title
+        titles = titles if titles is not None else [page['title'] for page in pages]
+        texts = [chunk_text(chunk, titles[chunk['page']]) for chunk in chunks]
+        self.index = SemanticIndex.load_or_build(texts, embedder, prefix)
+
+    def add(self, pages: Sequence[Dict], chunks: List[Dict], page_ids: Iterable[int], chunk_ids: Iterable[int]) -> None:
+        chunk_ids = list(chunk_ids)
+        self.index.add([chunk_text(chunks[i], pages[chunks[i]['page']]['title']) for i in chunk_ids], chunk_ids)
+
+    def remove(self, page_ids: Iterable[int], chunk_ids: Iterable[int]) -> None:
+        self.index.remove(chunk_ids)
+
+    @classmethod
+    def from_corpus(cls, pages: List[Dict], chunks: List[Dict], data_path: str = 'data/policyadvisor_data.jsonl',
+                    embedder: Optional[str] = None, artifacts=None, **options) -> 'SemanticRanker':
+        embedder_name = embedder or os.getenv('EMBEDDER', LSAEmbedder.name)
+        return cls(pages, chunks, os.path.splitext(data_path)[0], EMBEDDERS[embedder_name](),
+                   titles=artifacts.titles if artifacts is not None else None)
+
+    def rank(self, query: str, k: int = 5) -> List[Tuple[int, float]]:
+        return [(chunk_id, score) for chunk_id, score in self.index.search(query, k) if score > 0]
+
+    def rank_batch(self, queries: Sequence[str], k: int = 5) -> List[List[Tuple[int, float]]]:
+        return [[(chunk_id, score) for chunk_id, score in hits if score > 0]
+                for hits in self.index.search_batch(list(queries), k)]
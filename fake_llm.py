@@ -0,0 +1,148 @@
+"""Deterministic local stand-in for the OpenAI chat completions API.
+
+Point the bot at it for development, tests and benchmarks:
+
+    python fake_llm.py --port 8089
+    OPENAI_API_BASE=http://localhost:8089/v1 OPENAI_API_KEY=fake python server.py
+
+Latency and failures can be injected to exercise the client's retries,
+circuit breaker and hedging, e.g. a slow tail and occasional errors:
+
+    python fake_llm.py --latency 0.2 --slow-rate 0.05 --slow-latency 3 --error-rate 0.02 --rate-limit-rate 0.02
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+
+def fake_answer(messages: List[Dict]) -> str:
+    """Build a canned, repeatable answer from the last user message."""
+    question = messages[-1]['content'] if messages else ''
+    if 'Question:' in question:
+        question = question.rsplit('Question:', 1)[1]
+    question = ' '.join(question.split())[:200]
+    return (f"**Answer**\n\nYou asked: {question}\n\n"
+            "1. This reply comes from the local fake completion server.\n"
+            "2. It is deterministic, so it is safe to compare across runs.")
+
+
+class FakeCompletionHandler(BaseHTTPRequestHandler):
+    # Set by serve(); class attributes so every handler thread sees them
+    token_delay = 0.0
+    latency = 0.0
+    slow_rate = 0.0
+    slow_latency = 0.0
+    error_rate = 0.0
+    rate_limit_rate = 0.0
+    rng = random.Random()
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+
+        roll = self.rng.random()
+        if roll < self.rate_limit_rate:
+            self._send_json(429, {'error': {'message': 'Rate limit reached', 'type': 'requests'}}, {'Retry-After': '1'})
+            return
+        if roll < self.rate_limit_rate + self.error_rate:
+            self._send_json(500, {'error': {'message': 'Injected server error', 'type': 'server_error'}})
+            return
+        time.sleep(self.slow_latency if self.rng.random() < self.slow_rate else self.latency)
+
+        answer = fake_answer(body.get('messages', []))
+        tokens = answer.split(' ')
+        tokens = [token + ' ' for token in tokens[:-1]] + tokens[-1:]
+        model = body.get('model', 'gpt-3.5-turbo')
+
+        if body.get('stream'):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            for token in tokens:
+                time.sleep(self.token_delay)
+                self._send_event({'object': 'chat.completion.chunk', 'model': model,
+                                  'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}]})
+            self._send_event({'object': 'chat.completion.chunk', 'model': model,
+                              'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+            return
+
+        time.sleep(self.token_delay * len(tokens))
+        self._send_json(200, {
+            'id': 'chatcmpl-fake', 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': answer}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': len(tokens), 'total_tokens': len(tokens)},
+        })
+
+    def _send_event(self, payload: Dict):
+        self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+    def _send_json(self, status: int, payload: Dict, headers: Dict = None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # Benchmarks open many connections at once
+
+    def handle_error(self, request, client_address):
+        # Clients hang up on purpose, e.g. the losing half of a hedged request
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def serve(port: int = 8089, token_delay: float = 0.0, background: bool = False, latency: float = 0.0,
+          slow_rate: float = 0.0, slow_latency: float = 0.0, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+          seed: int = None) -> ThreadingHTTPServer:
+    """Start the fake server; with ``background`` it runs on a daemon thread.
+
+    Each request first waits ``latency`` seconds, or ``slow_latency`` for a
+    ``slow_rate`` fraction of them. A ``rate_limit_rate`` fraction is answered
+    with 429 and an ``error_rate`` fraction with 500.
+    """
+    handler = type('Handler', (FakeCompletionHandler,), {
+        'token_delay': token_delay, 'latency': latency, 'slow_rate': slow_rate, 'slow_latency': slow_latency,
+        'error_rate': error_rate, 'rate_limit_rate': rate_limit_rate, 'rng': random.Random(seed)})
+    server = FakeServer(('127.0.0.1', port), handler)
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    else:
+        print(f"Fake completion server on http://127.0.0.1:{server.server_port}/v1")
+        server.serve_forever()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--token-delay', type=float, default=0.02, help='Seconds between streamed tokens')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds before each response starts')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='Fraction of requests that are slow')
+    parser.add_argument('--slow-latency', type=float, default=0.0, help='Seconds before a slow response starts')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests failing with 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Fraction of requests failing with 429')
+    parser.add_argument('--seed', type=int, help='Seed for repeatable injected latency and errors')
+    args = parser.parse_args()
+    serve(args.port, args.token_delay, latency=args.latency, slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+          error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, seed=args.seed)
@@ -0,0 +1,411 @@
+"""Chat completion client with pooled connections and failure handling.
+
+Talks to the OpenAI-compatible ``/chat/completions`` endpoint directly so it
+controls every request: connections are kept alive in a pool, each call has
+an overall deadline, rate limits and server errors are retried with jittered
+exponential backoff, a circuit breaker fails fast while the API is down, and
+a slow call can be hedged with a second request. ``fake_llm.py`` can inject
+latency and errors to exercise all of this locally.
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_API_BASE = 'https://api.openai.com/v1'
+DEFAULT_MODEL = 'gpt-3.5-turbo'
+# Statuses worth another attempt: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """A completion failed; ``retryable`` tells whether another attempt may succeed."""
+
+    def __init__(self, message: str, status: int = None, retryable: bool = False, retry_after: float = None):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(LLMError):
+    pass
+
+
+class CircuitBreaker:
+    """Stops calls after ``failure_threshold`` consecutive failures.
+
+    Once ``reset_timeout`` seconds have passed a single probe call is let
+    through; its success closes the circuit again, its failure reopens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """Give up a probe that ended without an answer, e.g. a cancelled call."""
+        with self._lock:
+            if self.state == 'half_open':
+                # Reopen without restarting the timeout, so the next call probes again
+                self.state = 'open'
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None  # HTTP dates are rare from APIs; fall back to our own backoff
+
+
+def status_error(status: int, body: str, retry_after: Optional[str]) -> LLMError:
+    try:
+        message = json.loads(body)['error']['message']
+    except (ValueError, KeyError, TypeError):
+        message = body[:200] or 'no response body'
+    return LLMError(f"Completion request failed with status {status}: {message}", status=status,
+                    retryable=status in RETRYABLE_STATUS, retry_after=parse_retry_after(retry_after))
+
+
+def parse_stream_line(line: bytes) -> Optional[str]:
+    """Return the text delta carried by one server-sent event line, '' for none, None at the end."""
+    line = line.strip()
+    if not line.startswith(b'data:'):
+        return ''
+    data = line[len(b'data:'):].strip()
+    if data == b'[DONE]':
+        return None
+    try:
+        return json.loads(data)['choices'][0]['delta'].get('content') or ''
+    except (ValueError, KeyError, IndexError) as e:
+        raise LLMError(f"Malformed completion stream: {e}")
+
+
+class LLMClient:
+    """Chat completion client; safe to share between threads and async tasks.
+
+    ``timeout`` bounds each attempt and ``deadline`` the whole call including
+    retries. With ``hedge_after`` set, a non-streaming call that has not
+    finished after that many seconds gets a second, identical request and
+    the first successful answer wins.
+    """
+
+    def __init__(self, api_key: str = None, api_base: str = None, model: str = DEFAULT_MODEL,
+                 temperature: float = 0.7, max_tokens: int = 500, timeout: float = 30.0, deadline: float = 60.0,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 hedge_after: float = None, pool_size: int = 32, breaker: CircuitBreaker = None):
+        self.api_key = api_key or os.getenv('OPENAI_API_KEY')
+        self.url = (api_base or os.getenv('OPENAI_API_BASE') or DEFAULT_API_BASE).rstrip('/') + '/chat/completions'
+        self.options = {'model': model, 'temperature': temperature, 'max_tokens': max_tokens}
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self.pool_size = pool_size
+        self.breaker = breaker or CircuitBreaker()
+
+        # Created on first use, so constructing the client stays cheap on a cold start
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._hedge_pool = ThreadPoolExecutor(pool_size, thread_name_prefix='llm') if hedge_after else None
+        self._async_session = None
+
+        self.calls = 0
+        self.retries = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.failures = 0
+
+    @classmethod
+    def from_env(cls) -> 'LLMClient':
+        hedge_after = os.getenv('LLM_HEDGE_AFTER')
+        return cls(timeout=float(os.getenv('LLM_TIMEOUT', 30)), deadline=float(os.getenv('LLM_DEADLINE', 60)),
+                   max_retries=int(os.getenv('LLM_MAX_RETRIES', 3)),
+                   hedge_after=float(hedge_after) if hedge_after else None)
+
+    def headers(self) -> Dict[str, str]:
+        return {'Authorization': f'Bearer {self.api_key}', 'Content-Type': 'application/json'}
+
+    def payload(self, messages: List[Dict], stream: bool, options: Dict) -> Dict:
+        return {**self.options, **options, 'messages': messages, 'stream': stream}
+
+    def backoff(self, attempt: int, retry_after: float = None) -> float:
+        # Full jitter spreads out clients that failed together; never retry sooner than the server asked
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        return max(delay, retry_after or 0.0)
+
+    def stats(self) -> Dict:
+        return {'calls': self.calls, 'retries': self.retries, 'hedged': self.hedged, 'hedge_wins': self.hedge_wins,
+                'failures': self.failures, 'circuit': self.breaker.state}
+
+    # Retry loop shared by every call; ``attempt(timeout)`` makes one request
+
+    def _next_attempt(self, deadline: float) -> float:
+        """Return the timeout for the next attempt, or raise when no attempt may be made."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMError("Completion deadline exceeded", retryable=False)
+        if not self.breaker.allow():
+            raise CircuitOpenError("Completion API circuit is open after repeated failures", retryable=False)
+        return min(self.timeout, remaining)
+
+    def _failed(self, error: LLMError, attempt: int, deadline: float) -> float:
+        """Record a failed attempt and return the delay before retrying, or re-raise ``error``."""
+        if error.retryable:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()  # The API answered; the request itself was bad
+        delay = self.backoff(attempt, error.retry_after)
+        if not error.retryable or attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+            self.failures += 1
+            raise error
+        self.retries += 1
+        return delay
+
+    def _aborted(self, error: BaseException) -> None:
+        """Settle the breaker for an attempt that raised something other than LLMError."""
+        if isinstance(error, Exception):
+            # An unexpected error from the client or the response counts as a failed call
+            self.failures += 1
+            self.breaker.record_failure()
+        else:
+            # Cancelled, e.g. a disconnected client or the losing hedge: no verdict on the API
+            self.breaker.release_probe()
+
+    def _with_retries(self, attempt, deadline: float):
+        for number in range(self.max_retries + 1):
+            timeout = self._next_attempt(deadline)
+            try:
+                result = attempt(timeout)
+            except LLMError as e:
+                time.sleep(self._failed(e, number, deadline))
+                continue
+            except BaseException as e:
+                self._aborted(e)
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def _awith_retries(self, attempt, deadline: float):
+        for number in range(self.max_retries + 1):
+            timeout = self._next_attempt(deadline)
+            try:
+                result = await attempt(timeout)
+            except LLMError as e:
+                await asyncio.sleep(self._failed(e, number, deadline))
+                continue
+            except BaseException as e:
+                self._aborted(e)
+                raise
+            self.breaker.record_success()
+            return result
+
+    # Blocking API
+
+    @property
+    def session(self):
+        """Keep-alive connections shared by every thread."""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    def _post(self, payload: Dict, timeout: float):
+        try:
+            response = self.session.post(self.url, json=payload, headers=self.headers(),
+                                         timeout=(min(timeout, 10.0), timeout), stream=payload['stream'])
+        except requests.Timeout as e:
+            raise LLMError(f"Completion request timed out: {e}", retryable=True)
+        except requests.ConnectionError as e:
+            raise LLMError(f"Could not reach the completion API: {e}", retryable=True)
+        except requests.RequestException as e:
+            raise LLMError(f"Completion request failed: {e}", retryable=True)
+        if response.status_code != 200:
+            error = status_error(response.status_code, response.text, response.headers.get('Retry-After'))
+            response.close()
+            raise error
+        return response
+
+    def _complete_once(self, payload: Dict, timeout: float) -> str:
+        response = self._post(payload, timeout)
+        try:
+            return response.json()['choices'][0]['message']['content']
+        except (ValueError, KeyError, IndexError) as e:
+            raise LLMError(f"Malformed completion response: {e}", retryable=True)
+
+    def _complete(self, payload: Dict, deadline: float) -> str:
+        return self._with_retries(lambda timeout: self._complete_once(payload, timeout), deadline)
+
+    def complete(self, messages: List[Dict], **options) -> str:
+        """Return the completion text; raises LLMError once retries or the deadline run out."""
+        self.calls += 1
+        payload = self.payload(messages, False, options)
+        deadline = time.monotonic() + self.deadline
+        if self._hedge_pool is None:
+            return self._complete(payload, deadline)
+
+        first = self._hedge_pool.submit(self._complete, payload, deadline)
+        if wait([first], timeout=self.hedge_after).done:
+            return first.result()
+        self.hedged += 1
+        second = self._hedge_pool.submit(self._complete, payload, deadline)
+        # The slower request cannot be cancelled mid-flight; its answer is dropped
+        pending = {first, second}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self.hedge_wins += future is second
+                    return future.result()
+        raise first.exception()
+
+    def stream(self, messages: List[Dict], **options) -> Iterator[str]:
+        """Yield the completion text as it arrives.
+
+        Only opening the stream is retried; once text has been yielded a
+        failure is raised to the caller. Streams are not hedged.
+        """
+        self.calls += 1
+        payload = self.payload(messages, True, options)
+        response = self._with_retries(lambda timeout: self._post(payload, timeout), time.monotonic() + self.deadline)
+        try:
+            for line in response.iter_lines():
+                delta = parse_stream_line(line)
+                if delta is None:
+                    break
+                if delta:
+                    yield delta
+        except requests.RequestException as e:
+            raise LLMError(f"Completion stream interrupted: {e}")
+        finally:
+            response.close()
+
+    # Async API, for asgi.py
+
+    def _aiohttp_session(self):
+        import aiohttp
+        if self._async_session is None or self._async_session.closed:
+            self._async_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.pool_size * 4))
+        return self._async_session
+
+    async def _apost(self, payload: Dict, timeout: float):
+        import aiohttp
+        # Streams may run longer than the timeout as long as data keeps coming
+        client_timeout = (aiohttp.ClientTimeout(sock_connect=timeout, sock_read=timeout) if payload['stream']
+                          else aiohttp.ClientTimeout(total=timeout))
+        try:
+            response = await self._aiohttp_session().post(self.url, json=payload, headers=self.headers(),
+                                                          timeout=client_timeout)
+        except asyncio.TimeoutError as e:
+            raise LLMError(f"Completion request timed out: {e}", retryable=True)
+        except aiohttp.ClientError as e:
+            raise LLMError(f"Could not reach the completion API: {e}", retryable=True)
+        if response.status != 200:
+            body = await response.text()
+            response.release()
+            raise status_error(response.status, body, response.headers.get('Retry-After'))
+        return response
+
+    async def _acomplete_once(self, payload: Dict, timeout: float) -> str:
+        import aiohttp
+        response = await self._apost(payload, timeout)
+        try:
+            return (await response.json())['choices'][0]['message']['content']
+        except asyncio.TimeoutError as e:
+            raise LLMError(f"Completion request timed out: {e}", retryable=True)
+        except (ValueError, KeyError, IndexError, aiohttp.ClientError) as e:
+            raise LLMError(f"Malformed completion response: {e}", retryable=True)
+        finally:
+            response.release()
+
+    async def _acomplete(self, payload: Dict, deadline: float) -> str:
+        return await self._awith_retries(lambda timeout: self._acomplete_once(payload, timeout), deadline)
+
+    async def acomplete(self, messages: List[Dict], **options) -> str:
+        """Async complete(); the losing hedged request is cancelled."""
+        self.calls += 1
+        payload = self.payload(messages, False, options)
+        deadline = time.monotonic() + self.deadline
+        if not self.hedge_after:
+            return await self._acomplete(payload, deadline)
+
+        first = asyncio.ensure_future(self._acomplete(payload, deadline))
+        done, _ = await asyncio.wait([first], timeout=self.hedge_after)
+        if done:
+            return first.result()
+        self.hedged += 1
+        second = asyncio.ensure_future(self._acomplete(payload, deadline))
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.hedge_wins += task is second
+                        return task.result()
+            raise first.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def astream(self, messages: List[Dict], **options) -> AsyncIterator[str]:
+        """Async stream(), with the same retry rules."""
+        import aiohttp
+        self.calls += 1
+        payload = self.payload(messages, True, options)
+        response = await self._awith_retries(lambda timeout: self._apost(payload, timeout),
+                                             time.monotonic() + self.deadline)
+        try:
+            async for line in response.content:
+                delta = parse_stream_line(line)
+                if delta is None:
+                    break
+                if delta:
+                    yield delta
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            raise LLMError(f"Completion stream interrupted: {e}")
+        finally:
+            response.release()
+
+    async def aclose(self) -> None:
+        if self._async_session is not None:
+            await self._async_session.close()
@@ -0,0 +1,190 @@
+"""Per-request timing spans and Prometheus-style metrics.
+
+Chat requests are traced stage by stage (cache lookup, retrieval, uploaded
+document retrieval, context assembly, LLM wait, history update) together
+with token counts, retrieved page counts and the response cache outcome. ``REGISTRY.render()`` produces
+the text exposition format served at ``/metrics``. A ``LOG_SAMPLE_RATE``
+fraction of traces is also logged as one JSON line.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 0.01))
+
+
+def format_labels(labelnames: Sequence[str], values: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    kind = ''
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def label_values(self, labels: Dict[str, str]) -> Tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+        return '\n'.join(lines + self.samples())
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self.label_values(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f'{self.name}{format_labels(self.labelnames, key)} {value}'
+                    for key, value in sorted(self.values.items())]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+        self.series: Dict[Tuple, List] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self.label_values(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, series in sorted(self.series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    labels = format_labels(self.labelnames, key, f'le="{bound}"')
+                    lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                labels = format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f'{self.name}_bucket{labels} {series[-1]}')
+                lines.append(f'{self.name}_sum{format_labels(self.labelnames, key)} {series[-2]}')
+                lines.append(f'{self.name}_count{format_labels(self.labelnames, key)} {series[-1]}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return '\n'.join(metric.render() for metric in self.metrics) + '\n'
+
+
+REGISTRY = Registry()
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'chat_request_seconds', 'Time to answer a chat request', ('operation', 'outcome')))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'chat_stage_seconds', 'Time spent in each stage of a chat request', ('stage',)))
+PROMPT_TOKENS = REGISTRY.register(Counter(
+    'chat_prompt_tokens_total', 'Estimated tokens sent to the LLM'))
+COMPLETION_TOKENS = REGISTRY.register(Counter(
+    'chat_completion_tokens_total', 'Estimated tokens received from the LLM'))
+RETRIEVED_PAGES = REGISTRY.register(Histogram(
+    'chat_retrieved_pages', 'Distinct pages among the retrieved results', buckets=COUNT_BUCKETS))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    'chat_response_cache_total', 'Response cache outcomes', ('outcome',)))
+# Counted by the cache itself, so batch and warm-up lookups are included too
+CACHE_EVENTS = REGISTRY.register(Counter(
+    'response_cache_events_total', 'Response cache hits, misses, evictions and invalidations', ('event',)))
+
+
+def sampled(rate: float = None) -> bool:
+    """Decide whether to log this request; most are not, to keep logging off the hot path."""
+    rate = LOG_SAMPLE_RATE if rate is None else rate
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+@contextmanager
+def timed(stage: str, trace: 'Trace' = None):
+    """Time a stage into chat_stage_seconds and, if given, the request's trace."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        if trace is not None:
+            trace.stages[stage] = trace.stages.get(stage, 0.0) + elapsed
+
+
+class Trace:
+    """Stages and attributes of one chat request, recorded as metrics by ``finish``.
+
+    Known attributes: ``prompt_tokens``, ``completion_tokens``,
+    ``retrieved_pages`` and ``cache`` (exact, near, miss or bypass).
+    """
+
+    def __init__(self, operation: str = 'chat'):
+        self.operation = operation
+        self.start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.attrs: Dict = {}
+        self.finished = False
+
+    def finish(self, outcome: str = 'ok') -> Dict:
+        if self.finished:
+            return {}
+        self.finished = True
+        total = time.perf_counter() - self.start
+        REQUEST_SECONDS.observe(total, operation=self.operation, outcome=outcome)
+        if 'prompt_tokens' in self.attrs:
+            PROMPT_TOKENS.inc(self.attrs['prompt_tokens'])
+        if 'completion_tokens' in self.attrs:
+            COMPLETION_TOKENS.inc(self.attrs['completion_tokens'])
+        if 'retrieved_pages' in self.attrs:
+            RETRIEVED_PAGES.observe(self.attrs['retrieved_pages'])
+        if 'cache' in self.attrs:
+            CACHE_LOOKUPS.inc(outcome=self.attrs['cache'])
+
+        summary = {'operation': self.operation, 'outcome': outcome, 'seconds': round(total, 4),
+                   'stages': {stage: round(seconds, 4) for stage, seconds in self.stages.items()}, **self.attrs}
+        if sampled():
+            logger.info(json.dumps(summary))
+        return summary
@@ -0,0 +1,301 @@
+"""Single-pass extraction of page content from scraped HTML.
+
+No tree is built: one streaming ``html.parser`` pass records the elements the
+extractor cares about as document-order ranges over the page's text runs,
+and the page dict is assembled from those ranges afterwards. Text splitting,
+tag closing and entity handling follow BeautifulSoup's ``html.parser``
+builder, so the output is the same as the soup-based extraction it replaces.
+
+``parse_page`` is a plain module-level function so the scraper can run it in
+a process pool.
+"""
+import json
+from html.entities import html5
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+# Tags BeautifulSoup closes as soon as they open
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta',
+             'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex',
+             'nextid', 'spacer'}
+# Text inside these is not page text (BeautifulSoup's Script, Stylesheet, TemplateString, ruby strings)
+HIDDEN_TEXT_TAGS = {'script', 'style', 'template', 'rt', 'rp'}
+PRESERVE_WHITESPACE_TAGS = {'pre', 'textarea'}
+ASCII_SPACES = ' \n\t\x0c\r'
+
+# Stripped from the main content before anything else is extracted
+UNWANTED_TAGS = {'script', 'style', 'nav', 'header', 'footer'}
+STRUCTURE_TAGS = {'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'ul', 'ol'}
+RECORDED_TAGS = STRUCTURE_TAGS | UNWANTED_TAGS | {'main', 'article', 'li', 'meta', 'div', 'section', 'dt', 'dd',
+                                                  'a', 'span', 'time'}
+
+# Element record fields
+TAG, ATTRS, FIRST_RUN, END_RUN, END_ELEMENT = range(5)
+
+
+def numeric_reference(name: str) -> str:
+    """Resolve the body of a ``&#...;`` reference the way BeautifulSoup does."""
+    base, digits = (16, '0123456789abcdefABCDEF') if name[:1] in ('x', 'X') else (10, '0123456789')
+    body = name[1:] if base == 16 else name
+    end = 0
+    while end < len(body) and body[end] in digits:
+        end += 1
+    if not end:
+        return name
+    number, extra = int(body[:end], base), body[end:]
+    if number == 0 or number > 0x10ffff or 0xd800 <= number <= 0xdfff:
+        return '\ufffd' + extra
+    if 0x80 <= number <= 0x9f:
+        try:
+            return bytes([number]).decode('windows-1252') + extra
+        except UnicodeDecodeError:
+            pass
+    return chr(number) + extra
+
+
+def has_class(attrs: Dict[str, str], *words: str) -> bool:
+    classes = attrs.get('class')
+    if not classes:
+        return False
+    classes = classes.lower()
+    return any(word in classes for word in words)
+
+
+class PageExtractor(HTMLParser):
+    """Records text runs and the interesting elements of one page in a single pass."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.runs: List[str] = []
+        self.hidden: List[bool] = []
+        self.elements: List[list] = []  # [tag, attrs, first run, end run, end element]
+        self.hrefs: List[str] = []
+        self.stack: List[Tuple[str, int]] = []  # open tags and their element index, or -1
+        self.pending: List[str] = []
+        self.hidden_depth = 0
+        self.preserve_depth = 0
+        self.closed_void: List[str] = []
+
+    def flush(self) -> None:
+        """End the current text run, as BeautifulSoup does at every tag or comment."""
+        if not self.pending:
+            return
+        text = ''.join(self.pending)
+        self.pending = []
+        if not self.preserve_depth and not text.strip(ASCII_SPACES):
+            text = '\n' if '\n' in text else ' '
+        self.runs.append(text)
+        self.hidden.append(self.hidden_depth > 0)
+
+    def handle_starttag(self, tag, attrs, close_void=True):
+        self.flush()
+        values = {name: '' if value is None else value for name, value in attrs}
+        index = -1
+        if tag in RECORDED_TAGS:
+            index = len(self.elements)
+            self.elements.append([tag, values, len(self.runs), None, None])
+        if tag == 'a' and 'href' in values:
+            self.hrefs.append(values['href'])
+        self.stack.append((tag, index))
+        if tag in HIDDEN_TEXT_TAGS:
+            self.hidden_depth += 1
+        if tag in PRESERVE_WHITESPACE_TAGS:
+            self.preserve_depth += 1
+        if close_void and tag in VOID_TAGS:
+            self.handle_endtag(tag, check_closed=False)
+            self.closed_void.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, close_void=False)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag, check_closed=True):
+        if check_closed and tag in self.closed_void:
+            # The end tag of a void element that was already closed
+            self.closed_void.remove(tag)
+            return
+        self.flush()
+        for position in range(len(self.stack) - 1, -1, -1):
+            if self.stack[position][0] == tag:
+                while len(self.stack) > position:
+                    self.pop()
+                return
+
+    def pop(self) -> None:
+        tag, index = self.stack.pop()
+        if index >= 0:
+            element = self.elements[index]
+            element[END_RUN] = len(self.runs)
+            element[END_ELEMENT] = len(self.elements)
+        if tag in HIDDEN_TEXT_TAGS:
+            self.hidden_depth -= 1
+        if tag in PRESERVE_WHITESPACE_TAGS:
+            self.preserve_depth -= 1
+
+    def handle_data(self, data):
+        self.pending.append(data)
+
+    def handle_charref(self, name):
+        self.pending.append(numeric_reference(name))
+
+    def handle_entityref(self, name):
+        self.pending.append(html5.get(name + ';', '&' + name))
+
+    def handle_comment(self, data):
+        self.flush()
+
+    def handle_decl(self, decl):
+        self.flush()
+
+    def handle_pi(self, data):
+        self.flush()
+
+    def unknown_decl(self, data):
+        self.flush()
+        if data.upper().startswith('CDATA['):
+            self.runs.append(data[len('CDATA['):])
+            self.hidden.append(False)
+
+    def close(self):
+        super().close()
+        self.flush()
+        while self.stack:
+            self.pop()
+
+
+class ParsedPage:
+    """Queries over a parsed page; ``dropped`` hides the unwanted parts of the main content."""
+
+    def __init__(self, extractor: PageExtractor):
+        self.runs = extractor.runs
+        self.hidden = extractor.hidden
+        self.elements = extractor.elements
+        self.dropped_runs = bytearray(len(self.runs))
+        self.dropped_elements = bytearray(len(self.elements))
+
+    def find(self, tag: str) -> Optional[int]:
+        return next((i for i, element in enumerate(self.elements) if element[TAG] == tag), None)
+
+    def descendants(self, index: int = None):
+        start, end = (0, len(self.elements)) if index is None else (index + 1, self.elements[index][END_ELEMENT])
+        for i in range(start, end):
+            if not self.dropped_elements[i]:
+                yield i, self.elements[i]
+
+    def drop(self, index: int) -> None:
+        element = self.elements[index]
+        self.dropped_elements[index:element[END_ELEMENT]] = b'\x01' * (element[END_ELEMENT] - index)
+        self.dropped_runs[element[FIRST_RUN]:element[END_RUN]] = b'\x01' * (element[END_RUN] - element[FIRST_RUN])
+
+    def text(self, index: int, strip: bool = True) -> str:
+        element = self.elements[index]
+        if not strip:
+            return ''.join(self.runs[i] for i in range(element[FIRST_RUN], element[END_RUN]) if not self.hidden[i])
+        return ''.join(self.runs[i].strip() for i in range(element[FIRST_RUN], element[END_RUN])
+                       if not self.hidden[i] and not self.dropped_runs[i])
+
+    def string(self, index: int) -> Optional[str]:
+        """The element's only string, like BeautifulSoup's ``.string`` on a script tag."""
+        element = self.elements[index]
+        if element[END_RUN] - element[FIRST_RUN] != 1 or self.dropped_runs[element[FIRST_RUN]]:
+            return None
+        return self.runs[element[FIRST_RUN]]
+
+
+def extract_content(url: str, page: ParsedPage) -> Dict:
+    content = {
+        'url': url,
+        'title': '',
+        'content': '',
+        'metadata': {},
+        'structured_data': {},
+        'faqs': [],
+        'categories': [],
+        'summary': '',
+        'last_updated': '',
+        'author': '',
+        'related_topics': []
+    }
+
+    # The title is read before anything is stripped
+    title = page.find('h1')
+    if title is not None:
+        content['title'] = page.text(title, strip=False).strip()
+
+    main_content = page.find('main')
+    if main_content is None:
+        main_content = page.find('article')
+    if main_content is not None:
+        for index, element in page.descendants(main_content):
+            if element[TAG] in UNWANTED_TAGS:
+                page.drop(index)
+
+        content_structure = []
+        for index, element in page.descendants(main_content):
+            tag = element[TAG]
+            if tag not in STRUCTURE_TAGS:
+                continue
+            if tag.startswith('h'):
+                content_structure.append({'type': 'heading', 'level': int(tag[1]), 'text': page.text(index)})
+            elif tag == 'p':
+                text = page.text(index)
+                if text:
+                    content_structure.append({'type': 'paragraph', 'text': text})
+            else:
+                items = [page.text(i) for i, child in page.descendants(index) if child[TAG] == 'li']
+                if items:
+                    content_structure.append({'type': 'list', 'items': items})
+
+        content['content_structure'] = content_structure
+        content['content'] = ' '.join(item['text'] if 'text' in item else ' '.join(item['items'])
+                                      for item in content_structure)
+
+    author = date = None
+    for index, element in page.descendants():
+        tag, attrs = element[TAG], element[ATTRS]
+        if tag == 'meta':
+            name = attrs['name'] if 'name' in attrs else attrs.get('property', '')
+            if name and attrs.get('content'):
+                content['metadata'][name] = attrs['content']
+        elif tag == 'script' and attrs.get('type') == 'application/ld+json':
+            try:
+                content['structured_data'].update(json.loads(page.string(index)))
+            except (TypeError, ValueError):
+                continue
+        elif tag in ('div', 'section') and has_class(attrs, 'faq'):
+            questions = [i for i, child in page.descendants(index) if child[TAG] in ('dt', 'h3', 'h4')]
+            answers = [i for i, child in page.descendants(index) if child[TAG] in ('dd', 'p')]
+            content['faqs'].extend({'question': page.text(q), 'answer': page.text(a)}
+                                   for q, a in zip(questions, answers))
+
+        if tag in ('a', 'span') and has_class(attrs, 'category', 'tag', 'topic'):
+            content['categories'].append(page.text(index))
+        if author is None and tag in ('a', 'span', 'p') and has_class(attrs, 'author'):
+            author = page.text(index)
+        if date is None and tag in ('time', 'span', 'p') and has_class(attrs, 'date', 'published', 'updated'):
+            date = page.text(index)
+        if tag == 'a' and has_class(attrs, 'related'):
+            content['related_topics'].append(page.text(index))
+
+    content['author'] = author or ''
+    content['last_updated'] = date or ''
+    return content
+
+
+def internal_links(hrefs: List[str], base_url: str) -> List[str]:
+    links = set()
+    for href in set(hrefs):
+        full_url = urljoin(base_url, href)
+        # Only include internal links from the same domain
+        if full_url.startswith(base_url) and '#' not in full_url:
+            links.add(full_url)
+    return list(links)
+
+
+def parse_page(url: str, html: str, base_url: str) -> Tuple[Dict, List[str]]:
+    """Return ``(content, internal links)`` for one page of HTML."""
+    extractor = PageExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return extract_content(url, ParsedPage(extractor)), internal_links(extractor.hrefs, base_url)
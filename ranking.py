@@ -0,0 +1,400 @@
+import json
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from search_index import (
+    InvertedIndex, DESCRIPTION_KEYS, TITLE_WEIGHT, CONTENT_WEIGHT, STRUCTURED_DATA_WEIGHT,
+    FAQ_WEIGHT, METADATA_WEIGHT, DESCRIPTION_BOOST, CATEGORY_WEIGHT, RELATED_TOPIC_WEIGHT,
+)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# Queries scored together by BM25Ranker.rank_batch
+BATCH_QUERIES = 64
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'do', 'does', 'for', 'from', 'how',
+    'i', 'if', 'in', 'is', 'it', 'me', 'my', 'of', 'on', 'or', 'should', 'so', 'that', 'the',
+    'their', 'this', 'to', 'was', 'what', 'when', 'which', 'will', 'with', 'you', 'your',
+}
+
+# BM25F field weights, mirroring the boosts of the substring scorer
+PAGE_FIELD_WEIGHTS = {
+    'title': TITLE_WEIGHT,
+    'content': CONTENT_WEIGHT,
+    'structured_data': STRUCTURED_DATA_WEIGHT,
+    'faqs': FAQ_WEIGHT,
+    'description': METADATA_WEIGHT + DESCRIPTION_BOOST,
+    'metadata': METADATA_WEIGHT,
+    'categories': CATEGORY_WEIGHT,
+    'related_topics': RELATED_TOPIC_WEIGHT,
+}
+
+# Chunks carry their own heading and text plus the page-level fields; a
+# section heading or FAQ question is weighted like an FAQ on the page scorer
+CHUNK_FIELD_WEIGHTS = {field: weight for field, weight in PAGE_FIELD_WEIGHTS.items() if field != 'faqs'}
+CHUNK_FIELD_WEIGHTS['heading'] = FAQ_WEIGHT
+
+
+def stem(token: str) -> str:
+    """Strip the common English plural endings so 'policies' matches 'policy'."""
+    if len(token) > 4 and token.endswith('ies'):
+        return token[:-3] + 'y'
+    if len(token) > 3 and token.endswith('s') and not token.endswith(('ss', 'us', 'is')):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase, stemmed word tokens without stopwords."""
+    return [stem(token) for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def page_fields(page: Dict) -> Dict[str, str]:
+    """Flatten a scraped page into the text of each BM25 field."""
+    metadata = page.get('metadata', {})
+    return {
+        'title': page['title'],
+        'content': page['content'] or "",
+        'structured_data': json.dumps(page['structured_data']) if page.get('structured_data') else "",
+        'faqs': ' '.join(faq.get('question', '') + ' ' + faq.get('answer', '') for faq in page.get('faqs') or []),
+        'description': ' '.join(v for k, v in metadata.items() if k in DESCRIPTION_KEYS and isinstance(v, str)),
+        'metadata': ' '.join(v for k, v in metadata.items() if k not in DESCRIPTION_KEYS and isinstance(v, str)),
+        'categories': ' '.join(page.get('categories') or []),
+        'related_topics': ' '.join(page.get('related_topics') or []),
+    }
+
+
+def chunk_fields(chunks: Iterable[Dict], pages: List[Dict]) -> Iterable[Dict[str, str]]:
+    """Yield the BM25 fields of each chunk, sharing its page's fields."""
+    fields_by_page: Dict[int, Dict[str, str]] = {}
+    for chunk in chunks:
+        page_id = chunk['page']
+        if page_id not in fields_by_page:
+            fields_by_page.clear()  # Chunks arrive grouped by page
+            fields_by_page[page_id] = page_fields(pages[page_id])
+        fields = dict(fields_by_page[page_id], heading=chunk['heading'], content=chunk['text'])
+        del fields['faqs']
+        yield fields
+
+
+class Ranker:
+    """Scores a set of documents against free-text queries.
+
+    ``unit`` says what the returned ids index: 'page' for the scraped pages
+    or 'chunk' for the chunks produced by chunking.chunk_pages.
+    """
+
+    name = ''
+    unit = 'page'
+
+    def add(self, pages: Sequence[Dict], chunks: List[Dict], page_ids: Iterable[int], chunk_ids: Iterable[int]) -> None:
+        """Index pages and chunks appended to the corpus, without a full rebuild."""
+        raise NotImplementedError
+
+    def remove(self, page_ids: Iterable[int], chunk_ids: Iterable[int]) -> None:
+        """Stop returning the given pages and their chunks."""
+        raise NotImplementedError
+
+    def rank(self, query: str, k: int = 5) -> List[Tuple[int, float]]:
+        """Return up to ``k`` (doc_id, score) pairs with a positive score, best first."""
+        raise NotImplementedError
+
+    def rank_batch(self, queries: Sequence[str], k: int = 5) -> List[List[Tuple[int, float]]]:
+        """``rank`` for many queries; rankers that can score them together override this."""
+        return [self.rank(query, k) for query in queries]
+
+
+class SubstringRanker(Ranker):
+    """The original substring scorer, served from an inverted index."""
+
+    name = 'substring'
+
+    def __init__(self, pages: Iterable[Dict]):
+        self.index = InvertedIndex(pages)
+        # The index is updated in place, so queries wait for a delta being applied
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_corpus(cls, pages: List[Dict], chunks: List[Dict], **options) -> 'SubstringRanker':
+        return cls(pages)
+
+    def add(self, pages: Sequence[Dict], chunks: List[Dict], page_ids: Iterable[int], chunk_ids: Iterable[int]) -> None:
+        page_ids = list(page_ids)
+        with self._lock:
+            for page_id in page_ids:
+                self.index.add_page(pages[page_id])
+
+    def remove(self, page_ids: Iterable[int], chunk_ids: Iterable[int]) -> None:
+        page_ids = list(page_ids)
+        with self._lock:
+            self.index.deleted.update(page_ids)
+
+    def rank(self, query: str, k: int = 5) -> List[Tuple[int, float]]:
+        with self._lock:
+            top_pages = self.index.top_pages(query.lower().split(), k)
+        return [(page_id, float(score)) for page_id, score in top_pages]
+
+
+class BM25Ranker(Ranker):
+    """BM25F ranking over weighted document fields.
+
+    Per-field term frequencies are length-normalised, weighted and summed
+    before saturation, then multiplied by the term's IDF. Because none of that
+    depends on the query, the resulting term-document weights are stored as a
+    term-major sparse matrix (CSR arrays in NumPy), and scoring a query is a
+    single gather plus ``np.bincount`` over the posting slices of its terms.
+
+    Documents added later are scored with the field averages and IDFs of the
+    original build (new terms get an IDF from the grown corpus); removed
+    documents have their weights zeroed. Rebuild from scratch to refresh the
+    statistics. Updates build new arrays and swap them in under a lock, so
+    queries scored meanwhile see either the old index or the new one.
+    """
+
+    name = 'bm25'
+
+    def __init__(self, documents: Iterable[Dict[str, str]], field_weights: Dict[str, float],
+                 k1: float = 1.2, b: float = 0.75, unit: str = 'page'):
+        self.unit = unit
+        self.field_weights = field_weights
+        self.k1 = k1
+        self.b = b
+        self._init_locks()
+
+        term_freqs, field_lengths = self._count_terms(documents)
+        self.doc_count = len(term_freqs)
+        self.avg_lengths = {field: (sum(lengths) / len(lengths) if lengths and sum(lengths) else 1.0)
+                            for field, lengths in field_lengths.items()}
+        pseudo_tf = self._pseudo_tf(term_freqs, field_lengths, 0)
+
+        self.vocabulary = {term: term_id for term_id, term in enumerate(sorted(pseudo_tf))}
+        self.idf = np.zeros(len(self.vocabulary), dtype=np.float32)
+        term_ptr = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        doc_ids = []
+        weights = []
+        for term, term_id in self.vocabulary.items():
+            postings = pseudo_tf[term]
+            self.idf[term_id] = self._idf(len(postings), self.doc_count)
+            for doc_id in sorted(postings):
+                doc_ids.append(doc_id)
+                weights.append(self._weight(self.idf[term_id], postings[doc_id]))
+            term_ptr[term_id + 1] = len(doc_ids)
+
+        self.term_ptr = term_ptr
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float32)
+
+    @classmethod
+    def from_corpus(cls, pages: List[Dict], chunks: List[Dict], artifacts=None, **options) -> 'BM25Ranker':
+        # A prebuilt index (artifacts.py) skips tokenizing the whole corpus
+        if artifacts is not None and artifacts.bm25 is not None:
+            return artifacts.bm25
+        return cls(chunk_fields(chunks, pages), CHUNK_FIELD_WEIGHTS, unit='chunk')
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """The index as plain arrays plus JSON settings, for ``from_arrays``."""
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        settings = {'unit': self.unit, 'field_weights': self.field_weights, 'k1': self.k1, 'b': self.b,
+                    'doc_count': self.doc_count, 'avg_lengths': self.avg_lengths}
+        return {
+            'settings': np.frombuffer(json.dumps(settings).encode('utf-8'), dtype=np.uint8),
+            # Tokens never contain newlines, so the vocabulary is one newline-separated string
+            'terms': np.frombuffer('\n'.join(terms).encode('utf-8'), dtype=np.uint8),
+            'idf': self.idf,
+            'term_ptr': self.term_ptr,
+            'doc_ids': self.doc_ids,
+            'weights': self.weights,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'BM25Ranker':
+        ranker = cls.__new__(cls)
+        ranker._init_locks()
+        settings = json.loads(arrays['settings'].tobytes().decode('utf-8'))
+        ranker.unit = settings['unit']
+        ranker.field_weights = settings['field_weights']
+        ranker.k1 = settings['k1']
+        ranker.b = settings['b']
+        ranker.doc_count = settings['doc_count']
+        ranker.avg_lengths = settings['avg_lengths']
+        terms = arrays['terms'].tobytes().decode('utf-8')
+        ranker.vocabulary = {term: term_id for term_id, term in enumerate(terms.split('\n'))} if terms else {}
+        ranker.idf = arrays['idf']
+        ranker.term_ptr = arrays['term_ptr']
+        ranker.doc_ids = arrays['doc_ids']
+        ranker.weights = arrays['weights']
+        return ranker
+
+    def _init_locks(self) -> None:
+        # _lock guards swapping in updated arrays, _update_lock runs one update at a time
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+
+    def _postings(self):
+        """The current (vocabulary, term_ptr, doc_ids, weights, doc_count), all from the same update."""
+        with self._lock:
+            return self.vocabulary, self.term_ptr, self.doc_ids, self.weights, self.doc_count
+
+    def _count_terms(self, documents: Iterable[Dict[str, str]]):
+        term_freqs = []  # per document: {field: Counter}
+        field_lengths = {field: [] for field in self.field_weights}
+        for document in documents:
+            fields = {}
+            for field in self.field_weights:
+                tokens = tokenize(document.get(field, ""))
+                fields[field] = Counter(tokens)
+                field_lengths[field].append(len(tokens))
+            term_freqs.append(fields)
+        return term_freqs, field_lengths
+
+    def _pseudo_tf(self, term_freqs, field_lengths, first_doc_id: int) -> Dict[str, Dict[int, float]]:
+        """Weighted, length-normalised term frequency per (term, doc)."""
+        pseudo_tf: Dict[str, Dict[int, float]] = {}
+        for i, fields in enumerate(term_freqs):
+            for field, counts in fields.items():
+                norm = 1 - self.b + self.b * field_lengths[field][i] / self.avg_lengths[field]
+                weight = self.field_weights[field] / norm
+                for term, tf in counts.items():
+                    postings = pseudo_tf.setdefault(term, {})
+                    postings[first_doc_id + i] = postings.get(first_doc_id + i, 0.0) + weight * tf
+        return pseudo_tf
+
+    @staticmethod
+    def _idf(doc_freq: int, doc_count: int) -> float:
+        return float(np.log(1 + (doc_count - doc_freq + 0.5) / (doc_freq + 0.5)))
+
+    def _weight(self, idf: float, tf: float) -> float:
+        return idf * tf * (self.k1 + 1) / (tf + self.k1)
+
+    def add_documents(self, documents: Iterable[Dict[str, str]]) -> None:
+        """Append documents, merging their postings into a new copy of the sparse matrix."""
+        documents = list(documents)
+        with self._update_lock:
+            term_freqs, field_lengths = self._count_terms(documents)
+            pseudo_tf = self._pseudo_tf(term_freqs, field_lengths, self.doc_count)
+            doc_count = self.doc_count + len(term_freqs)
+            vocabulary = dict(self.vocabulary)
+
+            new_idf = []
+            terms, doc_ids, weights = [], [], []
+            for term, postings in pseudo_tf.items():
+                term_id = vocabulary.get(term)
+                if term_id is None:
+                    term_id = len(vocabulary)
+                    vocabulary[term] = term_id
+                    new_idf.append(self._idf(len(postings), doc_count))
+                    idf = new_idf[-1]
+                else:
+                    idf = self.idf[term_id]
+                for doc_id, tf in postings.items():
+                    terms.append(term_id)
+                    doc_ids.append(doc_id)
+                    weights.append(self._weight(idf, tf))
+            idf = np.concatenate([self.idf, np.asarray(new_idf, dtype=np.float32)])
+
+            # Back to coordinates, append, and re-sort into term-major order
+            old_terms = np.repeat(np.arange(len(self.term_ptr) - 1), np.diff(self.term_ptr))
+            all_terms = np.concatenate([old_terms, np.asarray(terms, dtype=np.int64)])
+            all_docs = np.concatenate([self.doc_ids, np.asarray(doc_ids, dtype=np.int32)])
+            all_weights = np.concatenate([self.weights, np.asarray(weights, dtype=np.float32)])
+            order = np.lexsort((all_docs, all_terms))
+            term_ptr = np.concatenate([[0], np.cumsum(np.bincount(all_terms, minlength=len(vocabulary)))])
+            with self._lock:
+                (self.vocabulary, self.idf, self.term_ptr, self.doc_ids, self.weights,
+                 self.doc_count) = vocabulary, idf, term_ptr, all_docs[order], all_weights[order], doc_count
+
+    def remove_documents(self, doc_ids: Iterable[int]) -> None:
+        """Zero the weights of ``doc_ids`` in a new copy of the weights."""
+        removed = np.fromiter(doc_ids, dtype=np.int64)
+        with self._update_lock:
+            weights = np.where(np.isin(self.doc_ids, removed), np.float32(0), self.weights)
+            with self._lock:
+                self.weights = weights
+
+    def add(self, pages: Sequence[Dict], chunks: List[Dict], page_ids: Iterable[int], chunk_ids: Iterable[int]) -> None:
+        if self.unit == 'chunk':
+            self.add_documents(chunk_fields([chunks[i] for i in chunk_ids], pages))
+        else:
+            self.add_documents(page_fields(pages[i]) for i in page_ids)
+
+    def remove(self, page_ids: Iterable[int], chunk_ids: Iterable[int]) -> None:
+        self.remove_documents(chunk_ids if self.unit == 'chunk' else page_ids)
+
+    def score(self, query: str) -> np.ndarray:
+        """Return the BM25 score of every document for ``query``."""
+        vocabulary, term_ptr, doc_ids, weights, doc_count = self._postings()
+        term_ids = [vocabulary[term] for term in tokenize(query) if term in vocabulary]
+        if not term_ids:
+            return np.zeros(doc_count, dtype=np.float32)
+
+        starts = term_ptr[term_ids]
+        lengths = term_ptr[np.asarray(term_ids) + 1] - starts
+        # Positions of every posting of every query term, in one flat array
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return np.bincount(doc_ids[positions], weights=weights[positions],
+                           minlength=doc_count).astype(np.float32)
+
+    def rank(self, query: str, k: int = 5) -> List[Tuple[int, float]]:
+        scores = self.score(query)
+        return top_k(scores, k)
+
+    def score_batch(self, queries: Sequence[str]) -> np.ndarray:
+        """``score`` for each query, as a (queries, documents) matrix from a single bincount."""
+        vocabulary, term_ptr, doc_ids, weights, doc_count = self._postings()
+        term_ids = [[vocabulary[term] for term in tokenize(query) if term in vocabulary] for query in queries]
+        query_ids = np.repeat(np.arange(len(queries)), [len(ids) for ids in term_ids])
+        term_ids = np.fromiter((term_id for ids in term_ids for term_id in ids), dtype=np.int64)
+        starts = term_ptr[term_ids]
+        lengths = term_ptr[term_ids + 1] - starts
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        # Each posting lands in its query's row of the flattened score matrix
+        cells = np.repeat(query_ids, lengths) * doc_count + doc_ids[positions]
+        scores = np.bincount(cells, weights=weights[positions], minlength=len(queries) * doc_count)
+        return scores.astype(np.float32).reshape(len(queries), doc_count)
+
+    def rank_batch(self, queries: Sequence[str], k: int = 5) -> List[List[Tuple[int, float]]]:
+        hits = []
+        # Blocks of queries keep the dense score matrix small
+        for start in range(0, len(queries), BATCH_QUERIES):
+            hits.extend(top_k(scores, k) for scores in self.score_batch(queries[start:start + BATCH_QUERIES]))
+        return hits
+
+
+def top_k(scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    """Return the ``k`` highest positive scores as (index, score), ties by index."""
+    candidates = np.flatnonzero(scores > 0)
+    if len(candidates) > k:
+        # Keep everything tied with the k-th best so ordering by index stays stable
+        kth = np.partition(scores[candidates], len(candidates) - k)[len(candidates) - k]
+        candidates = candidates[scores[candidates] >= kth]
+    order = np.lexsort((candidates, -scores[candidates]))[:k]
+    return [(int(candidates[i]), float(scores[candidates[i]])) for i in order]
+
+
+def semantic_ranker(pages: List[Dict], chunks: List[Dict], **options) -> Ranker:
+    # Imported lazily: embeddings builds on this module
+    from embeddings import SemanticRanker
+    return SemanticRanker.from_corpus(pages, chunks, **options)
+
+
+RANKERS = {
+    SubstringRanker.name: SubstringRanker.from_corpus,
+    BM25Ranker.name: BM25Ranker.from_corpus,
+    'semantic': semantic_ranker,
+}
+
+
+def build_ranker(name: str, pages: List[Dict], chunks: List[Dict], **options) -> Ranker:
+    """Build the ranker registered under ``name`` over ``pages`` and their ``chunks``.
+
+    ``options`` are passed to the ranker's factory; ``data_path`` tells
+    rankers with on-disk caches where the corpus lives, and ``artifacts``
+    (see artifacts.py) lets them start from prebuilt structures.
+    """
+    if name not in RANKERS:
+        raise ValueError(f"Unknown ranker '{name}', expected one of: {', '.join(sorted(RANKERS))}")
+    return RANKERS[name](pages, chunks, **options)
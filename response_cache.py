@@ -0,0 +1,170 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from metrics import CACHE_EVENTS
+from ranking import TOKEN_PATTERN, tokenize
+
+DEFAULT_TTL = 6 * 60 * 60
+DEFAULT_MAX_ENTRIES = 2048
+# Minimum Jaccard similarity of query terms for a near-duplicate hit. One
+# changed word can flip the meaning of a question, so by default the terms
+# must be the same and may differ only in number, stopwords or punctuation.
+# Whatever the threshold, the terms two questions share must come in the same
+# order, which keeps "switch from term to whole life" apart from "from whole
+# life to term".
+DEFAULT_SIMILARITY = 1.0
+# Terms that flip a question's meaning, which must match exactly even when a
+# lower similarity is allowed ('t' is what is left of "don't" and "isn't")
+POLARITY_TERMS = frozenset({'not', 'no', 'nor', 'never', 'none', 'without', 'except', 't'})
+
+
+def fingerprint(*parts: str) -> str:
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """LRU cache of generated answers in front of the LLM call.
+
+    Lookups try an exact match on the normalized query first. Failing that,
+    a near-duplicate hit needs the same retrieval-context fingerprint (the
+    question pulled in the same sources), the same POLARITY_TERMS, and query
+    terms (stemmed, without stopwords) whose Jaccard similarity reaches
+    ``similarity`` and whose shared terms come in the same order. Entries
+    expire after ``ttl`` seconds and everything is dropped by ``invalidate``
+    when the corpus changes. Lookups, evictions and invalidations are counted
+    in ``stats()`` and in the ``CACHE_EVENTS`` metric.
+
+    Callers scope entries with ``scope`` (e.g. a hash of the conversation so
+    far) so a follow-up question is never answered from another conversation.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL,
+                 similarity: float = DEFAULT_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._by_context: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self.hits_exact = 0
+        self.hits_near = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return ' '.join(TOKEN_PATTERN.findall(query.lower()))
+
+    @staticmethod
+    def term_order(query: str) -> Tuple[str, ...]:
+        """The query's terms in the order they first appear."""
+        return tuple(dict.fromkeys(tokenize(query)))
+
+    @staticmethod
+    def same_order(a: Tuple[str, ...], b: Tuple[str, ...], shared: FrozenSet[str]) -> bool:
+        return [term for term in a if term in shared] == [term for term in b if term in shared]
+
+    def _live(self, key: str, now: float) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry['expires'] < now:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        keys = self._by_context.get(entry['context'])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_context[entry['context']]
+
+    def get_exact(self, query: str, scope: str = '') -> Optional[str]:
+        """Return the cached answer for the same normalized query, if any.
+
+        A miss here is not counted; call ``get_similar`` next, which is.
+        """
+        if not self.max_entries:
+            return None
+        with self._lock:
+            entry = self._live(fingerprint(scope, self.normalize(query)), time.monotonic())
+            if entry is None:
+                return None
+            self.hits_exact += 1
+            CACHE_EVENTS.inc(event='hit_exact')
+            return entry['answer']
+
+    def get_similar(self, query: str, context: str, scope: str = '') -> Optional[str]:
+        """Return an answer cached for a near-identical query with the same retrieval context."""
+        if not self.max_entries:
+            return None
+        context_key = fingerprint(scope, context)
+        order = self.term_order(query)
+        terms = frozenset(order)
+        polarity = terms & POLARITY_TERMS
+        now = time.monotonic()
+        with self._lock:
+            best, best_similarity = None, self.similarity
+            for key in list(self._by_context.get(context_key, ())):
+                entry = self._live(key, now)
+                if entry is None or entry['terms'] & POLARITY_TERMS != polarity:
+                    continue
+                shared = terms & entry['terms']
+                union = len(terms | entry['terms'])
+                similarity = len(shared) / union if union else 1.0
+                if similarity >= best_similarity and self.same_order(order, entry['order'], shared):
+                    best, best_similarity = entry, similarity
+            if best is None:
+                self.misses += 1
+                CACHE_EVENTS.inc(event='miss')
+                return None
+            self.hits_near += 1
+            CACHE_EVENTS.inc(event='hit_near')
+            return best['answer']
+
+    def put(self, query: str, context: str, answer: str, scope: str = '') -> None:
+        if not self.max_entries:
+            return
+        key = fingerprint(scope, self.normalize(query))
+        context_key = fingerprint(scope, context)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            order = self.term_order(query)
+            self._entries[key] = {'answer': answer, 'terms': frozenset(order), 'order': order, 'context': context_key,
+                                  'expires': time.monotonic() + self.ttl}
+            self._by_context.setdefault(context_key, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+                CACHE_EVENTS.inc(event='eviction')
+
+    def invalidate(self) -> None:
+        """Drop every entry, e.g. after the corpus was re-scraped."""
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+            self.invalidations += 1
+            CACHE_EVENTS.inc(event='invalidation')
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits_exact': self.hits_exact,
+                'hits_near': self.hits_near,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
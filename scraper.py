@@ -1,205 +1,467 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+import hashlib
 import json
+import sys
+import threading
 import time
-from urllib.parse import urljoin
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+from xml.etree import ElementTree
 import os
+from artifacts import build_artifacts
+from corpus import compile_corpus, compiled_path, delta_path, file_digest, iter_jsonl, load_corpus
+from page_parser import parse_page
+
+# One page per line; older data files may still be a JSON array (data/policyadvisor_data.json)
+DATA_FILE = 'data/policyadvisor_data.jsonl'
+# Pages extracted by the crawl in progress, appended as they are parsed
+CRAWL_LOG_FILE = 'data/crawl_pages.jsonl'
+# Frontier, visited URLs and state of the crawl in progress, for --resume
+CHECKPOINT_FILE = 'data/crawl_checkpoint.json'
+CHECKPOINT_EVERY = 25
+# Per-URL validators, content hashes and links from the last crawl
+CRAWL_STATE_FILE = 'data/crawl_state.json'
+# Pages changed or removed by the last incremental crawl
+DELTA_FILE = delta_path(DATA_FILE)
+
+
+def parse_timestamp(value):
+    """Parse an ISO 8601 date or timestamp (as used by sitemaps) into an aware UTC datetime."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+class HostRateLimiter:
+    """Per-host politeness: caps concurrent requests and spaces out their starts."""
+
+    def __init__(self, requests_per_second=1.0, max_concurrency_per_host=2):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self.max_concurrency_per_host = max_concurrency_per_host
+        self.lock = threading.Lock()
+        self.next_slot = {}
+        self.semaphores = {}
+
+    def acquire(self, host):
+        with self.lock:
+            semaphore = self.semaphores.setdefault(host, threading.Semaphore(self.max_concurrency_per_host))
+        semaphore.acquire()
+        # Reserve the next free start slot for this host, then sleep outside the lock
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def release(self, host):
+        self.semaphores[host].release()
+
 
 class PolicyAdvisorScraper:
-    def __init__(self):
+    def __init__(self, concurrency=8, requests_per_second=2.0, max_concurrency_per_host=4, timeout=30,
+                 parse_workers=None):
         self.base_url = "https://policyadvisor.com"
-        self.data = []
         self.visited_urls = set()
-        
-    def get_soup(self, url):
+        self.incremental = False
+        self.crawl_state = {}
+        self.concurrency = concurrency
+        self.timeout = timeout
+        # Parsing is CPU-bound, so it runs in its own processes, apart from the fetch threads
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self.rate_limiter = HostRateLimiter(requests_per_second, max_concurrency_per_host)
+
+        # One pooled session shared by all crawl threads
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_concurrency_per_host, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['User-Agent'] = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+    def fetch(self, url, headers=None):
+        host = urlparse(url).netloc
+        self.rate_limiter.acquire(host)
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            return BeautifulSoup(response.text, 'html.parser')
-        except Exception as e:
-            print(f"Error fetching {url}: {str(e)}")
-            return None
+            return self.session.get(url, headers=headers, timeout=self.timeout)
+        finally:
+            self.rate_limiter.release(host)
 
-    def extract_structured_data(self, soup):
-        """Extract structured data from script tags"""
-        structured_data = {}
-        for script in soup.find_all('script', type='application/ld+json'):
+    def get_sitemap(self):
+        """Return {url: lastmod datetime or None} from the site's sitemap(s)."""
+        entries = {}
+        sitemaps = deque([f"{self.base_url}/sitemap.xml"])
+        seen = set()
+        while sitemaps:
+            sitemap_url = sitemaps.popleft()
+            if sitemap_url in seen:
+                continue
+            seen.add(sitemap_url)
             try:
-                data = json.loads(script.string)
-                structured_data.update(data)
-            except:
+                response = self.fetch(sitemap_url)
+                response.raise_for_status()
+                root = ElementTree.fromstring(response.content)
+            except Exception as e:
+                print(f"Error reading sitemap {sitemap_url}: {str(e)}")
                 continue
-        return structured_data
-
-    def extract_faq_content(self, soup):
-        """Extract FAQ sections and questions"""
-        faqs = []
-        # Look for common FAQ patterns
-        faq_sections = soup.find_all(['div', 'section'], class_=lambda x: x and 'faq' in x.lower())
-        
-        for section in faq_sections:
-            questions = section.find_all(['dt', 'h3', 'h4'])
-            answers = section.find_all(['dd', 'p'])
-            
-            for q, a in zip(questions, answers):
-                faqs.append({
-                    'question': q.get_text(strip=True),
-                    'answer': a.get_text(strip=True)
-                })
-        
-        return faqs
-
-    def extract_page_content(self, url):
-        soup = self.get_soup(url)
-        if not soup:
-            return None
 
-        content = {
-            'url': url,
-            'title': '',
-            'content': '',
-            'metadata': {},
-            'structured_data': {},
-            'faqs': [],
-            'categories': [],
-            'summary': '',
-            'last_updated': '',
-            'author': '',
-            'related_topics': []
+            for element in root:
+                tag = element.tag.rsplit('}', 1)[-1]
+                loc = lastmod = None
+                for child in element:
+                    child_tag = child.tag.rsplit('}', 1)[-1]
+                    if child_tag == 'loc':
+                        loc = (child.text or '').strip()
+                    elif child_tag == 'lastmod':
+                        lastmod = parse_timestamp(child.text)
+                if not loc:
+                    continue
+                if tag == 'sitemap':
+                    sitemaps.append(loc)
+                elif tag == 'url' and loc.startswith(self.base_url) and '#' not in loc:
+                    entries[loc] = lastmod
+        return entries
+
+    def crawl_page(self, url):
+        """Fetch a page once and return a result dict for scrape_site.
+
+        ``status`` is 'fetched' (with the ``html`` still to be parsed),
+        'unchanged', 'gone' or 'error'. Known pages are requested
+        conditionally in incremental mode, and a page whose body hashes the
+        same as last time is not parsed again.
+        """
+        state = self.crawl_state.get(url) if self.incremental else None
+        headers = {}
+        if state and state.get('etag'):
+            headers['If-None-Match'] = state['etag']
+        if state and state.get('last_modified'):
+            headers['If-Modified-Since'] = state['last_modified']
+
+        try:
+            response = self.fetch(url, headers)
+            if response.status_code == 304 and state:
+                # Still current: keep the hash and links, refresh when it was checked and any new validators
+                record = dict(state, fetched_at=datetime.now(timezone.utc).isoformat())
+                for key, header in (('etag', 'ETag'), ('last_modified', 'Last-Modified')):
+                    if response.headers.get(header):
+                        record[key] = response.headers[header]
+                return {'status': 'unchanged', 'links': record.get('links', []), 'record': record}
+            if response.status_code in (404, 410):
+                return {'status': 'gone', 'links': []}
+            response.raise_for_status()
+        except Exception as e:
+            print(f"Error fetching {url}: {str(e)}")
+            return {'status': 'error', 'links': []}
+
+        record = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'hash': hashlib.sha256(response.content).hexdigest(),
+            'fetched_at': datetime.now(timezone.utc).isoformat(),
         }
+        if state and state.get('hash') == record['hash']:
+            record['links'] = state.get('links', [])
+            return {'status': 'unchanged', 'links': record['links'], 'record': record}
 
-        # Extract title
-        title_tag = soup.find('h1')
-        if title_tag:
-            content['title'] = title_tag.get_text().strip()
-
-        # Extract main content with better structure
-        main_content = soup.find('main') or soup.find('article')
-        if main_content:
-            # Remove unwanted elements
-            for unwanted in main_content.find_all(['script', 'style', 'nav', 'header', 'footer']):
-                unwanted.decompose()
-            
-            # Extract content with structure preservation
-            content_structure = []
-            for element in main_content.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'ul', 'ol']):
-                if element.name.startswith('h'):
-                    content_structure.append({
-                        'type': 'heading',
-                        'level': int(element.name[1]),
-                        'text': element.get_text(strip=True)
-                    })
-                elif element.name == 'p':
-                    text = element.get_text(strip=True)
-                    if text:
-                        content_structure.append({
-                            'type': 'paragraph',
-                            'text': text
-                        })
-                elif element.name in ['ul', 'ol']:
-                    items = [li.get_text(strip=True) for li in element.find_all('li')]
-                    if items:
-                        content_structure.append({
-                            'type': 'list',
-                            'items': items
-                        })
-            
-            # Store structured content
-            content['content_structure'] = content_structure
-            # Also keep plain text version for backward compatibility
-            content['content'] = ' '.join(item['text'] if 'text' in item else ' '.join(item['items'])
-                                        for item in content_structure)
-
-        # Extract enhanced metadata
-        meta_tags = soup.find_all('meta')
-        for tag in meta_tags:
-            name = tag.get('name', tag.get('property', ''))
-            if name and tag.get('content'):
-                content['metadata'][name] = tag.get('content')
-
-        # Extract structured data
-        content['structured_data'] = self.extract_structured_data(soup)
-
-        # Extract FAQs
-        content['faqs'] = self.extract_faq_content(soup)
-
-        # Extract categories/tags
-        category_elements = soup.find_all(['a', 'span'], class_=lambda x: x and any(word in x.lower()
-                                        for word in ['category', 'tag', 'topic']))
-        content['categories'] = [el.get_text(strip=True) for el in category_elements]
-
-        # Extract author information
-        author_element = soup.find(['a', 'span', 'p'], class_=lambda x: x and 'author' in x.lower())
-        if author_element:
-            content['author'] = author_element.get_text(strip=True)
-
-        # Extract last updated date
-        date_element = soup.find(['time', 'span', 'p'], class_=lambda x: x and any(word in x.lower()
-                                for word in ['date', 'published', 'updated']))
-        if date_element:
-            content['last_updated'] = date_element.get_text(strip=True)
-
-        # Extract related topics
-        related_elements = soup.find_all(['a'], class_=lambda x: x and 'related' in x.lower())
-        content['related_topics'] = [el.get_text(strip=True) for el in related_elements]
-
-        return content
-
-    def get_internal_links(self, url):
-        soup = self.get_soup(url)
-        if not soup:
-            return []
+        return {'status': 'fetched', 'html': response.text, 'record': record}
+
+    def scrape_site(self, max_pages=None, incremental=False, resume=False):
+        """Crawl the site, or in incremental mode only what changed since the last crawl.
+
+        Incremental crawls reuse the stored validators and hashes from
+        CRAWL_STATE_FILE, visit pages whose sitemap lastmod is newer than the
+        last fetch first, skip requests for pages the sitemap reports as
+        unchanged, and write the changes to DELTA_FILE as well as updating the
+        full data file.
+
+        Extracted pages are appended to CRAWL_LOG_FILE as they are parsed
+        rather than kept in memory, and the frontier and visited set are
+        checkpointed to CHECKPOINT_FILE every CHECKPOINT_EVERY pages. With
+        ``resume``, an interrupted crawl carries on from its last checkpoint.
+        """
+        checkpoint = self.load_checkpoint() if resume else None
+        if resume and not checkpoint:
+            print("No crawl checkpoint found, starting a new crawl")
+        if checkpoint:
+            incremental = checkpoint['incremental']
+        self.incremental = incremental
+
+        fresh = set()
+        if checkpoint:
+            self.crawl_state = checkpoint['crawl_state']
+            self.visited_urls = set(checkpoint['visited'])
+            frontier = deque(checkpoint['frontier'])
+            queued = set(checkpoint['queued'])
+            fresh = set(checkpoint['fresh'])
+            deletes = checkpoint['deletes']
+            pages_scraped = checkpoint['pages_scraped']
+            # Pages logged after the checkpoint are still in its frontier and are crawled again
+            upserts = PageLog(CRAWL_LOG_FILE, checkpoint['pages'], checkpoint['log_size'])
+            print(f"Resuming crawl: {pages_scraped} pages done, {len(frontier)} queued")
+        else:
+            self.crawl_state = self.load_crawl_state() if incremental else {}
+            deletes = []
+            pages_scraped = 0
+            # The new page log replaces the old one, so an old checkpoint would point into the wrong file
+            if os.path.exists(CHECKPOINT_FILE):
+                os.remove(CHECKPOINT_FILE)
+            upserts = PageLog(CRAWL_LOG_FILE)
+
+            # URLs are deduplicated when queued, so each one is fetched at most once
+            frontier = deque()
+            if incremental:
+                sitemap = self.get_sitemap()
+                changed = []
+                for url, lastmod in sitemap.items():
+                    fetched_at = parse_timestamp(self.crawl_state.get(url, {}).get('fetched_at'))
+                    if fetched_at and lastmod and lastmod <= fetched_at:
+                        fresh.add(url)
+                    else:
+                        changed.append((lastmod or datetime.max.replace(tzinfo=timezone.utc), url))
+                frontier.extend(url for lastmod, url in sorted(changed, reverse=True))
+            if self.base_url not in frontier:
+                frontier.append(self.base_url)
+            queued = set(frontier)
+
+        # Pages being fetched, and fetched pages being parsed in the process pool
+        fetching, parsing = {}, {}
+        # Fetched pages waiting for a parse worker hold back further fetches
+        max_parse_backlog = self.parse_workers * 2
+        last_checkpoint = pages_scraped
 
-        internal_links = set()
-        for link in soup.find_all('a', href=True):
-            href = link['href']
-            full_url = urljoin(self.base_url, href)
-            
-            # Only include internal links from the same domain
-            if full_url.startswith(self.base_url) and '#' not in full_url:
-                internal_links.add(full_url)
-
-        return list(internal_links)
-
-    def scrape_site(self, max_pages=None):
-        to_visit = [self.base_url]
-        pages_scraped = 0
-
-        while to_visit and (max_pages is None or pages_scraped < max_pages):
-            url = to_visit.pop(0)
-            
-            if url in self.visited_urls:
+        def enqueue(links):
+            for link in links:
+                if link not in queued:
+                    queued.add(link)
+                    frontier.append(link)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor, \
+                ProcessPoolExecutor(max_workers=self.parse_workers) as parser:
+            while frontier or fetching or parsing:
+                while frontier and len(fetching) < self.concurrency and len(parsing) < max_parse_backlog and (
+                        max_pages is None or pages_scraped + len(fetching) + len(parsing) < max_pages):
+                    url = frontier.popleft()
+                    if url in fresh:
+                        # The sitemap says nothing changed since our last fetch
+                        self.visited_urls.add(url)
+                        pages_scraped += 1
+                        enqueue(self.crawl_state[url].get('links', []))
+                        continue
+                    print(f"Scraping: {url}")
+                    fetching[executor.submit(self.crawl_page, url)] = url
+
+                if not fetching and not parsing:
+                    break
+                done, _ = wait(list(fetching) + list(parsing), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in parsing:
+                        url, record = parsing.pop(future)
+                        try:
+                            content, record['links'] = future.result()
+                        except Exception as e:
+                            print(f"Error parsing {url}: {str(e)}")
+                            continue
+                        result = {'status': 'changed', 'content': content, 'links': record['links'], 'record': record}
+                    else:
+                        url = fetching.pop(future)
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            print(f"Error scraping {url}: {str(e)}")
+                            continue
+                        if result['status'] == 'fetched':
+                            parsing[parser.submit(parse_page, url, result['html'], self.base_url)] = (url, result['record'])
+                            continue
+
+                    if result['status'] == 'gone':
+                        self.crawl_state.pop(url, None)
+                        deletes.append(url)
+                        continue
+                    if result['status'] == 'error':
+                        continue
+
+                    if 'record' in result:
+                        self.crawl_state[url] = result['record']
+                    if result['status'] == 'changed':
+                        upserts.append(result['content'])
+                    self.visited_urls.add(url)
+                    pages_scraped += 1
+                    enqueue(result['links'])
+
+                if pages_scraped - last_checkpoint >= CHECKPOINT_EVERY:
+                    # Anything still in flight is crawled again after a resume
+                    in_flight = list(fetching.values()) + [url for url, record in parsing.values()]
+                    self.save_checkpoint(in_flight + list(frontier), queued, fresh, pages_scraped, deletes, upserts)
+                    last_checkpoint = pages_scraped
+
+        if incremental:
+            print(f"Incremental crawl: {len(upserts)} changed, {len(deletes)} removed, "
+                  f"{pages_scraped - len(upserts)} unchanged")
+            self.save_data(self.merge_delta(self.load_existing_data(), upserts, deletes))
+            self.save_delta(upserts, deletes)
+        else:
+            self.save_data(upserts.values())
+        self.save_crawl_state()
+
+        # The crawl finished, so there is nothing left to resume
+        upserts.close()
+        for path in (CRAWL_LOG_FILE, CHECKPOINT_FILE):
+            if os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def merge_delta(pages, upserts, deletes):
+        """Yield ``pages`` with changed and removed pages applied, keeping crawl order.
+
+        ``upserts`` maps URLs to changed pages; new pages come last.
+        """
+        deletes = set(deletes)
+        seen = set()
+        for page in pages:
+            url = page['url']
+            if url in deletes or url in seen:
                 continue
+            seen.add(url)
+            yield upserts[url] if url in upserts else page
+        for url in upserts:
+            if url not in seen:
+                yield upserts[url]
 
-            print(f"Scraping: {url}")
-            content = self.extract_page_content(url)
-            
-            if content:
-                self.data.append(content)
-                self.visited_urls.add(url)
-                pages_scraped += 1
+    def load_existing_data(self):
+        try:
+            return load_corpus(DATA_FILE)
+        except FileNotFoundError:
+            return []
 
-                # Get new links to visit
-                new_links = self.get_internal_links(url)
-                to_visit.extend([link for link in new_links if link not in self.visited_urls])
+    def load_crawl_state(self):
+        try:
+            with open(CRAWL_STATE_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
 
-            # Be polite with rate limiting
-            time.sleep(2)
+    def save_crawl_state(self):
+        with open(CRAWL_STATE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(self.crawl_state, f, ensure_ascii=False)
 
-        # Save the scraped data
-        self.save_data()
+    def load_checkpoint(self):
+        try:
+            with open(CHECKPOINT_FILE, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return None
+        if checkpoint.get('base_url') != self.base_url:
+            print(f"Ignoring checkpoint {CHECKPOINT_FILE}: it is for {checkpoint.get('base_url')}")
+            return None
+        if not os.path.exists(CRAWL_LOG_FILE):
+            print(f"Ignoring checkpoint {CHECKPOINT_FILE}: {CRAWL_LOG_FILE} is missing")
+            return None
+        return checkpoint
 
-    def save_data(self):
+    def save_checkpoint(self, frontier, queued, fresh, pages_scraped, deletes, upserts):
+        checkpoint = {
+            'base_url': self.base_url,
+            'incremental': self.incremental,
+            'saved_at': datetime.now(timezone.utc).isoformat(),
+            'pages_scraped': pages_scraped,
+            'frontier': frontier,
+            'queued': list(queued),
+            'fresh': list(fresh),
+            'visited': list(self.visited_urls),
+            'deletes': deletes,
+            'crawl_state': self.crawl_state,
+            # The page log is cut back to this size on resume
+            'log_size': upserts.sync(),
+            'pages': upserts.offsets,
+        }
+        # Replaced atomically, so a crash while writing leaves the previous checkpoint
+        tmp_path = CHECKPOINT_FILE + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f, ensure_ascii=False)
+        os.replace(tmp_path, CHECKPOINT_FILE)
+
+    def save_delta(self, upserts, deletes):
+        # Streamed one page at a time rather than built up as one document
+        tmp_path = DELTA_FILE + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(f'{{"generated_at": {json.dumps(datetime.now(timezone.utc).isoformat())}, '
+                    f'"deletes": {json.dumps(deletes, ensure_ascii=False)}, "upserts": [')
+            for i, page in enumerate(upserts.values()):
+                f.write((',\n' if i else '\n') + json.dumps(page, ensure_ascii=False))
+            f.write('\n]}\n')
+        os.replace(tmp_path, DELTA_FILE)
+
+    def save_data(self, pages):
+        """Write ``pages`` (any iterable) to DATA_FILE as JSON Lines, one page at a time."""
         if not os.path.exists('data'):
             os.makedirs('data')
-            
-        with open('data/policyadvisor_data.json', 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, indent=2, ensure_ascii=False)
+
+        tmp_path = DATA_FILE + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for page in pages:
+                f.write(json.dumps(page, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, DATA_FILE)
+
+        # Compiled copy the bot loads lazily instead of parsing the JSON, and its prebuilt indexes
+        compile_corpus(iter_jsonl(DATA_FILE), compiled_path(DATA_FILE), file_digest(DATA_FILE))
+        build_artifacts(DATA_FILE)
+
+
+class PageLog(Mapping):
+    """Append-only JSON Lines log of the pages extracted by a crawl, keyed by URL.
+
+    Only the byte offset of each page is kept in memory; pages are read back
+    from the file when they are looked up. ``offsets`` and ``size`` restore a
+    log that was checkpointed, dropping anything written after the checkpoint.
+    """
+
+    def __init__(self, path, offsets=None, size=None):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.offsets = dict(offsets or {})
+        self._file = open(path, 'r+b' if size is not None else 'wb')
+        self._reader = None
+        if size is not None:
+            self._file.truncate(size)
+            self._file.seek(size)
+
+    def append(self, page):
+        self.offsets[page['url']] = self._file.tell()
+        self._file.write(json.dumps(page, ensure_ascii=False).encode('utf-8') + b'\n')
+        self._file.flush()
+
+    def sync(self):
+        """Make everything appended so far durable and return the log's size."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def __getitem__(self, url):
+        self._file.flush()
+        if self._reader is None:
+            self._reader = open(self.path, 'rb')
+        self._reader.seek(self.offsets[url])
+        return json.loads(self._reader.readline().decode('utf-8'))
+
+    def __iter__(self):
+        return iter(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def close(self):
+        self._file.close()
+        if self._reader is not None:
+            self._reader.close()
 
 if __name__ == "__main__":
-    scraper = PolicyAdvisorScraper()
-    # Scrape up to 500 pages for extensive coverage
-    scraper.scrape_site(max_pages=500)
\ No newline at end of file
+    scraper = PolicyAdvisorScraper(concurrency=8, requests_per_second=2.0)
+    # Scrape up to 500 pages for extensive coverage; --incremental only refreshes what changed
+    # --resume picks up an interrupted crawl from its last checkpoint
+    scraper.scrape_site(max_pages=500, incremental='--incremental' in sys.argv, resume='--resume' in sys.argv)
\ No newline at end of file
@@ -0,0 +1,154 @@
+import json
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+# Field weights used by the original page scorer in PolicyAdvisorBot
+TITLE_WEIGHT = 3
+CONTENT_WEIGHT = 2
+STRUCTURED_DATA_WEIGHT = 2
+FAQ_WEIGHT = 2
+METADATA_WEIGHT = 1
+DESCRIPTION_BOOST = 1
+CATEGORY_WEIGHT = 1
+RELATED_TOPIC_WEIGHT = 1
+AUTHOR_BOOST = 2
+
+DESCRIPTION_KEYS = {'description', 'og:description', 'twitter:description'}
+LEADERSHIP_TERMS = {'ceo', 'founder', 'author', 'who'}
+
+
+def page_field_units(page: Dict) -> Iterable[Tuple[str, str, int]]:
+    """Yield (field, lowercased text, weight) for every scored unit of a page.
+
+    A unit is the smallest piece of a page that earns a score once per
+    matching query term: the title, the content, each FAQ, each string
+    metadata value and so on.
+    """
+    yield 'title', page['title'].lower(), TITLE_WEIGHT
+    yield 'content', page['content'].lower() if page['content'] else "", CONTENT_WEIGHT
+
+    if page.get('structured_data'):
+        yield 'structured_data', json.dumps(page['structured_data']).lower(), STRUCTURED_DATA_WEIGHT
+
+    for faq in page.get('faqs') or []:
+        faq_text = (faq.get('question', '') + ' ' + faq.get('answer', '')).lower()
+        yield 'faqs', faq_text, FAQ_WEIGHT
+
+    for key, value in page.get('metadata', {}).items():
+        if isinstance(value, str):
+            weight = METADATA_WEIGHT + (DESCRIPTION_BOOST if key in DESCRIPTION_KEYS else 0)
+            yield 'metadata', value.lower(), weight
+
+    if page.get('categories'):
+        yield 'categories', ' '.join(page['categories']).lower(), CATEGORY_WEIGHT
+
+    if page.get('related_topics'):
+        yield 'related_topics', ' '.join(page['related_topics']).lower(), RELATED_TOPIC_WEIGHT
+
+
+class InvertedIndex:
+    """Token-level inverted index reproducing the substring page scorer.
+
+    Every field is split on whitespace and each token points at the units
+    (page, field, weight) it occurs in. Query terms never contain whitespace,
+    so ``term in text`` holds exactly when ``term`` is a substring of one of
+    the text's tokens; those tokens are found through a trigram index over the
+    vocabulary instead of scanning the corpus.
+    """
+
+    def __init__(self, pages: Iterable[Dict] = ()):
+        self.vocabulary: List[str] = []
+        self.token_ids: Dict[str, int] = {}
+        self.postings: List[List[int]] = []
+        self.field_postings: Dict[str, Dict[int, Set[int]]] = defaultdict(dict)
+        self.unit_page: List[int] = []
+        self.unit_weight: List[int] = []
+        self.trigrams: Dict[str, Set[int]] = defaultdict(set)
+        self.author_pages: List[int] = []
+        self.deleted: Set[int] = set()
+        self.page_count = 0
+        self._term_cache: Dict[str, List[int]] = {}
+        self.max_cached_terms = 4096
+        for page in pages:
+            self.add_page(page)
+
+    def add_page(self, page: Dict) -> int:
+        page_id = self.page_count
+        self.page_count += 1
+        self._term_cache.clear()
+
+        for field, text, weight in page_field_units(page):
+            unit_id = len(self.unit_page)
+            self.unit_page.append(page_id)
+            self.unit_weight.append(weight)
+            for token in set(text.split()):
+                token_id = self._token_id(token)
+                self.postings[token_id].append(unit_id)
+                self.field_postings[field].setdefault(token_id, set()).add(page_id)
+
+        # Non-string author metadata is only scored for leadership questions
+        author = page.get('metadata', {}).get('author')
+        if author is not None and not isinstance(author, str):
+            self.author_pages.append(page_id)
+        return page_id
+
+    def _token_id(self, token: str) -> int:
+        token_id = self.token_ids.get(token)
+        if token_id is None:
+            token_id = len(self.vocabulary)
+            self.token_ids[token] = token_id
+            self.vocabulary.append(token)
+            self.postings.append([])
+            for i in range(len(token) - 2):
+                self.trigrams[token[i:i + 3]].add(token_id)
+        return token_id
+
+    def matching_tokens(self, term: str) -> List[int]:
+        """Return ids of all vocabulary tokens containing ``term``."""
+        if len(term) < 3:
+            return [i for i, token in enumerate(self.vocabulary) if term in token]
+
+        grams = sorted((self.trigrams.get(term[i:i + 3], set()) for i in range(len(term) - 2)), key=len)
+        candidates = set(grams[0]).intersection(*grams[1:])
+        return [i for i in candidates if term in self.vocabulary[i]]
+
+    def term_units(self, term: str) -> List[int]:
+        """Return the units whose text contains ``term``, each listed once."""
+        units = self._term_cache.get(term)
+        if units is None:
+            matched = set()
+            for token_id in self.matching_tokens(term):
+                matched.update(self.postings[token_id])
+            units = list(matched)
+            if len(self._term_cache) >= self.max_cached_terms:
+                self._term_cache.clear()
+            self._term_cache[term] = units
+        return units
+
+    def field_pages(self, field: str, term: str) -> Set[int]:
+        """Return the pages whose ``field`` contains ``term``."""
+        pages = set()
+        field_postings = self.field_postings.get(field, {})
+        for token_id in self.matching_tokens(term):
+            pages.update(field_postings.get(token_id, ()))
+        return pages
+
+    def score(self, query_terms: List[str]) -> Dict[int, int]:
+        """Score the candidate pages for ``query_terms``, same as a full scan."""
+        scores: Dict[int, int] = defaultdict(int)
+        for term in query_terms:
+            for unit_id in self.term_units(term):
+                scores[self.unit_page[unit_id]] += self.unit_weight[unit_id]
+
+        if self.author_pages and any(term in LEADERSHIP_TERMS for term in query_terms):
+            for page_id in self.author_pages:
+                scores[page_id] += AUTHOR_BOOST
+        return scores
+
+    def top_pages(self, query_terms: List[str], k: int = 5) -> List[Tuple[int, int]]:
+        """Return the ``k`` best (page_id, score) pairs, ties in corpus order."""
+        scores = self.score(query_terms)
+        ranked = sorted(((page_id, score) for page_id, score in scores.items()
+                         if score > 0 and page_id not in self.deleted),
+                        key=lambda item: (-item[1], item[0]))
+        return ranked[:k]
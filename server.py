@@ -1,24 +1,44 @@
-from flask import Flask, request, jsonify, send_from_directory, current_app
-from werkzeug.utils import secure_filename
+from flask import Flask, Response, request, jsonify, send_from_directory, current_app, stream_with_context
+import json
 import os
+import re
+import threading
+import uuid
 from flask_cors import CORS
-from chatbot import PolicyAdvisorBot
+from metrics import REGISTRY, timed
+from uploads import UploadError
 import os
 
 # File upload configuration
-UPLOAD_FOLDER = 'uploads'
-ALLOWED_EXTENSIONS = {'txt', 'pdf', 'doc', 'docx'}
+ALLOWED_EXTENSIONS = {'txt', 'pdf', 'docx'}
+MAX_UPLOAD_BYTES = 16 * 1024 * 1024
+
+# Each browser gets its own conversation, keyed by this cookie
+SESSION_COOKIE = 'session_id'
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
 
 app = Flask(__name__, static_folder='static', static_url_path='')
 CORS(app)  # Enable CORS for all routes
 
-# Configure upload folder
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+# Uploads are read from the request stream, never saved; larger requests get 413
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+
+# The chatbot is built on first use rather than at import, so a cold start that
+# only serves static files or /metrics never loads the corpus or its imports
+_bot = None
+_bot_lock = threading.Lock()
 
-# Initialize the chatbot
-bot = PolicyAdvisorBot()
+def get_bot():
+    global _bot
+    if _bot is None:
+        with _bot_lock:
+            if _bot is None:
+                from chatbot import PolicyAdvisorBot, start_delta_watcher
+                from batch import start_cache_warming
+                _bot = PolicyAdvisorBot()
+                start_cache_warming(_bot)
+                start_delta_watcher(_bot)
+    return _bot
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -27,6 +47,34 @@ def allowed_file(filename):
 def home():
     return send_from_directory(app.static_folder, 'index.html')
 
+def read_uploaded_file(session_id):
+    """Index the uploaded file, if any, as the session's document.
+
+    The file is extracted straight from the request stream (kept in memory,
+    or spooled by Werkzeug when large) without a temporary copy.
+    """
+    if 'file' in request.files:
+        file = request.files['file']
+        if file and file.filename and allowed_file(file.filename):
+            with timed('upload'):
+                get_bot().add_upload(session_id, file.stream, file.content_type)
+
+def get_session_id():
+    """Session id from the form or cookie, or a new one for a first visit."""
+    session_id = request.form.get('session_id') or request.cookies.get(SESSION_COOKIE)
+    if session_id and SESSION_ID_PATTERN.match(session_id):
+        return session_id
+    return uuid.uuid4().hex
+
+def with_session_cookie(response, session_id):
+    response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite='Lax')
+    return response
+
+def sse_event(data, event=None):
+    """Format one server-sent event carrying a JSON payload."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
 @app.route('/chat', methods=['POST'])
 def chat():
     try:
@@ -35,36 +83,68 @@ def chat():
             return jsonify({'error': 'No message provided'}), 400
 
         # Handle file upload
-        file_content = None
-        file_type = None
-        if 'file' in request.files:
-            file = request.files['file']
-            if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(file_path)
-                
-                # Read file content
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    file_content = f.read()
-                file_type = file.content_type
-                
-                # Clean up the file after reading
-                os.remove(file_path)
+        session_id = get_session_id()
+        read_uploaded_file(session_id)
 
         # Get response from the chatbot
-        response = bot.get_response(message, file_content, file_type)
+        # Optional corpus filter for sharded retrieval, e.g. 'policyadvisor/life-insurance'
+        response = get_bot().get_response(message, session_id=session_id,
+                                          corpus_filter=request.form.get('corpus'))
         
-        # Return both the response and the full conversation history
-        return jsonify({
-            'response': response,
-            'history': bot.conversation_history
-        })
+        with timed('serialize'):
+            payload = jsonify({
+                'response': response,
+                'session_id': session_id
+            })
+        return with_session_cookie(payload, session_id)
         
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         current_app.logger.error(f"Error in chat endpoint: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Same as /chat, but streams the reply as server-sent events.
+
+    Each piece of text arrives as a ``data: {"delta": ...}`` event, followed
+    by a final ``event: done`` carrying the whole response.
+    """
+    message = request.form.get('message')
+    if not message:
+        return jsonify({'error': 'No message provided'}), 400
+    session_id = get_session_id()
+    corpus_filter = request.form.get('corpus')
+    try:
+        read_uploaded_file(session_id)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error reading upload: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+    def generate():
+        parts = []
+        try:
+            for delta in get_bot().stream_response(message, session_id=session_id,
+                                                    corpus_filter=corpus_filter):
+                parts.append(delta)
+                yield sse_event({'delta': delta})
+            yield sse_event({'response': "".join(parts)}, event='done')
+        except Exception as e:
+            current_app.logger.error(f"Error in chat stream: {str(e)}")
+            yield sse_event({'error': str(e)}, event='error')
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    return with_session_cookie(response, session_id)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics: per-stage latency histograms, token counts and cache outcomes."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 # Vercel requires an app handler
 app.debug = True
 handler = app
@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List
+
+if TYPE_CHECKING:
+    import sqlite3
+
+DEFAULT_TTL = 60 * 60  # Drop sessions idle for an hour
+DEFAULT_MAX_SESSIONS = 10000
+
+
+class ConversationStore:
+    """Keeps each session's recent conversation turns.
+
+    A turn is a user message and the assistant's reply; only the latest
+    ``max_turns`` are kept per session. Implementations must be safe to share
+    between threads.
+    """
+
+    def __init__(self, max_turns: int = 5, ttl: float = DEFAULT_TTL):
+        self.max_turns = max_turns
+        self.ttl = ttl
+
+    def get_history(self, session_id: str) -> List[Dict]:
+        """Return the session's messages, oldest first, as chat completion messages."""
+        raise NotImplementedError
+
+    def append_turn(self, session_id: str, user_content: str, assistant_content: str) -> None:
+        raise NotImplementedError
+
+    def clear(self, session_id: str) -> None:
+        raise NotImplementedError
+
+
+class MemoryConversationStore(ConversationStore):
+    """In-process LRU of sessions with idle expiry.
+
+    Sessions live in one worker's memory, so multi-worker deployments need
+    sticky sessions or a shared backend such as SQLiteConversationStore.
+    """
+
+    def __init__(self, max_turns: int = 5, ttl: float = DEFAULT_TTL, max_sessions: int = DEFAULT_MAX_SESSIONS):
+        super().__init__(max_turns, ttl)
+        self.max_sessions = max_sessions
+        self._sessions: 'OrderedDict[str, tuple]' = OrderedDict()  # id -> (last used, messages)
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float) -> None:
+        # Least recently used sessions sit at the front
+        while self._sessions:
+            session_id, (last_used, _) = next(iter(self._sessions.items()))
+            if now - last_used <= self.ttl and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[session_id]
+
+    def get_history(self, session_id: str) -> List[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return []
+            self._sessions[session_id] = (now, entry[1])
+            self._sessions.move_to_end(session_id)
+            return list(entry[1])
+
+    def append_turn(self, session_id: str, user_content: str, assistant_content: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            messages = entry[1] if entry else []
+            messages = messages + [{"role": "user", "content": user_content},
+                                   {"role": "assistant", "content": assistant_content}]
+            self._sessions[session_id] = (now, messages[-self.max_turns * 2:])
+            self._evict(now)
+
+    def clear(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class SQLiteConversationStore(ConversationStore):
+    """Sessions in a SQLite file, shared by every thread and worker process on the host."""
+
+    def __init__(self, path: str, max_turns: int = 5, ttl: float = DEFAULT_TTL):
+        super().__init__(max_turns, ttl)
+        self.path = path
+        self._local = threading.local()
+        self._appends = 0
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with self._connection() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS messages ("
+                       "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, "
+                       "role TEXT NOT NULL, content TEXT NOT NULL, created_at REAL NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id)")
+
+    def _connection(self) -> 'sqlite3.Connection':
+        # sqlite3 connections may not be shared between threads, so keep one per thread
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            import sqlite3  # Only needed by this store, so the default one skips the import
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def get_history(self, session_id: str) -> List[Dict]:
+        rows = self._connection().execute(
+            "SELECT role, content, created_at FROM messages WHERE session_id = ? ORDER BY id",
+            (session_id,)).fetchall()
+        # A session expires once its latest turn is older than the TTL
+        if not rows or rows[-1][2] < time.time() - self.ttl:
+            return []
+        return [{"role": role, "content": content} for role, content, created_at in rows]
+
+    def append_turn(self, session_id: str, user_content: str, assistant_content: str) -> None:
+        now = time.time()
+        with self._connection() as db:
+            db.executemany("INSERT INTO messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                           [(session_id, "user", user_content, now), (session_id, "assistant", assistant_content, now)])
+            db.execute("DELETE FROM messages WHERE session_id = ? AND id NOT IN "
+                       "(SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                       (session_id, session_id, self.max_turns * 2))
+            # Expired sessions are swept now and then rather than on every write
+            self._appends += 1
+            if self._appends % 100 == 0:
+                db.execute("DELETE FROM messages WHERE session_id IN (SELECT session_id FROM messages "
+                           "GROUP BY session_id HAVING MAX(created_at) < ?)", (now - self.ttl,))
+
+    def clear(self, session_id: str) -> None:
+        with self._connection() as db:
+            db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+
+
+def create_store(spec: str = 'memory', max_turns: int = 5, ttl: float = DEFAULT_TTL) -> ConversationStore:
+    """Create a store from a spec: 'memory' or 'sqlite:///path/to/sessions.db'."""
+    if spec == 'memory':
+        return MemoryConversationStore(max_turns, ttl)
+    if spec.startswith('sqlite:///'):
+        return SQLiteConversationStore(spec[len('sqlite:///'):], max_turns, ttl)
+    raise ValueError(f"Unknown session store '{spec}', expected 'memory' or 'sqlite:///path'")
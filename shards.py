@@ -0,0 +1,237 @@
+"""Retrieval over several named corpora, partitioned into shards served by worker processes.
+
+    python shards.py [data/corpora.json]
+
+splits every corpus listed in the config, e.g.
+
+    {"shards_per_corpus": 4,
+     "corpora": {"policyadvisor": "data/policyadvisor_data.jsonl", "fsra": "data/fsra.jsonl"}}
+
+into ``shards_per_corpus`` shards by a hash of each page's URL. Each shard is
+compiled with its retrieval artifacts under ``data/shards/`` and listed in
+``data/shards/manifest.json``. Without a config, the scraped corpus is the
+only one.
+
+With ``SHARDS=data/shards/manifest.json`` set, PolicyAdvisorBot hands
+retrieval to a ShardedRetriever. The shards are spread over ``SHARD_WORKERS``
+processes, each holding its shards' BM25 indexes. A query fans out to every
+worker that holds a matching shard. Each worker returns its top candidates,
+already rendered, and the merged top candidates are packed into the context.
+Per-shard BM25 statistics make scores only approximately comparable across
+shards. Hash partitioning keeps them close within a corpus.
+
+A corpus filter such as ``policyadvisor/life-insurance,fsra`` limits a request
+to some corpora, or to sections of a corpus (the first segment of a page's
+URL path). Workers holding no matching shard are not asked at all.
+"""
+import json
+import os
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+from urllib.parse import urlparse
+
+import numpy as np
+
+from artifacts import build_artifacts, load_artifacts
+from chunking import chunk_pages
+from context import ContextBuilder, ContextCandidate, pack_context
+from corpus import iter_pages, load_corpus, source_path
+from ranking import BATCH_QUERIES, BM25Ranker, top_k
+
+CONFIG_FILE = 'data/corpora.json'
+SHARD_DIR = 'data/shards'
+MANIFEST_FILE = os.path.join(SHARD_DIR, 'manifest.json')
+DEFAULT_CORPUS = 'policyadvisor'
+DEFAULT_SHARDS_PER_CORPUS = 4
+MANIFEST_VERSION = 1
+
+# The shards loaded by this worker process, set by load_shards
+_shards: List['Shard'] = []
+
+
+def page_section(page: Dict) -> str:
+    """The first segment of the page's URL path, e.g. 'life-insurance'; '' for the home page."""
+    return urlparse(page.get('url', '')).path.strip('/').split('/', 1)[0]
+
+
+def sections_path(shard_path: str) -> str:
+    return os.path.splitext(shard_path)[0] + '.sections.json'
+
+
+def parse_corpus_filter(text: Optional[str]) -> Optional[Dict[str, Optional[Set[str]]]]:
+    """Parse ``corpus[/section],...`` into {corpus: sections, or None for the whole corpus}."""
+    if not text or not text.strip():
+        return None
+    allowed: Dict[str, Optional[Set[str]]] = {}
+    for part in text.split(','):
+        corpus, _, section = part.strip().partition('/')
+        if not corpus:
+            continue
+        if not section:
+            allowed[corpus] = None
+        elif corpus not in allowed or allowed[corpus] is not None:
+            allowed.setdefault(corpus, set()).add(section.strip('/'))
+    return allowed
+
+
+class Shard:
+    """One shard's compiled pages, BM25 index and context builder, inside a worker process."""
+
+    def __init__(self, corpus: str, index: int, path: str):
+        self.corpus = corpus
+        self.index = index
+        self.pages = load_corpus(path)
+        artifacts = load_artifacts(path, self.pages)
+        self.chunks = artifacts.chunks if artifacts is not None else chunk_pages(self.pages)
+        self.ranker = BM25Ranker.from_corpus(self.pages, self.chunks, artifacts=artifacts)
+        self.context_builder = ContextBuilder(self.pages, self.chunks, 0, artifacts=artifacts)
+
+        # Section of every chunk, as an index into section_names, for filtering
+        with open(sections_path(path), 'r', encoding='utf-8') as f:
+            page_sections = json.load(f)
+        self.section_names = {name: i for i, name in enumerate(sorted(set(page_sections)))}
+        page_section_ids = np.asarray([self.section_names[name] for name in page_sections], dtype=np.int32)
+        chunk_pages_ids = np.fromiter((self.chunks[i]['page'] for i in range(len(self.chunks))), dtype=np.int64,
+                                      count=len(self.chunks))
+        self.chunk_sections = page_section_ids[chunk_pages_ids]
+
+    def search(self, queries: Sequence[str], k: int,
+               sections: Optional[Set[str]] = None) -> List[List[Tuple[float, ContextCandidate, str]]]:
+        """Top ``k`` (score, context candidate, url) for each query, optionally only in ``sections``."""
+        excluded = None
+        if sections is not None:
+            wanted = [self.section_names[name] for name in sections if name in self.section_names]
+            excluded = ~np.isin(self.chunk_sections, wanted)
+        results = []
+        for start in range(0, len(queries), BATCH_QUERIES):
+            scores = self.ranker.score_batch(queries[start:start + BATCH_QUERIES])
+            if excluded is not None:
+                scores[:, excluded] = 0
+            for row in scores:
+                hits = top_k(row, k)
+                results.append([
+                    (score, ((self.corpus, self.index, page_id), order, header, text_key, body),
+                     self.pages[page_id]['url'])
+                    for (_, score), (page_id, order, header, text_key, body)
+                    in zip(hits, self.context_builder.candidates(hits))
+                ])
+        return results
+
+
+def load_shards(shards: Sequence[Dict]) -> None:
+    """Worker initializer: load this worker's shards."""
+    global _shards
+    _shards = [Shard(shard['corpus'], shard['index'], shard['path']) for shard in shards]
+
+
+def search_shards(queries: Sequence[str], k: int, corpus_filter: Optional[Dict[str, Optional[Set[str]]]]):
+    """Worker task: the top ``k`` candidates of each query across this worker's matching shards."""
+    merged = [[] for _ in queries]
+    for shard in _shards:
+        if corpus_filter is not None and shard.corpus not in corpus_filter:
+            continue
+        sections = corpus_filter[shard.corpus] if corpus_filter is not None else None
+        for hits, shard_hits in zip(merged, shard.search(queries, k, sections)):
+            hits.extend(shard_hits)
+    return [sorted(hits, key=lambda hit: -hit[0])[:k] for hits in merged]
+
+
+class ShardedRetriever:
+    """Fans queries out to shard worker processes and merges their top-k candidates."""
+
+    def __init__(self, manifest_path: str = MANIFEST_FILE, workers: int = None, max_tokens: int = 1500,
+                 candidates: int = 30):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') != MANIFEST_VERSION:
+            raise ValueError(f"{manifest_path} is not a version {MANIFEST_VERSION} shard manifest; "
+                             f"rebuild it with python shards.py")
+        shards = manifest['shards']
+        self.corpora = sorted({shard['corpus'] for shard in shards})
+        self.max_tokens = max_tokens
+        self.candidates = candidates
+
+        workers = max(1, min(workers or os.cpu_count() or 1, len(shards)))
+        # Round-robin keeps each corpus spread over all workers
+        assignments = [shards[i::workers] for i in range(workers)]
+        self.workers = [(ProcessPoolExecutor(1, initializer=load_shards, initargs=(assigned,)),
+                         {shard['corpus'] for shard in assigned})
+                        for assigned in assignments]
+        # Start loading every worker's shards now rather than on the first query
+        for executor, corpora in self.workers:
+            executor.submit(len, ())
+
+    def search_batch(self, queries: Sequence[str], corpus_filter: str = None) -> List[List[Tuple]]:
+        """Merged top (score, candidate, url) hits of each query, best first."""
+        allowed = parse_corpus_filter(corpus_filter)
+        futures = [executor.submit(search_shards, list(queries), self.candidates, allowed)
+                   for executor, corpora in self.workers
+                   if allowed is None or corpora & allowed.keys()]
+        merged = [[] for _ in queries]
+        for future in futures:
+            for hits, worker_hits in zip(merged, future.result()):
+                hits.extend(worker_hits)
+        # Ties keep worker order, which is stable from run to run
+        return [sorted(hits, key=lambda hit: -hit[0])[:self.candidates] for hits in merged]
+
+    def context(self, hits: List[Tuple]) -> str:
+        return pack_context((candidate for score, candidate, url in hits), self.max_tokens)
+
+    @staticmethod
+    def sources(hits: List[Tuple]) -> List[str]:
+        """URLs of the pages behind merged hits, best first."""
+        return list(dict.fromkeys(url for score, candidate, url in hits))
+
+    def close(self) -> None:
+        for executor, corpora in self.workers:
+            executor.shutdown(wait=False)
+
+
+def load_config(path: str = CONFIG_FILE) -> Dict:
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    from chatbot import DATA_FILE
+    return {'shards_per_corpus': DEFAULT_SHARDS_PER_CORPUS, 'corpora': {DEFAULT_CORPUS: DATA_FILE}}
+
+
+def build_shards(config: Dict, shard_dir: str = SHARD_DIR) -> str:
+    """Split each configured corpus into shards, with compiled corpora and artifacts; returns the manifest path."""
+    count = int(config.get('shards_per_corpus', DEFAULT_SHARDS_PER_CORPUS))
+    os.makedirs(shard_dir, exist_ok=True)
+    shards = []
+    for corpus, data_path in sorted(config['corpora'].items()):
+        paths = [os.path.join(shard_dir, f'{corpus}-{i}.jsonl') for i in range(count)]
+        files = [open(path + '.tmp', 'w', encoding='utf-8') for path in paths]
+        sections: List[List[str]] = [[] for _ in paths]
+        try:
+            for page in iter_pages(source_path(data_path)):
+                # Stable across rebuilds, so a page stays in its shard
+                i = zlib.crc32(page.get('url', '').encode('utf-8')) % count
+                files[i].write(json.dumps(page, ensure_ascii=False) + '\n')
+                sections[i].append(page_section(page))
+        finally:
+            for f in files:
+                f.close()
+        for i, path in enumerate(paths):
+            os.replace(path + '.tmp', path)
+            if not sections[i]:
+                continue  # A corpus smaller than its shard count
+            with open(sections_path(path), 'w', encoding='utf-8') as f:
+                json.dump(sections[i], f)
+            build_artifacts(path)
+            shards.append({'corpus': corpus, 'index': i, 'path': path, 'pages': len(sections[i])})
+            print(f"Built shard {corpus}-{i}: {len(sections[i])} pages")
+
+    manifest_path = os.path.join(shard_dir, 'manifest.json')
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'version': MANIFEST_VERSION, 'shards': shards}, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return manifest_path
+
+
+if __name__ == "__main__":
+    config_path = sys.argv[1] if len(sys.argv) > 1 else CONFIG_FILE
+    print(f"Wrote shard manifest {build_shards(load_config(config_path))}")
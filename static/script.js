@@ -11,16 +11,6 @@ document.addEventListener('DOMContentLoaded', () => {
         return now.toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
     }
 
-    function addMessage(message, isUser, time = formatTime()) {
-        const messageDiv = document.createElement('div');
-        messageDiv.className = `message ${isUser ? 'user' : 'bot'}`;
-        
-        const messageContent = document.createElement('div');
-        messageContent.className = 'message-content';
-        
-        // Format the message with proper HTML
-        messageContent.innerHTML = formatMessage(message);
-
 function formatMessage(message) {
     // Replace numbered points with line breaks
     message = message.replace(/(\d+\. )/g, '<br><br>$1');
@@ -87,7 +77,17 @@ function formatTable(message) {
 
     return formattedContent;
 }
+
+    function addMessage(message, isUser, time = formatTime()) {
+        const messageDiv = document.createElement('div');
+        messageDiv.className = `message ${isUser ? 'user' : 'bot'}`;
+        
+        const messageContent = document.createElement('div');
+        messageContent.className = 'message-content';
         
+        // Format the message with proper HTML
+        messageContent.innerHTML = formatMessage(message);
+
         const timestamp = document.createElement('div');
         timestamp.className = 'message-time';
         timestamp.textContent = time;
@@ -98,18 +98,39 @@ function formatTable(message) {
         
         // Scroll to bottom
         chatMessages.scrollTop = chatMessages.scrollHeight;
+        return messageContent;
+    }
+
+    function updateMessage(messageContent, message) {
+        messageContent.innerHTML = formatMessage(message);
+        chatMessages.scrollTop = chatMessages.scrollHeight;
     }
 
-    function loadConversationHistory(history) {
-        // Clear existing messages except the welcome message
-        while (chatMessages.children.length > 1) {
-            chatMessages.removeChild(chatMessages.lastChild);
+    // Read server-sent events from a fetch response, calling onEvent(event, data) for each
+    async function readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                let data = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) event = line.slice(6).trim();
+                    else if (line.startsWith('data:')) data += line.slice(5).trim();
+                });
+                if (data) onEvent(event, JSON.parse(data));
+            }
         }
-        
-        // Add messages from history
-        history.forEach(msg => {
-            addMessage(msg.content, msg.role === 'user');
-        });
     }
 
     // Handle file selection
@@ -158,8 +179,8 @@ function formatTable(message) {
                 fileName.textContent = '';
             }
 
-            // Send message and file to backend
-            const response = await fetch('/chat', {
+            // Send message and file to backend, streaming the reply back
+            const response = await fetch('/chat/stream', {
                 method: 'POST',
                 body: formData
             });
@@ -168,13 +189,25 @@ function formatTable(message) {
                 throw new Error('Network response was not ok');
             }
 
-            const data = await response.json();
-            
-            // Remove typing indicator
-            typingIndicator.remove();
+            // Render the reply as it arrives
+            let reply = '';
+            let botMessage = null;
+            await readEventStream(response, (event, data) => {
+                if (event === 'error') {
+                    throw new Error(data.error);
+                }
+                if (!botMessage) {
+                    typingIndicator.remove();
+                    botMessage = addMessage('', false);
+                }
+                reply = event === 'done' ? data.response : reply + data.delta;
+                updateMessage(botMessage, reply);
+            });
 
-            // Only add the new response
-            addMessage(data.response, false);
+            typingIndicator.remove();
+            if (!botMessage) {
+                addMessage(reply, false);
+            }
         } catch (error) {
             console.error('Error:', error);
             // Remove typing indicator in case of error
@@ -0,0 +1,62 @@
+import json
+import os
+import sys
+
+import pytest
+
+# The modules live at the top of the repository rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PAGES = [
+    {'url': 'https://policyadvisor.com/life-insurance/term-life/', 'title': 'Term life insurance',
+     'content': 'Term life insurance covers you for a set term such as 10 or 20 years at a low monthly cost.'},
+    {'url': 'https://policyadvisor.com/critical-illness-insurance/', 'title': 'Critical illness insurance',
+     'content': 'Critical illness insurance pays a lump sum if you are diagnosed with a covered illness.'},
+    {'url': 'https://policyadvisor.com/disability-insurance/', 'title': 'Disability insurance',
+     'content': 'Disability insurance replaces part of your income if you cannot work.'},
+]
+
+
+class RecordingLLM:
+    """Stands in for LLMClient, answering every prompt the same way and keeping the prompts."""
+
+    def __init__(self, answer: str = 'An answer.'):
+        self.answer = answer
+        self.prompts = []
+
+    def complete(self, messages, **options):
+        self.prompts.append(messages)
+        return self.answer
+
+    async def acomplete(self, messages, **options):
+        return self.complete(messages, **options)
+
+    async def aclose(self):
+        pass
+
+
+@pytest.fixture
+def pages():
+    return [dict(page) for page in PAGES]
+
+
+@pytest.fixture
+def corpus_file(tmp_path):
+    path = tmp_path / 'pages.jsonl'
+    path.write_text(''.join(json.dumps(page) + '\n' for page in PAGES), encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture
+def make_bot(corpus_file):
+    """Build a bot over PAGES with the given ranker, answering through a RecordingLLM."""
+    from chatbot import PolicyAdvisorBot
+
+    def make(ranker: str = 'bm25'):
+        return PolicyAdvisorBot(ranker=ranker, data_file=corpus_file, llm=RecordingLLM())
+    return make
+
+
+@pytest.fixture
+def bot(make_bot):
+    return make_bot()
@@ -0,0 +1,168 @@
+import asyncio
+import json
+
+import pytest
+
+import asgi
+from asgi import ChatApp, CompletionLimiter, QueueFull, parse_form
+
+
+class BlockingLLM:
+    """Async completions that wait until the test releases them."""
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def acomplete(self, messages, **options):
+        self.started.set()
+        await self.release.wait()
+        return 'Done.'
+
+
+async def call(app, path, body, content_type='application/json', requests=None):
+    """Send one request through the ASGI app; returns (status, headers, body), or None if nothing was sent."""
+    requests = requests if requests is not None else [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return requests.pop(0) if requests else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'POST', 'path': path, 'query_string': b'',
+             'headers': [(b'content-type', content_type.encode('latin-1'))]}
+    await app(scope, receive, send)
+    if not sent:
+        return None
+    return sent[0]['status'], dict(sent[0]['headers']), b''.join(message.get('body', b'') for message in sent[1:])
+
+
+def test_parse_form_rejects_json_that_is_not_an_object():
+    assert parse_form(b'{"message": "hi", "session_id": null}', 'application/json') == ({'message': 'hi'}, None)
+    with pytest.raises(ValueError):
+        parse_form(b'["hi"]', 'application/json')
+
+
+def test_json_list_body_gets_400(bot):
+    status, headers, body = asyncio.run(call(ChatApp(bot=bot), '/chat', b'["hi"]'))
+    assert status == 400
+    assert 'Malformed' in json.loads(body)['error']
+
+
+def test_limiter_turns_away_requests_beyond_the_queue():
+    async def scenario():
+        limiter = CompletionLimiter(max_in_flight=1, max_queued=1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter:
+                await release.wait()
+
+        first = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        assert (limiter.in_flight, limiter.waiting) == (1, 1)
+        with pytest.raises(QueueFull):
+            async with limiter:
+                pass
+        release.set()
+        await asyncio.gather(first, second)
+        assert (limiter.in_flight, limiter.waiting) == (0, 0)
+
+    asyncio.run(scenario())
+
+
+def test_chat_beyond_capacity_gets_429_with_retry_after(bot):
+    async def scenario():
+        bot.llm = BlockingLLM()
+        app = ChatApp(bot=bot, max_in_flight=1, max_queued=0, retry_after=3)
+        body = json.dumps({'message': 'What is term life insurance?', 'session_id': 'first'}).encode()
+        first = asyncio.ensure_future(call(app, '/chat', body))
+        await asyncio.wait_for(bot.llm.started.wait(), 5)
+
+        other = json.dumps({'message': 'What is disability insurance?', 'session_id': 'second'}).encode()
+        status, headers, _ = await call(app, '/chat', other)
+        assert status == 429
+        assert headers[b'retry-after'] == b'3'
+
+        bot.llm.release.set()
+        status, _, body = await first
+        assert status == 200
+        assert json.loads(body)['response'] == 'Done.'
+
+    asyncio.run(scenario())
+
+
+def test_importing_the_module_does_not_build_a_bot():
+    assert asgi.app._bot is None
+
+
+def test_lifespan_startup_builds_the_bot(bot, monkeypatch):
+    monkeypatch.setattr(asgi, 'PolicyAdvisorBot', lambda: bot)
+    monkeypatch.setattr(asgi, 'start_cache_warming', lambda bot: None)
+    monkeypatch.setattr(asgi, 'start_delta_watcher', lambda bot: None)
+    app = ChatApp()
+    messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message['type'])
+
+    asyncio.run(app({'type': 'lifespan'}, receive, send))
+    assert app._bot is bot
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+
+
+def test_cached_answers_do_not_wait_for_a_completion_slot(bot):
+    async def scenario():
+        app = ChatApp(bot=bot, max_in_flight=1, max_queued=0)
+        question = json.dumps({'message': 'What is term life insurance?', 'session_id': 'first'}).encode()
+        bot.llm.answer = 'Cached.'
+        status, _, _ = await call(app, '/chat', question)
+        assert status == 200
+
+        bot.llm = BlockingLLM()
+        other = json.dumps({'message': 'What is disability insurance?', 'session_id': 'second'}).encode()
+        blocked = asyncio.ensure_future(call(app, '/chat', other))
+        await asyncio.wait_for(bot.llm.started.wait(), 5)
+
+        repeat = json.dumps({'message': 'What is term life insurance?', 'session_id': 'third'}).encode()
+        status, _, body = await call(app, '/chat', repeat)
+        assert status == 200
+        assert json.loads(body)['response'] == 'Cached.'
+
+        bot.llm.release.set()
+        assert (await blocked)[0] == 200
+
+    asyncio.run(scenario())
+
+
+def test_stream_beyond_capacity_gets_429(bot):
+    async def scenario():
+        bot.llm = BlockingLLM()
+        app = ChatApp(bot=bot, max_in_flight=1, max_queued=0)
+        first = asyncio.ensure_future(call(app, '/chat', json.dumps({'message': 'What is term life?'}).encode()))
+        await asyncio.wait_for(bot.llm.started.wait(), 5)
+
+        status, _, _ = await call(app, '/chat/stream', json.dumps({'message': 'What is disability?'}).encode())
+        assert status == 429
+
+        bot.llm.release.set()
+        await first
+
+    asyncio.run(scenario())
+
+
+def test_disconnect_gets_no_response_and_oversized_body_gets_413(bot, monkeypatch):
+    app = ChatApp(bot=bot)
+    assert asyncio.run(call(app, '/chat', b'', requests=[{'type': 'http.disconnect'}])) is None
+
+    monkeypatch.setattr(asgi, 'MAX_BODY_BYTES', 10)
+    status, _, _ = asyncio.run(call(app, '/chat', json.dumps({'message': 'What is term life insurance?'}).encode()))
+    assert status == 413
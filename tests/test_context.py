@@ -0,0 +1,108 @@
+import random
+
+import pytest
+
+from benchmarks.common import QUERIES
+from chunking import chunk_page, chunk_pages, estimate_tokens
+from context import SECTION_SEPARATOR, ContextBuilder, pack_context, truncate_to_tokens
+from corpus import iter_pages, source_path
+from ranking import build_ranker
+
+DATA_FILE = 'data/policyadvisor_data.jsonl'
+WORDS = ['term', 'life', 'insurance', 'covers', 'a', 'set', 'period', 'premiums', 'stay', 'level', '.', ',',
+         'policyholder', 'beneficiaries', 'underwriting']
+
+
+def random_candidates(rng, count):
+    candidates = []
+    for _ in range(count):
+        page = rng.randrange(5)
+        body = ' '.join(rng.choice(WORDS) for _ in range(rng.randrange(0, 60)))
+        candidates.append((page, rng.randrange(10), f"Title: Page {page}\nSource: https://example.com/{page}",
+                           body.lower(), body))
+    return candidates
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_packed_context_never_exceeds_the_budget(seed):
+    rng = random.Random(seed)
+    candidates = random_candidates(rng, rng.randrange(1, 30))
+    for max_tokens in (1, 2, 5, 10, 25, 50, 100, 400):
+        assert estimate_tokens(pack_context(candidates, max_tokens)) <= max_tokens
+
+
+def test_separators_count_against_the_budget():
+    assert pack_context([('page', 0, 'abcd', 'efgh', 'efgh')], 3) == 'abcd\nefgh'
+    assert estimate_tokens(pack_context([('page', 0, 'abcd', 'efgh', 'efgh')], 2)) <= 2
+
+
+def test_built_context_never_exceeds_the_budget_on_the_scraped_corpus():
+    pages = list(iter_pages(source_path(DATA_FILE)))
+    chunks = chunk_pages(pages)
+    ranker = build_ranker('bm25', pages, chunks)
+    for max_tokens in (10, 100, 1500):
+        builder = ContextBuilder(pages, chunks, max_tokens)
+        for query in QUERIES:
+            context = builder.build(ranker.rank(query, 20))
+            assert estimate_tokens(context) <= max_tokens, query
+
+
+def test_pages_get_one_header_and_chunks_in_page_order():
+    context = pack_context([
+        ('a', 2, 'Title: A', 'second', 'Second'),
+        ('b', 0, 'Title: B', 'other', 'Other'),
+        ('a', 1, 'Title: A', 'first', 'First'),
+    ], 100)
+    assert context == SECTION_SEPARATOR.join(['Title: A\nFirst\nSecond', 'Title: B\nOther'])
+
+
+def test_repeated_text_is_included_once():
+    context = pack_context([
+        ('a', 0, 'Title: A', 'same answer', 'Same answer'),
+        ('b', 0, 'Title: B', 'same answer', 'Q?\nSame answer'),
+        ('b', 1, 'Title: B', 'different', 'Different'),
+    ], 100)
+    assert context.count('Same answer') == 1
+    assert context == SECTION_SEPARATOR.join(['Title: A\nSame answer', 'Title: B\nDifferent'])
+
+
+def test_a_smaller_lower_ranked_chunk_fills_the_remaining_budget():
+    long_body = ' '.join(['word'] * 50)
+    context = pack_context([
+        ('a', 0, 'Title: A', 'short', 'Short'),
+        ('b', 0, 'Title: B', 'long', long_body),
+        ('a', 1, 'Title: A', 'tail', 'Tail'),
+    ], 20)
+    assert context == 'Title: A\nShort\nTail'
+
+
+def test_an_oversized_best_chunk_is_trimmed_to_the_budget():
+    body = ' '.join(f'word{i}' for i in range(200))
+    context = pack_context([('a', 0, 'Title: A', body, body)], 30)
+    assert context.startswith('Title: A\nword0 word1')
+    assert context.endswith('...')
+    assert estimate_tokens(context) <= 30
+
+
+def test_truncation_cuts_on_a_word_boundary():
+    assert truncate_to_tokens('short text', 10) == 'short text'
+    trimmed = truncate_to_tokens('alpha beta gamma delta epsilon zeta', 5)
+    assert trimmed.endswith('...') and trimmed[:-3] in 'alpha beta gamma delta epsilon zeta'
+    assert estimate_tokens(trimmed) <= 5
+    assert truncate_to_tokens('anything', 0) == ''
+
+
+def test_chunks_follow_headings_and_faqs():
+    page = {'title': 'Term life', 'content': 'ignored',
+            'content_structure': [{'type': 'paragraph', 'text': 'Intro.'},
+                                  {'type': 'heading', 'level': 2, 'text': 'Cost'},
+                                  {'type': 'paragraph', 'text': 'It is cheap.'},
+                                  {'type': 'list', 'items': ['10 years', '20 years']}],
+            'faqs': [{'question': 'Is it renewable?', 'answer': 'Often.'}, {'question': 'Unanswered?'}]}
+    assert chunk_page(page, 3) == [
+        {'page': 3, 'heading': '', 'text': 'Intro.'},
+        {'page': 3, 'heading': 'Cost', 'text': 'It is cheap.\n- 10 years\n- 20 years'},
+        {'page': 3, 'heading': 'Is it renewable?', 'text': 'Often.'},
+    ]
+    assert chunk_page({'title': 'Empty', 'content': '', 'metadata': {'description': 'About'}}, 0) == [
+        {'page': 0, 'heading': '', 'text': 'About'}]
@@ -0,0 +1,83 @@
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from artifacts import build_artifacts, load_artifacts
+from corpus import CompiledCorpus, build, compile_corpus, load_corpus
+
+
+def test_json_array_is_compiled_and_gets_artifacts(tmp_path, pages):
+    # The data file shipped in the repository is a JSON array, not JSONL
+    source = tmp_path / 'pages.json'
+    source.write_text(json.dumps(pages), encoding='utf-8')
+    data_path = str(tmp_path / 'pages.jsonl')
+
+    loaded = load_corpus(data_path)
+    assert isinstance(loaded, CompiledCorpus)
+    assert [page['url'] for page in loaded] == [page['url'] for page in pages]
+
+    build_artifacts(data_path)
+    artifacts = load_artifacts(data_path, load_corpus(data_path))
+    assert artifacts is not None
+    assert len(artifacts.chunks) == 3
+
+
+def test_unwritable_data_directory_falls_back_to_pages(tmp_path, monkeypatch, pages):
+    source = tmp_path / 'pages.json'
+    source.write_text(json.dumps(pages), encoding='utf-8')
+
+    def read_only(pages, out_path, source_digest=None):
+        raise PermissionError(f"Read-only file system: '{out_path}'")
+    monkeypatch.setattr('corpus.compile_corpus', read_only)
+
+    loaded = load_corpus(str(source))
+    assert not isinstance(loaded, CompiledCorpus)
+    assert loaded == pages
+
+
+def test_page_cache_is_safe_across_threads(tmp_path, monkeypatch):
+    monkeypatch.setattr('corpus.PAGE_CACHE_SIZE', 4)
+    pages = [{'url': f'https://policyadvisor.com/page-{i}/', 'title': f'Page {i}', 'content': 'text'}
+             for i in range(6)]
+    path = str(tmp_path / 'pages.corpus')
+    compile_corpus(pages, path)
+    corpus = CompiledCorpus(path)
+
+    # Six hot pages for a cache of four, so hits and evictions interleave
+    def read(offset):
+        return [corpus[(offset + i) % 6]['url'] for i in range(2000)]
+
+    # Switch threads as often as possible to shake out races
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(read, range(8)))
+    finally:
+        sys.setswitchinterval(interval)
+    for offset, urls in enumerate(results):
+        assert urls == [pages[(offset + i) % 6]['url'] for i in range(2000)]
+    assert len(corpus._cache) <= 4
+
+
+def test_checked_out_corpus_is_current_despite_file_times(tmp_path, monkeypatch, pages):
+    # A checkout may leave the committed compiled corpus older than its source
+    source = tmp_path / 'pages.json'
+    source.write_text(json.dumps(pages), encoding='utf-8')
+    data_path = str(tmp_path / 'pages.jsonl')
+    build(data_path)
+    os.utime(source, (time.time() + 60, time.time() + 60))
+
+    def read_only(pages, out_path, source_digest=None):
+        raise PermissionError(f"Read-only file system: '{out_path}'")
+    monkeypatch.setattr('corpus.compile_corpus', read_only)
+
+    assert isinstance(load_corpus(data_path), CompiledCorpus)
+
+    # A source that really changed is still compiled again
+    source.write_text(json.dumps(pages[:2]), encoding='utf-8')
+    os.utime(source, (time.time() + 60, time.time() + 60))
+    monkeypatch.undo()
+    assert len(load_corpus(data_path)) == 2
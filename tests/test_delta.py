@@ -0,0 +1,97 @@
+import json
+import threading
+import time
+
+import pytest
+
+from chatbot import DELTA_FILE, start_delta_watcher
+from corpus import delta_path
+
+TERM_URL = 'https://policyadvisor.com/life-insurance/term-life/'
+PET_PAGE = {'url': 'https://policyadvisor.com/pet-insurance/', 'title': 'Pet insurance',
+            'content': 'Pet insurance pays veterinary bills for your dog or cat.'}
+
+
+def sources(bot, query):
+    return bot.hit_sources(bot.rank_batch([query])[0])
+
+
+@pytest.mark.parametrize('ranker', ['bm25', 'substring', 'semantic'])
+def test_delta_adds_and_removes_pages(make_bot, ranker):
+    bot = make_bot(ranker)
+    bot.response_cache.put('pet insurance', 'context', 'stale answer')
+
+    bot.apply_delta({'upserts': [PET_PAGE], 'deletes': [TERM_URL]})
+
+    assert sources(bot, 'veterinary bills for my dog')[0] == PET_PAGE['url']
+    assert TERM_URL not in sources(bot, 'term life insurance')
+    assert bot.response_cache.get_exact('pet insurance') is None
+
+
+def test_queries_during_deltas_see_a_consistent_index(bot):
+    errors = []
+    done = threading.Event()
+
+    def query():
+        while not done.is_set():
+            try:
+                for hits in bot.rank_batch(['veterinary bills', 'term life insurance cost']):
+                    bot.render_context(hits)
+                bot.find_relevant_content('pet insurance for a dog')
+            except Exception as e:
+                errors.append(e)
+                return
+
+    threads = [threading.Thread(target=query) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    try:
+        for i in range(30):
+            page = dict(PET_PAGE, content=f"{PET_PAGE['content']} Revision {i} covers accidents and illness.")
+            bot.apply_delta({'upserts': [page], 'deletes': []})
+    finally:
+        done.set()
+        for thread in threads:
+            thread.join()
+
+    assert errors == []
+    assert sources(bot, 'revision 29 accidents')[0] == PET_PAGE['url']
+
+
+def test_watcher_applies_only_new_deltas(bot, tmp_path, monkeypatch):
+    path = tmp_path / 'delta.json'
+    # Already merged into the corpus the bot loaded
+    path.write_text(json.dumps({'upserts': [], 'deletes': [TERM_URL]}), encoding='utf-8')
+    monkeypatch.setenv('DELTA_POLL_SECONDS', '0.05')
+    assert start_delta_watcher(bot, str(path)) is not None
+
+    time.sleep(0.2)
+    assert TERM_URL in sources(bot, 'term life insurance')
+
+    path.write_text(json.dumps({'generated_at': 'now', 'upserts': [PET_PAGE], 'deletes': []}), encoding='utf-8')
+    deadline = time.monotonic() + 5
+    while PET_PAGE['url'] not in sources(bot, 'veterinary bills') and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert sources(bot, 'veterinary bills')[0] == PET_PAGE['url']
+
+
+def test_watcher_is_off_when_disabled(bot, monkeypatch):
+    monkeypatch.setenv('DELTA_POLL_SECONDS', '0')
+    assert start_delta_watcher(bot) is None
+
+
+def test_watcher_follows_the_bot_data_file(bot, tmp_path, monkeypatch):
+    monkeypatch.setenv('DELTA_POLL_SECONDS', '0.05')
+    assert start_delta_watcher(bot) is not None
+    time.sleep(0.2)
+
+    (tmp_path / 'pages_delta.json').write_text(json.dumps({'upserts': [PET_PAGE], 'deletes': []}), encoding='utf-8')
+    deadline = time.monotonic() + 5
+    while PET_PAGE['url'] not in sources(bot, 'veterinary bills') and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert sources(bot, 'veterinary bills')[0] == PET_PAGE['url']
+
+
+def test_delta_files_sit_next_to_their_data_file():
+    assert delta_path('data/policyadvisor_data.jsonl') == DELTA_FILE == 'data/policyadvisor_delta.json'
+    assert delta_path('/tmp/pages.jsonl') == '/tmp/pages_delta.json'
@@ -0,0 +1,84 @@
+import random
+import threading
+
+import numpy as np
+
+from embeddings import IVF_MIN_ROWS, HashingEmbedder, SemanticIndex
+
+TEXTS = ['term life insurance covers a fixed period', 'critical illness insurance pays a lump sum',
+         'disability insurance replaces income']
+
+
+def test_read_only_directory_keeps_the_index_in_memory(tmp_path, monkeypatch):
+    def read_only(*args, **kwargs):
+        raise PermissionError('Read-only file system')
+    monkeypatch.setattr(np.lib.format, 'open_memmap', read_only)
+
+    prefix = str(tmp_path / 'pages')
+    index = SemanticIndex.load_or_build(TEXTS, HashingEmbedder(), prefix)
+
+    assert index.search('lump sum for critical illness', 1)[0][0] == 1
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_concurrent_builds_do_not_share_temporary_files(tmp_path, capsys):
+    prefix = str(tmp_path / 'pages')
+    texts = synthetic_texts(500, seed=1)
+    corpus_hash = SemanticIndex.corpus_hash(texts, HashingEmbedder())
+    barrier = threading.Barrier(4)
+    indexes = []
+
+    def build():
+        barrier.wait()
+        indexes.append(SemanticIndex.build(texts, HashingEmbedder(), prefix, corpus_hash))
+    threads = [threading.Thread(target=build) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert 'Could not cache' not in capsys.readouterr().out
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['pages.emb.aux.npz', 'pages.emb.json', 'pages.emb.npy']
+    loaded = SemanticIndex.load_or_build(texts, HashingEmbedder(), prefix)
+    assert [index.search(texts[3], 3) for index in indexes] == [loaded.search(texts[3], 3)] * 4
+
+
+TOPICS = [['term', 'life', 'beneficiary', 'premium', 'renewal', 'coverage'],
+          ['critical', 'illness', 'cancer', 'stroke', 'lump', 'sum'],
+          ['disability', 'income', 'employer', 'benefit', 'injury', 'claim'],
+          ['travel', 'trip', 'medical', 'abroad', 'emergency', 'cancel'],
+          ['mortgage', 'home', 'loan', 'bank', 'protection', 'payout'],
+          ['health', 'dental', 'vision', 'drug', 'plan', 'family'],
+          ['pet', 'vet', 'dog', 'cat', 'accident', 'illness'],
+          ['car', 'auto', 'driver', 'collision', 'liability', 'deductible']]
+
+
+def synthetic_texts(count, seed):
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        words = rng.choice(TOPICS) + rng.choice(TOPICS)
+        texts.append(' '.join(rng.choice(words) for _ in range(12)))
+    return texts
+
+
+def exact_search(vectors, query_vector, k):
+    return [int(i) for i in np.argsort(-(vectors @ query_vector), kind='stable')[:k]]
+
+
+def test_ivf_search_recalls_the_exact_neighbours(tmp_path):
+    texts = synthetic_texts(IVF_MIN_ROWS, seed=7)
+    index = SemanticIndex.load_or_build(texts, HashingEmbedder(), str(tmp_path / 'synthetic'))
+    assert index.centroids is not None
+
+    vectors = HashingEmbedder().embed(texts)
+    queries = synthetic_texts(50, seed=8)
+    found = 0
+    for query, query_vector in zip(queries, HashingEmbedder().embed(queries)):
+        found += len(set(exact_search(vectors, query_vector, 10)) & {i for i, score in index.search(query, 10)})
+    assert found / (10 * len(queries)) >= 0.9
+
+    # Probing every list is an exact search
+    index.nprobe = len(index.centroids)
+    for query, query_vector in zip(queries[:5], HashingEmbedder().embed(queries[:5])):
+        assert {i for i, score in index.search(query, 10)} == set(exact_search(vectors, query_vector, 10))
@@ -0,0 +1,203 @@
+import asyncio
+import time
+
+import pytest
+import requests
+
+import fake_llm
+from llm_client import CircuitBreaker, CircuitOpenError, LLMClient, LLMError
+
+MESSAGES = [{'role': 'user', 'content': 'Context:\n...\n\nQuestion: What is term life insurance?'}]
+
+
+@pytest.fixture
+def fake_server():
+    servers = []
+
+    def start(**options):
+        server = fake_llm.serve(0, background=True, **options)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def client_for(server, **options) -> LLMClient:
+    options = {'api_key': 'fake', 'timeout': 5.0, 'deadline': 10.0, 'backoff_base': 0.01, **options}
+    return LLMClient(api_base=f'http://127.0.0.1:{server.server_port}/v1', **options)
+
+
+def test_complete_and_stream(fake_server):
+    client = client_for(fake_server())
+    answer = client.complete(MESSAGES)
+    assert answer == fake_llm.fake_answer(MESSAGES)
+    assert ''.join(client.stream(MESSAGES)) == answer
+    assert client.stats()['retries'] == 0
+
+
+def test_server_errors_are_retried(fake_server):
+    # With this seed the first request gets a 500 and the second succeeds
+    client = client_for(fake_server(error_rate=0.5, seed=1))
+    assert client.complete(MESSAGES) == fake_llm.fake_answer(MESSAGES)
+    assert client.stats()['retries'] == 1
+    assert client.breaker.state == 'closed'
+
+
+def test_async_completions_are_retried(fake_server):
+    client = client_for(fake_server(error_rate=0.5, seed=1))
+
+    async def complete():
+        try:
+            return await client.acomplete(MESSAGES)
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(complete()) == fake_llm.fake_answer(MESSAGES)
+    assert client.stats()['retries'] == 1
+
+
+def test_gives_up_after_max_retries(fake_server):
+    client = client_for(fake_server(error_rate=1.0), max_retries=2)
+    with pytest.raises(LLMError) as error:
+        client.complete(MESSAGES)
+    assert error.value.status == 500
+    assert client.stats()['retries'] == 2
+
+
+def test_retry_after_beyond_the_deadline_is_not_waited_for(fake_server):
+    # The fake asks for Retry-After: 1, which would overrun a half-second deadline
+    client = client_for(fake_server(rate_limit_rate=1.0), deadline=0.5)
+    start = time.monotonic()
+    with pytest.raises(LLMError) as error:
+        client.complete(MESSAGES)
+    assert error.value.status == 429
+    assert time.monotonic() - start < 0.5
+
+
+def test_client_errors_are_not_retried(fake_server):
+    client = client_for(fake_server())
+    client.url = client.url.replace('/chat/completions', '/models')
+    with pytest.raises(LLMError) as error:
+        client.complete(MESSAGES)
+    assert error.value.status == 404
+    assert client.stats()['retries'] == 0
+    assert client.breaker.state == 'closed'
+
+
+def test_circuit_opens_then_recovers_after_a_probe(fake_server):
+    server = fake_server(error_rate=1.0)
+    client = client_for(server, max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.2))
+
+    for _ in range(2):
+        with pytest.raises(LLMError):
+            client.complete(MESSAGES)
+    assert client.breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        client.complete(MESSAGES)
+
+    server.RequestHandlerClass.error_rate = 0.0
+    time.sleep(0.25)
+    assert client.complete(MESSAGES) == fake_llm.fake_answer(MESSAGES)
+    assert client.breaker.state == 'closed'
+
+
+def test_failed_probe_reopens_the_circuit(fake_server):
+    client = client_for(fake_server(error_rate=1.0), max_retries=0,
+                        breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.1))
+    with pytest.raises(LLMError):
+        client.complete(MESSAGES)
+    time.sleep(0.15)
+    with pytest.raises(LLMError) as error:
+        client.complete(MESSAGES)
+    assert not isinstance(error.value, CircuitOpenError)
+    assert client.breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        client.complete(MESSAGES)
+
+
+def opened_breaker(client: LLMClient, reset_timeout: float = 0.1) -> CircuitBreaker:
+    client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=reset_timeout)
+    client.breaker.record_failure()
+    time.sleep(reset_timeout + 0.05)
+    return client.breaker
+
+
+def test_probe_failing_with_a_request_error_reopens_the_circuit(fake_server, monkeypatch):
+    client = client_for(fake_server(), max_retries=0)
+    breaker = opened_breaker(client)
+
+    def broken_post(*args, **kwargs):
+        raise requests.exceptions.ChunkedEncodingError('connection broken')
+
+    monkeypatch.setattr(client.session, 'post', broken_post)
+    with pytest.raises(LLMError):
+        client.complete(MESSAGES)
+    assert breaker.state == 'open'
+
+    monkeypatch.undo()
+    time.sleep(0.15)
+    assert client.complete(MESSAGES) == fake_llm.fake_answer(MESSAGES)
+    assert breaker.state == 'closed'
+
+
+def test_probe_failing_with_an_unexpected_error_reopens_the_circuit(fake_server, monkeypatch):
+    client = client_for(fake_server())
+    breaker = opened_breaker(client)
+    monkeypatch.setattr(client, '_complete_once', lambda payload, timeout: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        client.complete(MESSAGES)
+    assert breaker.state == 'open'
+    assert client.stats()['failures'] == 1
+
+
+def test_cancelled_probe_does_not_leave_the_circuit_half_open(fake_server):
+    server = fake_server(latency=1.0)
+    client = client_for(server)
+    breaker = opened_breaker(client)
+
+    async def cancelled_then_retried():
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(client.acomplete(MESSAGES), 0.1)
+            assert breaker.state == 'open'
+            server.RequestHandlerClass.latency = 0.0
+            return await client.acomplete(MESSAGES)
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(cancelled_then_retried()) == fake_llm.fake_answer(MESSAGES)
+    assert breaker.state == 'closed'
+
+
+def test_slow_request_is_hedged(fake_server):
+    # With this seed the first request is slow and the second one fast
+    client = client_for(fake_server(slow_rate=0.5, slow_latency=1.0, seed=22), hedge_after=0.1)
+    start = time.monotonic()
+    assert client.complete(MESSAGES) == fake_llm.fake_answer(MESSAGES)
+    assert time.monotonic() - start < 0.8
+    assert (client.hedged, client.hedge_wins) == (1, 1)
+
+
+def test_async_hedge_cancels_the_slower_request(fake_server):
+    client = client_for(fake_server(slow_rate=0.5, slow_latency=1.0, seed=22), hedge_after=0.1)
+
+    async def complete():
+        try:
+            return await client.acomplete(MESSAGES)
+        finally:
+            await client.aclose()
+
+    start = time.monotonic()
+    assert asyncio.run(complete()) == fake_llm.fake_answer(MESSAGES)
+    assert time.monotonic() - start < 0.8
+    assert (client.hedged, client.hedge_wins) == (1, 1)
+    assert client.breaker.state == 'closed'
+
+
+def test_fast_request_is_not_hedged(fake_server):
+    client = client_for(fake_server(), hedge_after=0.5)
+    assert client.complete(MESSAGES) == fake_llm.fake_answer(MESSAGES)
+    assert client.hedged == 0
@@ -0,0 +1,14 @@
+from metrics import Trace
+
+
+def test_upload_retrieval_is_its_own_stage(bot):
+    bot.add_upload('s', b'Section one\n\nThe policy excludes flood damage.', 'text/plain')
+    trace = Trace('chat')
+
+    cached, messages, data_context, scope = bot.prepare_request('Is flood damage covered?', session_id='s',
+                                                                trace=trace)
+
+    assert cached is None and scope is None
+    assert 'flood damage' in messages[-1]['content']
+    assert {'retrieval', 'upload_retrieval', 'context'} <= set(trace.stages)
+    assert trace.attrs['cache'] == 'bypass'
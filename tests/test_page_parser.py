@@ -0,0 +1,25 @@
+import json
+import os
+
+import pytest
+
+from page_parser import parse_page
+
+BASE_URL = 'https://policyadvisor.com'
+PAGES_DIR = os.path.join(os.path.dirname(__file__), 'pages')
+# Each saved page's .json holds what the BeautifulSoup extractor that parse_page replaced
+# (scraper.extract_page_content and get_internal_links) returned for it
+PAGES = sorted(name[:-len('.html')] for name in os.listdir(PAGES_DIR) if name.endswith('.html'))
+
+
+@pytest.mark.parametrize('name', PAGES)
+def test_parse_page_matches_the_beautifulsoup_extractor(name):
+    with open(os.path.join(PAGES_DIR, f'{name}.html'), encoding='utf-8') as f:
+        html = f.read()
+    with open(os.path.join(PAGES_DIR, f'{name}.json'), encoding='utf-8') as f:
+        expected = json.load(f)
+
+    page, links = parse_page(f'{BASE_URL}/{name}/', html, BASE_URL)
+
+    assert page == expected['page']
+    assert sorted(links) == expected['links']
@@ -0,0 +1,108 @@
+import math
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from benchmarks.common import QUERIES
+from conftest import PAGES
+from ranking import PAGE_FIELD_WEIGHTS, BM25Ranker, page_fields, tokenize, top_k
+
+DOCUMENTS = [page_fields(page) for page in PAGES] + [
+    page_fields({'title': 'Whole life vs term life', 'content': 'Whole life insurance lasts your whole life, '
+                 'term life insurance lasts a set term.', 'categories': ['Life insurance']}),
+    page_fields({'title': 'Travel insurance', 'content': 'Travel insurance covers emergency medical costs abroad.',
+                 'metadata': {'description': 'What travel insurance covers'},
+                 'faqs': [{'question': 'Does travel insurance cover COVID?', 'answer': 'Some plans do.'}]}),
+]
+SEARCHES = QUERIES + ['insurance', 'whole life', 'travel covid', 'unknown words only']
+
+
+def bm25f(documents, query, k1=1.2, b=0.75):
+    """BM25F written out term by term, as the reference for the sparse matrix.
+
+    A term repeated in the query counts once per occurrence, as in BM25Ranker.
+    """
+    fields = [{field: Counter(tokenize(document.get(field, ''))) for field in PAGE_FIELD_WEIGHTS}
+              for document in documents]
+    avg_lengths = {}
+    for field in PAGE_FIELD_WEIGHTS:
+        total = sum(sum(counts[field].values()) for counts in fields)
+        avg_lengths[field] = total / len(fields) if total else 1.0
+    scores = []
+    for counts in fields:
+        score = 0.0
+        for term in tokenize(query):
+            doc_freq = sum(any(term in c[field] for field in c) for c in fields)
+            if not doc_freq or not any(term in counts[field] for field in counts):
+                continue
+            idf = math.log(1 + (len(fields) - doc_freq + 0.5) / (doc_freq + 0.5))
+            tf = sum(weight * counts[field][term]
+                     / (1 - b + b * sum(counts[field].values()) / avg_lengths[field])
+                     for field, weight in PAGE_FIELD_WEIGHTS.items())
+            score += idf * tf * (k1 + 1) / (tf + k1)
+        scores.append(score)
+    return np.asarray(scores)
+
+
+@pytest.fixture
+def ranker():
+    return BM25Ranker(DOCUMENTS, PAGE_FIELD_WEIGHTS)
+
+
+@pytest.mark.parametrize('query', SEARCHES)
+def test_scores_match_bm25f(ranker, query):
+    np.testing.assert_allclose(ranker.score(query), bm25f(DOCUMENTS, query), rtol=1e-5)
+
+
+def test_batches_score_like_single_queries(ranker):
+    assert ranker.rank_batch(SEARCHES, k=3) == [ranker.rank(query, k=3) for query in SEARCHES]
+
+
+def test_top_k_breaks_ties_by_index():
+    assert top_k(np.asarray([1.0, 3.0, 0.0, 3.0, 2.0], dtype=np.float32), 3) == [(1, 3.0), (3, 3.0), (4, 2.0)]
+
+
+def test_arrays_round_trip_through_a_file(ranker, tmp_path):
+    path = tmp_path / 'bm25.npz'
+    np.savez(path, **ranker.to_arrays())
+    with np.load(path) as arrays:
+        loaded = BM25Ranker.from_arrays(dict(arrays))
+
+    assert loaded.unit == ranker.unit
+    for query in SEARCHES:
+        assert loaded.rank(query) == ranker.rank(query)
+
+
+def test_added_documents_are_scored_with_the_original_statistics(ranker):
+    before = {query: ranker.score(query) for query in SEARCHES}
+    ranker.add_documents([DOCUMENTS[0], page_fields({'title': 'Pet insurance', 'content': 'Vet bills.'})])
+
+    assert ranker.doc_count == len(DOCUMENTS) + 2
+    for query in SEARCHES:
+        scores = ranker.score(query)
+        np.testing.assert_array_equal(scores[:len(DOCUMENTS)], before[query])
+        # A copy of a document meets the same averages and IDFs, so it scores the same
+        assert scores[len(DOCUMENTS)] == pytest.approx(scores[0])
+    assert ranker.rank('pet vet')[0][0] == len(DOCUMENTS) + 1
+
+
+def test_added_documents_rank_like_a_rebuild(ranker):
+    extra = [page_fields({'title': 'Mortgage protection insurance',
+                          'content': 'Mortgage insurance pays off your mortgage if you die.'})]
+    rebuilt = BM25Ranker(DOCUMENTS + extra, PAGE_FIELD_WEIGHTS)
+    ranker.add_documents(extra)
+
+    for query in ['best mortgage protection insurance', 'term life', 'travel insurance']:
+        assert [doc_id for doc_id, score in ranker.rank(query, k=2)] == \
+            [doc_id for doc_id, score in rebuilt.rank(query, k=2)]
+
+
+def test_removed_documents_are_never_returned(ranker):
+    before = ranker.score('insurance')
+    ranker.remove_documents([0, 3])
+
+    scores = ranker.score('insurance')
+    assert scores[0] == scores[3] == 0
+    np.testing.assert_array_equal(np.delete(scores, [0, 3]), np.delete(before, [0, 3]))
+    assert all(doc_id not in (0, 3) for hits in ranker.rank_batch(SEARCHES) for doc_id, score in hits)
@@ -0,0 +1,92 @@
+from metrics import CACHE_EVENTS, REGISTRY
+from response_cache import ResponseCache
+
+CONTEXT = 'Term life insurance covers you for a set term.'
+
+
+def test_exact_hit_ignores_case_and_punctuation():
+    cache = ResponseCache()
+    cache.put('What is term life insurance?', CONTEXT, 'A policy for a set term.')
+
+    assert cache.get_exact('what is TERM life insurance') == 'A policy for a set term.'
+    assert cache.get_exact('What is whole life insurance?') is None
+
+
+def test_near_hit_needs_same_terms_and_context():
+    cache = ResponseCache()
+    cache.put('What is term life insurance?', CONTEXT, 'A policy for a set term.')
+
+    # Stopwords, plurals and punctuation aside, the same question
+    assert cache.get_similar('term life insurance policies, what are they', CONTEXT) is None
+    assert cache.get_similar('Term-life insurances?', CONTEXT) == 'A policy for a set term.'
+    assert cache.get_similar('Term-life insurances?', 'Some other context') is None
+    assert cache.get_similar('cost of term life insurance', CONTEXT) is None
+
+
+def test_negated_question_is_not_a_near_hit():
+    cache = ResponseCache()
+    cache.put('should I buy term life insurance', CONTEXT, 'Yes, if people depend on your income.')
+
+    assert cache.get_similar('should I not buy term life insurance', CONTEXT) is None
+    assert cache.stats()['hits_near'] == 0
+
+
+def test_negation_must_match_even_with_a_lower_threshold():
+    cache = ResponseCache(similarity=0.75)
+    cache.put('should I buy term life insurance', CONTEXT, 'Yes, if people depend on your income.')
+    cache.put("why don't I need term life insurance", CONTEXT, 'You may not, without dependents.')
+
+    assert cache.get_similar('should I not buy term life insurance', CONTEXT) is None
+    assert cache.get_similar('should I buy a term life insurance policy', CONTEXT) == \
+        'Yes, if people depend on your income.'
+    assert cache.get_similar("why don't I need term life insurance now", CONTEXT) == 'You may not, without dependents.'
+
+
+def test_scopes_are_separate():
+    cache = ResponseCache()
+    cache.put('What is term life insurance?', CONTEXT, 'First conversation.', scope='a')
+
+    assert cache.get_exact('What is term life insurance?') is None
+    assert cache.get_exact('What is term life insurance?', scope='b') is None
+    assert cache.get_similar('insurance term life', CONTEXT, scope='b') is None
+    assert cache.get_exact('What is term life insurance?', scope='a') == 'First conversation.'
+
+
+def test_invalidate_and_disabled_cache():
+    cache = ResponseCache()
+    cache.put('What is term life insurance?', CONTEXT, 'A policy for a set term.')
+    cache.invalidate()
+    assert cache.get_exact('What is term life insurance?') is None
+
+    disabled = ResponseCache(max_entries=0)
+    disabled.put('What is term life insurance?', CONTEXT, 'A policy for a set term.')
+    assert disabled.get_exact('What is term life insurance?') is None
+
+
+def test_reordered_question_is_not_a_near_hit():
+    cache = ResponseCache(similarity=0.5)
+    cache.put('can I switch from term to whole life', CONTEXT, 'Yes, most term policies are convertible.')
+    cache.put('term life vs whole life', CONTEXT, 'Term is cheaper; whole life lasts for life.')
+
+    assert cache.get_similar('can I switch from whole life to term', CONTEXT) is None
+    assert cache.get_similar('whole life vs term life', CONTEXT) is None
+    assert cache.get_similar('Can I switch from term to whole-life?', CONTEXT) == \
+        'Yes, most term policies are convertible.'
+
+
+def test_cache_events_are_exported_as_metrics():
+    def events():
+        return {key[0]: value for key, value in CACHE_EVENTS.values.items()}
+
+    before = events()
+    cache = ResponseCache(max_entries=1)
+    cache.put('What is term life insurance?', CONTEXT, 'A policy for a set term.')
+    cache.get_exact('what is term life insurance')
+    cache.get_similar('what is whole life insurance', CONTEXT)
+    cache.put('What is whole life insurance?', CONTEXT, 'A policy for life.')
+    cache.invalidate()
+
+    after = events()
+    for event in ('hit_exact', 'miss', 'eviction', 'invalidation'):
+        assert after[event] - before.get(event, 0) == 1
+    assert 'response_cache_events_total{event="eviction"}' in REGISTRY.render()
@@ -0,0 +1,112 @@
+import json
+import os
+
+import pytest
+
+import scraper
+from scraper import CHECKPOINT_FILE, CRAWL_LOG_FILE, DATA_FILE, PolicyAdvisorScraper
+
+BASE_URL = 'https://policyadvisor.com'
+SITE = {BASE_URL: ['/page-1/', '/page-2/', '/page-3/', '/page-4/', '/page-5/']}
+SITE.update({f'{BASE_URL}/page-{i}/': [f'/page-{i % 5 + 1}/'] for i in range(1, 6)})
+
+
+class Interrupted(BaseException):
+    """Stands in for Ctrl-C or a killed process."""
+
+
+class FakeResponse:
+    def __init__(self, url):
+        links = ''.join(f'<a href="{link}">link</a>' for link in SITE[url])
+        self.text = (f'<html><head><title>{url}</title></head><body><main><h1>{url}</h1>'
+                     f'<p>Some text about life insurance on {url}.</p>{links}</main></body></html>')
+        self.content = self.text.encode('utf-8')
+        self.status_code = 200
+        self.headers = {}
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(scraper, 'CHECKPOINT_EVERY', 2)
+    fetched = []
+
+    def make_scraper(fail_after=None):
+        crawler = PolicyAdvisorScraper(concurrency=1, requests_per_second=1000, parse_workers=1)
+
+        def fetch(url, headers=None):
+            if fail_after is not None and len(fetched) >= fail_after:
+                raise Interrupted()
+            fetched.append(url)
+            return FakeResponse(url)
+
+        crawler.fetch = fetch
+        return crawler
+
+    make_scraper.fetched = fetched
+    return make_scraper
+
+
+def saved_urls():
+    with open(DATA_FILE, encoding='utf-8') as f:
+        return sorted(json.loads(line)['url'] for line in f)
+
+
+def test_interrupted_crawl_resumes_from_its_checkpoint(site):
+    with pytest.raises(Interrupted):
+        site(fail_after=4).scrape_site()
+    assert os.path.exists(CHECKPOINT_FILE)
+    with open(CHECKPOINT_FILE, encoding='utf-8') as f:
+        done = json.load(f)['pages_scraped']
+
+    site().scrape_site(resume=True)
+
+    assert saved_urls() == sorted(SITE)
+    # Only pages in flight at the checkpoint are fetched twice
+    assert len(site.fetched) - len(SITE) <= 4 - done
+    assert not os.path.exists(CHECKPOINT_FILE)
+    assert not os.path.exists(CRAWL_LOG_FILE)
+
+
+def test_new_crawl_discards_an_old_checkpoint(site):
+    with pytest.raises(Interrupted):
+        site(fail_after=4).scrape_site()
+    assert os.path.exists(CHECKPOINT_FILE)
+
+    # A new crawl interrupted before its first checkpoint leaves nothing to resume
+    with pytest.raises(Interrupted):
+        site(fail_after=5).scrape_site()
+    assert not os.path.exists(CHECKPOINT_FILE)
+
+    site().scrape_site(resume=True)
+    assert saved_urls() == sorted(SITE)
+
+
+def test_not_modified_pages_refresh_their_crawl_state(site):
+    crawler = site()
+    url = f'{BASE_URL}/page-1/'
+    old = {'etag': '"v1"', 'last_modified': 'Mon, 01 Jan 2024 00:00:00 GMT', 'hash': 'abc',
+           'fetched_at': '2024-01-01T00:00:00+00:00', 'links': [f'{BASE_URL}/page-2/']}
+    crawler.incremental = True
+    crawler.crawl_state = {url: old}
+    sent = []
+
+    def fetch(url, headers=None):
+        sent.append(headers)
+        response = FakeResponse(url)
+        response.status_code = 304
+        response.headers = {'ETag': '"v2"'}
+        return response
+    crawler.fetch = fetch
+
+    result = crawler.crawl_page(url)
+
+    assert sent == [{'If-None-Match': '"v1"', 'If-Modified-Since': old['last_modified']}]
+    assert result['status'] == 'unchanged' and result['links'] == old['links']
+    record = result['record']
+    assert record['etag'] == '"v2"' and record['last_modified'] == old['last_modified']
+    assert record['hash'] == old['hash'] and record['links'] == old['links']
+    assert record['fetched_at'] > old['fetched_at']
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from benchmarks.common import QUERIES
+from conftest import PAGES
+from corpus import iter_pages, source_path
+from ranking import SubstringRanker
+
+DATA_FILE = 'data/policyadvisor_data.jsonl'
+
+EXTRA_PAGES = [
+    {'url': 'https://policyadvisor.com/about/', 'title': 'About PolicyAdvisor', 'content': '',
+     'metadata': {'description': 'Meet the founders of PolicyAdvisor', 'og:description': 'Who we are',
+                  'author': {'name': 'Jane Doe', 'jobTitle': 'CEO'}},
+     'structured_data': {'@type': 'Organization', 'founder': 'Jane Doe'},
+     'faqs': [{'question': 'Who founded PolicyAdvisor?', 'answer': 'Two insurance advisors.'},
+              {'question': 'Is PolicyAdvisor free?', 'answer': 'Yes, advice is free.'}],
+     'categories': ['Company'], 'related_topics': ['Term life insurance']},
+    {'url': 'https://policyadvisor.com/blog/whole-life/', 'title': 'Whole life vs term life', 'content': None,
+     'metadata': {'keywords': 'whole life, term life, cost'}, 'categories': ['Life insurance']},
+]
+
+
+def linear_scan(pages, query, k=5):
+    """The scoring loop of the original find_relevant_content, as (page_id, score) pairs."""
+    query_terms = query.lower().split()
+    scored = []
+    for page_id, page in enumerate(pages):
+        score = 0
+        title_lower = page['title'].lower()
+        content_lower = page['content'].lower() if page['content'] else ""
+        for term in query_terms:
+            if term in title_lower:
+                score += 3
+            if term in content_lower:
+                score += 2
+        if page.get('structured_data'):
+            structured_text = json.dumps(page['structured_data']).lower()
+            score += 2 * sum(term in structured_text for term in query_terms)
+        for faq in page.get('faqs') or []:
+            faq_text = (faq.get('question', '') + ' ' + faq.get('answer', '')).lower()
+            score += 2 * sum(term in faq_text for term in query_terms)
+        for key, value in page.get('metadata', {}).items():
+            if isinstance(value, str):
+                for term in query_terms:
+                    if term in value.lower():
+                        score += 1
+                        if key in ['description', 'og:description', 'twitter:description']:
+                            score += 1
+            elif key == 'author' and any(term in ['ceo', 'founder', 'author', 'who'] for term in query_terms):
+                score += 2
+        if page.get('categories'):
+            score += sum(term in ' '.join(page['categories']).lower() for term in query_terms)
+        if page.get('related_topics'):
+            score += sum(term in ' '.join(page['related_topics']).lower() for term in query_terms)
+        if score > 0:
+            scored.append((page_id, float(score)))
+    # sorted() is stable, so ties keep corpus order as they did before
+    return sorted(scored, key=lambda hit: hit[1], reverse=True)[:k]
+
+
+@pytest.mark.parametrize('query', QUERIES + ['Term', 'who is the CEO', 'insurance', 'life, insurance?', 'zzz'])
+def test_ranking_matches_the_linear_scan(query):
+    pages = [dict(page) for page in PAGES + EXTRA_PAGES]
+    assert SubstringRanker(pages).rank(query) == linear_scan(pages, query)
+
+
+def test_ranking_matches_the_linear_scan_on_the_scraped_corpus():
+    pages = list(iter_pages(source_path(DATA_FILE)))
+    ranker = SubstringRanker(pages)
+    for query in QUERIES:
+        assert ranker.rank(query) == linear_scan(pages, query), query
+
+
+def test_added_and_removed_pages_rank_like_a_scan_of_the_new_corpus():
+    pages = [dict(page) for page in PAGES]
+    ranker = SubstringRanker(pages)
+    pages.extend(dict(page) for page in EXTRA_PAGES)
+    ranker.add(pages, [], range(len(PAGES), len(pages)), [])
+    ranker.remove([0], [])
+
+    for query in ['term life insurance', 'who founded policyadvisor']:
+        expected = [hit for hit in linear_scan(pages, query, k=len(pages)) if hit[0] != 0][:5]
+        assert ranker.rank(query) == expected
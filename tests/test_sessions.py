@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+from sessions import MemoryConversationStore, SQLiteConversationStore, create_store
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('sessions.time.monotonic', lambda: now[0])
+    monkeypatch.setattr('sessions.time.time', lambda: now[0])
+    return now
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryConversationStore(max_turns=2, ttl=60)
+    return SQLiteConversationStore(str(tmp_path / 'sessions.db'), max_turns=2, ttl=60)
+
+
+def test_keeps_only_the_latest_turns(store):
+    for turn in range(3):
+        store.append_turn('a', f'question {turn}', f'answer {turn}')
+    assert store.get_history('a') == [
+        {'role': 'user', 'content': 'question 1'}, {'role': 'assistant', 'content': 'answer 1'},
+        {'role': 'user', 'content': 'question 2'}, {'role': 'assistant', 'content': 'answer 2'},
+    ]
+    assert store.get_history('b') == []
+
+
+def test_clear_drops_one_session(store):
+    store.append_turn('a', 'question', 'answer')
+    store.append_turn('b', 'question', 'answer')
+    store.clear('a')
+    assert store.get_history('a') == []
+    assert len(store.get_history('b')) == 2
+
+
+def test_idle_sessions_expire(store, clock):
+    store.append_turn('a', 'question', 'answer')
+    clock[0] += 59
+    assert len(store.get_history('a')) == 2
+    store.append_turn('a', 'follow-up', 'answer')
+    clock[0] += 61
+    assert store.get_history('a') == []
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemoryConversationStore(max_sessions=2)
+    store.append_turn('a', 'question', 'answer')
+    store.append_turn('b', 'question', 'answer')
+    store.get_history('a')
+    store.append_turn('c', 'question', 'answer')
+    assert store.get_history('b') == []
+    assert store.get_history('a') and store.get_history('c')
+
+
+def test_sqlite_store_is_shared_between_instances_and_threads(tmp_path):
+    path = str(tmp_path / 'nested' / 'sessions.db')
+    SQLiteConversationStore(path).append_turn('a', 'question', 'answer')
+
+    other = SQLiteConversationStore(path)
+    histories = []
+    thread = threading.Thread(target=lambda: histories.append(other.get_history('a')))
+    thread.start()
+    thread.join()
+    assert histories == [[{'role': 'user', 'content': 'question'}, {'role': 'assistant', 'content': 'answer'}]]
+
+
+def test_create_store(tmp_path):
+    assert isinstance(create_store('memory', max_turns=3), MemoryConversationStore)
+    store = create_store(f"sqlite:///{tmp_path / 'sessions.db'}", max_turns=3, ttl=10)
+    assert isinstance(store, SQLiteConversationStore)
+    assert (store.max_turns, store.ttl) == (3, 10)
+    with pytest.raises(ValueError):
+        create_store('redis://localhost')
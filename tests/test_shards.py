@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from shards import build_shards, parse_corpus_filter
+
+
+@pytest.fixture
+def sharded_bot(tmp_path, corpus_file, make_bot, monkeypatch):
+    regulator = tmp_path / 'regulator.jsonl'
+    regulator.write_text(json.dumps({'url': 'https://regulator.example/life-insurance/rules/',
+                                     'title': 'Life insurance rules',
+                                     'content': 'Insurers must explain term life insurance renewals.'}) + '\n',
+                         encoding='utf-8')
+    manifest = build_shards({'shards_per_corpus': 2,
+                             'corpora': {'policyadvisor': corpus_file, 'regulator': str(regulator)}},
+                            str(tmp_path / 'shards'))
+    monkeypatch.setenv('SHARDS', manifest)
+    monkeypatch.setenv('SHARD_WORKERS', '2')
+    bot = make_bot()
+    yield bot
+    bot.shards.close()
+
+
+def test_parse_corpus_filter():
+    assert parse_corpus_filter('') is None
+    assert parse_corpus_filter('policyadvisor/life-insurance, regulator') == {
+        'policyadvisor': {'life-insurance'}, 'regulator': None}
+    # A whole corpus wins over its sections
+    assert parse_corpus_filter('policyadvisor,policyadvisor/life-insurance') == {'policyadvisor': None}
+
+
+def test_sharded_retrieval_merges_corpora_and_filters(sharded_bot):
+    hits = sharded_bot.rank_batch(['term life insurance'])[0]
+    sources = sharded_bot.hit_sources(hits)
+    assert 'https://policyadvisor.com/life-insurance/term-life/' in sources
+    assert 'https://regulator.example/life-insurance/rules/' in sources
+    assert len(sharded_bot.hit_pages(hits)) == len(sources)
+    assert 'Term life insurance' in sharded_bot.render_context(hits)
+
+    (filtered,) = sharded_bot.rank_batch(['insurance'], 'policyadvisor/critical-illness-insurance')
+    assert sharded_bot.hit_sources(filtered) == ['https://policyadvisor.com/critical-illness-insurance/']
+    assert sharded_bot.rank_batch(['insurance'], 'unknown') == [[]]
+
+
+def test_apply_delta_is_refused_for_shards(sharded_bot):
+    with pytest.raises(RuntimeError, match='shards.py'):
+        sharded_bot.apply_delta({'upserts': [], 'deletes': []})
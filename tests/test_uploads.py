@@ -0,0 +1,86 @@
+import io
+import zipfile
+
+import pytest
+
+from uploads import UploadError, UploadStore, read_upload
+
+DOCUMENT_XML = (
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+    '<w:p><w:pPr><w:pStyle w:val="Heading1"/></w:pPr><w:r><w:t>Coverage</w:t></w:r></w:p>'
+    '<w:p><w:r><w:t>The policy pays a lump sum on diagnosis of a covered illness.</w:t></w:r></w:p>'
+    '</w:body></w:document>'
+)
+
+
+def docx_bytes(members) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def test_reads_text_paragraphs():
+    document = read_upload(b'First paragraph about premiums.\n\nSecond paragraph about claims.', 'text/plain')
+    assert [chunk['text'] for chunk in document.chunks] == [
+        'First paragraph about premiums.\nSecond paragraph about claims.']
+    assert 'claims' in document.context('claims', 100)
+    assert not document.truncated
+
+
+def test_reads_docx_with_headings():
+    document = read_upload(docx_bytes({'word/document.xml': DOCUMENT_XML}), 'application/octet-stream')
+    assert document.chunks == [
+        {'heading': 'Coverage', 'text': 'The policy pays a lump sum on diagnosis of a covered illness.'}]
+    assert document.context('illness', 100).startswith('Coverage\n')
+
+
+def test_stops_reading_after_max_chunks():
+    paragraphs = '\n\n'.join(f'Paragraph {i}: ' + 'word ' * 400 for i in range(10))
+    document = read_upload(paragraphs, max_chunks=3)
+    assert len(document.chunks) == 3
+    assert document.truncated
+
+
+@pytest.mark.parametrize('content, file_type, message', [
+    (b'', 'text/plain', 'No text could be extracted'),
+    (b'  \n\n \n', 'text/plain', 'No text could be extracted'),
+    (b'\x00\x01\x02binary', 'application/octet-stream', 'Unsupported file type'),
+    (b'plain text', 'application/pdf', 'Unsupported file type'),
+    (b'PK\x03\x04 not really a zip', None, 'Could not read DOCX'),
+    (docx_bytes({'word/other.xml': '<x/>'}), None, 'Could not read DOCX'),
+    (docx_bytes({'word/document.xml': '<w:document'}), None, 'Could not read DOCX'),
+    (b'%PDF-1.4\nthis is not a pdf', 'application/pdf', 'Could not read PDF'),
+])
+def test_unreadable_uploads_raise_upload_error(content, file_type, message):
+    with pytest.raises(UploadError, match=message):
+        read_upload(content, file_type)
+
+
+def test_upload_store_expires_idle_documents(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('uploads.time.monotonic', lambda: now[0])
+    store = UploadStore(ttl=60)
+    document = read_upload('Some text')
+    store.put('a', document)
+    now[0] += 30
+    assert store.get('a') is document
+    now[0] += 59  # Reading it counted as use
+    assert store.get('a') is document
+    now[0] += 61
+    assert store.get('a') is None
+
+
+def test_upload_store_evicts_least_recently_used():
+    store = UploadStore(max_sessions=2)
+    documents = {session_id: read_upload(f'Text for {session_id}') for session_id in 'abc'}
+    store.put('a', documents['a'])
+    store.put('b', documents['b'])
+    store.get('a')
+    store.put('c', documents['c'])
+    assert store.get('b') is None
+    assert store.get('a') is documents['a']
+    assert store.get('c') is documents['c']
+    store.clear('a')
+    assert store.get('a') is None
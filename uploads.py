@@ -0,0 +1,270 @@
+"""Uploaded documents: text extraction, chunking and retrieval within a session.
+
+Uploads are read from memory (or the spooled request stream) without a
+temporary file. PDF pages, DOCX paragraphs and blocks of text are extracted
+one at a time and cut into chunks as they arrive. At most MAX_UPLOAD_CHUNKS
+chunks are kept, and reading stops there, so a huge document costs bounded
+time and memory. Each session keeps its latest document with a small BM25
+index over its chunks. Every question then pulls only the chunks relevant to
+it, within a token budget.
+"""
+import codecs
+import io
+import re
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from itertools import islice
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from xml.etree import ElementTree
+
+from chunking import CONTENT_WINDOW_WORDS, estimate_tokens
+from context import SECTION_SEPARATOR, truncate_to_tokens
+from ranking import BM25Ranker
+
+READ_BLOCK_BYTES = 64 * 1024
+# Chunks are cut at paragraph boundaries once they reach about this many tokens
+UPLOAD_CHUNK_TOKENS = 200
+# Reading stops after this many chunks (about 400k tokens of text)
+MAX_UPLOAD_CHUNKS = 2000
+UPLOAD_FIELD_WEIGHTS = {'heading': 2.0, 'content': 1.0}
+
+DEFAULT_TTL = 60 * 60  # Drop documents of sessions idle for an hour
+DEFAULT_MAX_SESSIONS = 100
+
+BLANK_LINE = re.compile(r'\n\s*\n')
+WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+PARAGRAPH_TAG = WORD_NAMESPACE + 'p'
+TABLE_TAG = WORD_NAMESPACE + 'tbl'
+
+
+class UploadError(ValueError):
+    """The uploaded file could not be read."""
+
+
+def decoded_blocks(stream: BinaryIO) -> Iterator[str]:
+    """Decode a byte stream as UTF-8 block by block, replacing invalid bytes."""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    while True:
+        block = stream.read(READ_BLOCK_BYTES)
+        text = decoder.decode(block, final=not block)
+        if text:
+            yield text
+        if not block:
+            return
+
+
+def text_paragraphs(blocks: Iterable[str], heading: str = '') -> Iterator[Tuple[str, str]]:
+    """Yield (heading, paragraph) for the blank-line separated paragraphs of streamed text."""
+    pending = ''
+    for block in blocks:
+        parts = BLANK_LINE.split(pending + block.replace('\r\n', '\n'))
+        pending = parts.pop()
+        if len(pending) > READ_BLOCK_BYTES:
+            # One very long paragraph: pass on all but its last, possibly cut, word
+            cut = pending.rfind(' ')
+            cut = cut if cut > 0 else len(pending)
+            parts.append(pending[:cut])
+            pending = pending[cut:]
+        for part in parts:
+            if part.strip():
+                yield heading, part.strip()
+    if pending.strip():
+        yield heading, pending.strip()
+
+
+def pdf_paragraphs(stream: BinaryIO) -> Iterator[Tuple[str, str]]:
+    """Yield (page label, paragraph) for each page of a PDF, one page at a time."""
+    try:
+        from pypdf import PdfReader
+        from pypdf.errors import PyPdfError
+    except ImportError:
+        raise UploadError("Reading PDF uploads needs the pypdf package (pip install pypdf)") from None
+    try:
+        reader = PdfReader(stream)
+        for number, page in enumerate(reader.pages, 1):
+            yield from text_paragraphs([page.extract_text() or ''], f"Page {number}")
+    except (PyPdfError, ValueError, KeyError) as e:
+        raise UploadError(f"Could not read PDF: {e}") from None
+
+
+def docx_paragraphs(stream: BinaryIO) -> Iterator[Tuple[str, str]]:
+    """Yield (current heading, paragraph) from a DOCX, parsing its XML incrementally."""
+    try:
+        archive = zipfile.ZipFile(stream)
+        document = archive.open('word/document.xml')
+    except (zipfile.BadZipFile, KeyError) as e:
+        raise UploadError(f"Could not read DOCX: {e}") from None
+
+    heading = ''
+    with archive, document:
+        try:
+            for _, element in ElementTree.iterparse(document, events=('end',)):
+                if element.tag == TABLE_TAG:
+                    element.clear()
+                if element.tag != PARAGRAPH_TAG:
+                    continue
+                text = ''.join(run_text(element)).strip()
+                style = element.find(f'{WORD_NAMESPACE}pPr/{WORD_NAMESPACE}pStyle')
+                # Paragraphs are dropped once read, so the parsed tree stays small
+                element.clear()
+                if not text:
+                    continue
+                if style is not None and style.get(WORD_NAMESPACE + 'val', '').lower().startswith(('heading', 'title')):
+                    heading = text
+                else:
+                    yield heading, text
+        except ElementTree.ParseError as e:
+            raise UploadError(f"Could not read DOCX: {e}") from None
+
+
+def run_text(paragraph: ElementTree.Element) -> Iterator[str]:
+    for element in paragraph.iter():
+        if element.tag == WORD_NAMESPACE + 't':
+            yield element.text or ''
+        elif element.tag == WORD_NAMESPACE + 'tab':
+            yield '\t'
+        elif element.tag in (WORD_NAMESPACE + 'br', WORD_NAMESPACE + 'cr'):
+            yield '\n'
+
+
+def extract_paragraphs(content: Union[str, bytes, BinaryIO], file_type: str = None) -> Iterator[Tuple[str, str]]:
+    """Yield (heading, paragraph) from an uploaded PDF, DOCX or text file.
+
+    The format is sniffed from the first bytes, since browsers often send
+    uploads as application/octet-stream.
+    """
+    if isinstance(content, str):
+        return text_paragraphs([content])
+    stream = io.BytesIO(content) if isinstance(content, (bytes, bytearray)) else content
+    if not stream.seekable():
+        stream = io.BytesIO(stream.read())
+    start = stream.tell()
+    head = stream.read(1024)
+    stream.seek(start)
+
+    if b'%PDF-' in head:
+        return pdf_paragraphs(stream)
+    if head.startswith(b'PK\x03\x04'):
+        return docx_paragraphs(stream)
+    if file_type == 'application/pdf' or b'\0' in head:
+        raise UploadError("Unsupported file type: upload a PDF, DOCX or text file")
+    return text_paragraphs(decoded_blocks(stream))
+
+
+def split_paragraph(text: str, max_tokens: int) -> Iterator[str]:
+    """Cut a paragraph longer than ``max_tokens`` into windows of words."""
+    if estimate_tokens(text) <= max_tokens:
+        yield text
+        return
+    words = text.split()
+    for start in range(0, len(words), CONTENT_WINDOW_WORDS):
+        yield truncate_to_tokens(' '.join(words[start:start + CONTENT_WINDOW_WORDS]), max_tokens)
+
+
+def document_chunks(paragraphs: Iterable[Tuple[str, str]],
+                    max_tokens: int = UPLOAD_CHUNK_TOKENS) -> Iterator[Dict]:
+    """Group consecutive paragraphs under the same heading into chunks of about ``max_tokens``."""
+    heading, parts, used = '', [], 0
+    for section, paragraph in paragraphs:
+        for piece in split_paragraph(paragraph, max_tokens):
+            cost = estimate_tokens(piece)
+            if parts and (section != heading or used + cost > max_tokens):
+                yield {'heading': heading, 'text': "\n".join(parts)}
+                parts, used = [], 0
+            heading = section
+            parts.append(piece)
+            used += cost
+    if parts:
+        yield {'heading': heading, 'text': "\n".join(parts)}
+
+
+class UploadedDocument:
+    """An uploaded document's chunks and the BM25 index used to pick them per question."""
+
+    def __init__(self, chunks: List[Dict], truncated: bool = False):
+        self.chunks = chunks
+        self.truncated = truncated
+        self.ranker = BM25Ranker(({'heading': chunk['heading'], 'content': chunk['text']} for chunk in chunks),
+                                 UPLOAD_FIELD_WEIGHTS, unit='chunk')
+        self.costs = [estimate_tokens(self.render_chunk(chunk_id)) for chunk_id in range(len(chunks))]
+
+    def render_chunk(self, chunk_id: int) -> str:
+        chunk = self.chunks[chunk_id]
+        return f"{chunk['heading']}\n{chunk['text']}" if chunk['heading'] else chunk['text']
+
+    def context(self, query: str, max_tokens: int) -> str:
+        """The chunks most relevant to ``query`` that fit in ``max_tokens``, in document order."""
+        hits = self.ranker.rank(query, k=len(self.chunks))
+        if not hits:
+            # Nothing matched, e.g. "summarize this": read from the start
+            hits = [(chunk_id, 0.0) for chunk_id in range(len(self.chunks))]
+
+        selected, used = [], 0
+        for chunk_id, score in hits:
+            cost = self.costs[chunk_id]
+            if used + cost > max_tokens:
+                if selected:
+                    continue  # A smaller, lower-ranked chunk may still fit
+                return truncate_to_tokens(self.render_chunk(chunk_id), max_tokens)
+            selected.append(chunk_id)
+            used += cost
+            if used >= max_tokens:
+                break
+        return SECTION_SEPARATOR.join(self.render_chunk(chunk_id) for chunk_id in sorted(selected))
+
+
+def read_upload(content: Union[str, bytes, BinaryIO], file_type: str = None,
+                max_chunks: int = MAX_UPLOAD_CHUNKS) -> UploadedDocument:
+    """Extract, chunk and index an uploaded file; raises UploadError if it has no readable text."""
+    chunks = list(islice(document_chunks(extract_paragraphs(content, file_type)), max_chunks + 1))
+    truncated = len(chunks) > max_chunks
+    del chunks[max_chunks:]
+    if not chunks:
+        raise UploadError("No text could be extracted from the uploaded file")
+    return UploadedDocument(chunks, truncated)
+
+
+class UploadStore:
+    """Each session's latest uploaded document, in an LRU with idle expiry.
+
+    Documents live in one worker's memory, like MemoryConversationStore, so a
+    follow-up question reaches its document only on the worker that read it.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_sessions: int = DEFAULT_MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._documents: 'OrderedDict[str, tuple]' = OrderedDict()  # id -> (last used, document)
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float) -> None:
+        while self._documents:
+            session_id, (last_used, _) = next(iter(self._documents.items()))
+            if now - last_used <= self.ttl and len(self._documents) <= self.max_sessions:
+                break
+            del self._documents[session_id]
+
+    def get(self, session_id: str) -> Optional[UploadedDocument]:
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._documents.get(session_id)
+            if entry is None:
+                return None
+            self._documents[session_id] = (now, entry[1])
+            self._documents.move_to_end(session_id)
+            return entry[1]
+
+    def put(self, session_id: str, document: UploadedDocument) -> None:
+        """Make ``document`` the session's document, replacing any earlier upload."""
+        now = time.monotonic()
+        with self._lock:
+            self._documents.pop(session_id, None)
+            self._documents[session_id] = (now, document)
+            self._evict(now)
+
+    def clear(self, session_id: str) -> None:
+        with self._lock:
+            self._documents.pop(session_id, None)